@@ -0,0 +1,189 @@
+"""
+Benchmark of the controller's per-test overhead.
+
+Generates synthetic suites of no-op tests, runs them with a range of worker
+counts and ``--dist`` modes, and reports for each run the controller CPU time
+per test, the number of events processed by ``DSession.loop_once`` per second
+and the time to the first test report.  Results are written as JSON, tagged
+with the current commit, so they can be compared across commits::
+
+    python benchmarks/controller_overhead.py --tests 10000 100000 \\
+        --workers 1 8 32 --dist load loadscope --output before.json
+    python benchmarks/controller_overhead.py ... --output after.json
+    python benchmarks/controller_overhead.py --compare before.json after.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+HERE = Path(__file__).parent
+
+# Schedulers which only run the tests in the bin of each worker
+BIN_SCHEDULERS = {"loadscope", "loadfile", "loadgroup"}
+
+DIST_MODES = ["each", "load", "loadscope", "loadfile", "loadgroup", "worksteal"]
+
+TESTS_PER_FILE = 1000
+
+TEST_FILE = """\
+import pytest
+
+
+@pytest.mark.parametrize("i", range({count}))
+def test_noop(i):
+    pass
+"""
+
+
+def make_suite(root, num_tests):
+    """Write a suite of ``num_tests`` no-op tests, return its test files."""
+    tests = root / "tests"
+    tests.mkdir()
+    files = []
+    for start in range(0, num_tests, TESTS_PER_FILE):
+        path = tests / f"test_{start // TESTS_PER_FILE:05d}.py"
+        path.write_text(TEST_FILE.format(count=min(TESTS_PER_FILE, num_tests - start)))
+        files.append(f"tests/{path.name}")
+    return files
+
+
+def write_bins(root, files, workers, dist):
+    """Write the bins.json read by the node manager.
+
+    The files are dealt round-robin to the workers for the schedulers which
+    run the bin of each worker; the other ones need every worker to collect
+    the whole suite.
+    """
+    if dist in BIN_SCHEDULERS:
+        bins = [files[i::workers] for i in range(workers)]
+    else:
+        bins = [files] * workers
+    (root / "bins.json").write_text(json.dumps(bins))
+
+
+def run_one(root, num_tests, workers, dist):
+    output = root / "stats.json"
+    # never report the numbers of a previous run if this one crashes
+    if output.exists():
+        output.unlink()
+    env = dict(
+        os.environ,
+        TEST_DIR=str(root),
+        XDIST_BENCH_OUTPUT=str(output),
+        PYTHONPATH=os.pathsep.join(
+            [str(HERE), os.environ.get("PYTHONPATH", "")]
+        ).rstrip(os.pathsep),
+    )
+    args = [
+        sys.executable,
+        "-m",
+        "pytest",
+        "tests",
+        f"-n{workers}",
+        f"--dist={dist}",
+        "-p",
+        "xdist_bench",
+        "-p",
+        "no:cacheprovider",
+        "-q",
+    ]
+    start = time.time()
+    subprocess.run(args, cwd=root, env=env, stdout=subprocess.DEVNULL, check=True)
+    stats = json.loads(output.read_text())
+    first_report = stats.pop("first_report")
+    # with --dist=each every worker runs the whole suite
+    reports = num_tests * workers if dist == "each" else num_tests
+    stats.update(
+        tests=num_tests,
+        workers=workers,
+        dist=dist,
+        cpu_per_test=stats["controller_cpu"] / reports,
+        time_to_first_test=first_report - start if first_report else None,
+    )
+    return stats
+
+
+def current_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=HERE,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    results = []
+    for num_tests in args.tests:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            files = make_suite(root, num_tests)
+            for dist in args.dist:
+                for workers in args.workers:
+                    write_bins(root, files, workers, dist)
+                    stats = run_one(root, num_tests, workers, dist)
+                    results.append(stats)
+                    print(
+                        f"{num_tests:>8} tests  -n {workers:<3} {dist:<10}"
+                        f"  {stats['cpu_per_test'] * 1e6:8.1f}us/test"
+                        f"  {stats['events_per_sec']:10.0f} events/s"
+                        f"  first test after {stats['time_to_first_test'] or 0:6.2f}s"
+                    )
+    with open(args.output, "w") as f:
+        json.dump({"commit": current_commit(), "results": results}, f, indent=2)
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    key = ("tests", "workers", "dist")
+    baseline = {tuple(r[k] for k in key): r for r in before["results"]}
+    print(f"{before['commit']} -> {after['commit']}")
+    for result in after["results"]:
+        old = baseline.get(tuple(result[k] for k in key))
+        if old is None or not old["cpu_per_test"]:
+            continue
+        change = result["cpu_per_test"] / old["cpu_per_test"] - 1
+        print(
+            f"{result['tests']:>8} tests  -n {result['workers']:<3} "
+            f"{result['dist']:<10}  cpu/test {change:+7.1%}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--tests", type=int, nargs="+", default=[10000, 100000, 1000000]
+    )
+    parser.add_argument(
+        "--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64]
+    )
+    parser.add_argument("--dist", nargs="+", default=DIST_MODES, choices=DIST_MODES)
+    parser.add_argument("--output", default="controller_overhead.json")
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar=("BEFORE", "AFTER"),
+        help="compare two result files instead of running the benchmark",
+    )
+    args = parser.parse_args(argv)
+    if args.compare:
+        compare(*args.compare)
+    else:
+        run(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""
+pytest plugin measuring the controller overhead of a distributed run.
+
+Loaded by ``controller_overhead.py`` with ``-p xdist_bench``; the
+measurements are written as JSON to the file named by the
+``XDIST_BENCH_OUTPUT`` environment variable when the session finishes.
+"""
+import json
+import os
+import time
+
+import pytest
+
+
+class ControllerStats:
+    def __init__(self, dsession):
+        self.events = 0
+        self.loop_time = 0.0
+        self.first_report = None
+        self.cpu_start = time.process_time()
+        self.wall_start = time.time()
+
+        loop_once = dsession.loop_once
+
+        def counting_loop_once():
+            start = time.perf_counter()
+            try:
+                return loop_once()
+            finally:
+                self.loop_time += time.perf_counter() - start
+                self.events += 1
+
+        dsession.loop_once = counting_loop_once
+
+    @pytest.hookimpl
+    def pytest_runtest_logreport(self, report):
+        if self.first_report is None:
+            self.first_report = time.time()
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_sessionfinish(self, session):
+        wall = time.time() - self.wall_start
+        stats = {
+            "collected": session.testscollected,
+            "wall": wall,
+            "controller_cpu": time.process_time() - self.cpu_start,
+            "events": self.events,
+            "events_per_sec": self.events / self.loop_time if self.loop_time else 0.0,
+            "loop_time": self.loop_time,
+            "first_report": self.first_report,
+        }
+        with open(os.environ["XDIST_BENCH_OUTPUT"], "w") as f:
+            json.dump(stats, f)
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_sessionstart(session):
+    # Only the controller has a dsession, workers are not measured
+    pluginmanager = session.config.pluginmanager
+    dsession = pluginmanager.getplugin("dsession")
+    if dsession is not None and "XDIST_BENCH_OUTPUT" in os.environ:
+        pluginmanager.register(ControllerStats(dsession), "xdist_bench_stats")
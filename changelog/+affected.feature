@@ -0,0 +1 @@
+Added ``--affected-record`` to record the source files each test depends on, and ``--affected`` to only run the tests affected by the files changed since, according to ``git``, with ``--dist loadscope``.
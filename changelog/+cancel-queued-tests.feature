@@ -0,0 +1 @@
+When the session stops early, e.g. on ``--maxfail``, the workers now drop their queued tests and stop after their current test, instead of running their whole queue first.
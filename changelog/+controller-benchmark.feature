@@ -0,0 +1 @@
+Added ``benchmarks/controller_overhead.py`` to measure the controller CPU time per test, the events processed per second and the time to the first report for each worker count and ``--dist`` mode, and to compare the results across commits.
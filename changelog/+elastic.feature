@@ -0,0 +1 @@
+Added ``--elastic`` to start more workers during a ``--dist loadscope`` run while tests are waiting and the CPUs are underused.
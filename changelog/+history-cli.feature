@@ -0,0 +1 @@
+Added ``python -m xdist.history`` to query the timing history for the slowest tests, duration regressions, flaky tests and the predicted load of bins.
@@ -0,0 +1 @@
+``--looponfail`` now waits for file changes with inotify on Linux instead of polling. Where it polls, directories which did not change are no longer listed again.
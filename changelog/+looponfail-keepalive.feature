@@ -0,0 +1 @@
+``--looponfail`` now keeps its subprocess between runs and only imports again the changed modules and the modules importing them. The subprocess is still restarted when an extension module or a module outside the looponfail roots changes.
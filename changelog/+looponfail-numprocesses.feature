@@ -0,0 +1 @@
+``--looponfail`` can now be combined with ``-n`` to distribute each run across workers, which are kept between runs. Failing-set reruns only run the failing tests on the workers.
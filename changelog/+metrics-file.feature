@@ -0,0 +1 @@
+Added ``--metrics-file`` and ``--metrics-interval`` to export metrics of the distributed run in the OpenMetrics text format.
@@ -0,0 +1 @@
+Added ``--prioritize`` to run the tests which failed in the last run and the tests of recently changed files first.
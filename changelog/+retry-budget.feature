@@ -0,0 +1 @@
+Added ``--retry-budget`` and ``--retry-time-budget`` to cap the number of retries of failing tests and the time spent running them with ``--dist loadscope``. Tests failing the same way three times in a row are no longer retried.
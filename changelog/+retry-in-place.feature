@@ -0,0 +1 @@
+Added ``--retry-in-place`` to retry failing tests right away in their worker with ``--dist loadscope``, reusing the fixtures of broader scopes.
@@ -0,0 +1 @@
+Added ``python -m xdist.sim`` to compare the ``--dist`` modes offline by replaying recorded test durations against simulated workers.
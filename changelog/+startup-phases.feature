@@ -0,0 +1 @@
+The startup time of each worker is broken down by phase in the terminal summary with ``-v``, and passed to the new ``pytest_xdist_node_started`` hook.
@@ -0,0 +1 @@
+Added ``--suggest-bins`` and ``python -m xdist.history bins --suggest`` to analyse which bins of a ``--dist loadscope`` run finish last and suggest moves of ``bins.json`` entries that shorten the run. ``bins.json`` entries can now be node ids.
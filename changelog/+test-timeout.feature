@@ -0,0 +1 @@
+Added ``--test-timeout`` and the ``xdist_timeout`` marker to fail hung tests: their worker is killed after dumping its thread stacks and replaced. With ``--dist loadscope``, the tests left on a dead worker are now run by the other workers.
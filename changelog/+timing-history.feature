@@ -0,0 +1 @@
+The duration of each phase of each test is now recorded in a SQLite timing history in the pytest cache, which is kept across runs. It replaces ``durations.csv``.
@@ -0,0 +1 @@
+Added ``--max-worker-rss`` and ``--max-tests-per-worker`` to replace ``--dist loadscope`` workers over a memory or test count limit before they crash.
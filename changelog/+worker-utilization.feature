@@ -0,0 +1 @@
+The terminal summary now shows the utilization and the idle time of the workers, and with ``-v`` the figures of each worker.
@@ -0,0 +1 @@
+Workers can be given a weight with ``--tx popen//weight=N``, or have it measured during the run with ``//weight=auto``, to send them a matching share of the tests.
@@ -0,0 +1 @@
+Added ``--xdist-log-dir`` and ``--xdist-log-level`` to write the logs of the controller and of each worker as JSON lines, buffered and written by a background thread.
@@ -0,0 +1 @@
+Added ``--xdist-trace`` to write a timeline of the workers and of the controller in the Chrome trace-event format, readable by ``chrome://tracing`` and Perfetto.
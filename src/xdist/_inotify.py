@@ -0,0 +1,100 @@
+"""
+Minimal ctypes binding of the Linux inotify API.
+
+Used by looponfail to wait for changes to the watched roots without polling,
+only the calls and event flags needed there are exposed.
+"""
+import ctypes
+import errno
+import os
+import select
+import struct
+import sys
+from typing import List, Optional, Tuple
+
+IN_ATTRIB = 0x00000004
+IN_MODIFY = 0x00000002
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+# struct inotify_event {int wd; uint32_t mask, cookie, len; char name[];}
+_EVENT = struct.Struct("iIII")
+
+_BUFSIZE = 64 * 1024
+
+
+def _load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        add_watch = libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    libc.inotify_init1.argtypes = [ctypes.c_int]
+    return libc
+
+
+def _error(path=None):
+    code = ctypes.get_errno()
+    return OSError(code, os.strerror(code), path)
+
+
+class Inotify:
+    """An inotify instance, raises ``OSError`` if inotify is not available."""
+
+    def __init__(self) -> None:
+        libc = _load_libc()
+        if libc is None:
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self._libc = libc
+        self.fd = libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if self.fd < 0:
+            raise _error()
+
+    def add_watch(self, path, mask: int) -> int:
+        wd: int = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise _error(str(path))
+        return wd
+
+    def rm_watch(self, wd: int) -> None:
+        # the watch is gone already if its directory was removed
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self, timeout: Optional[float] = None) -> List[Tuple[int, int, str]]:
+        """Return the pending events as (wd, mask, name) tuples.
+
+        Waits up to ``timeout`` seconds for an event, forever if None.
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, _BUFSIZE)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            events.append((wd, mask, os.fsdecode(name)))
+        return events
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
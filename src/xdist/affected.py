@@ -0,0 +1,210 @@
+"""
+Selection of the tests affected by the changes since a recorded run.
+
+With ``--affected-record`` every worker records the source files below the
+rootdir executed by each test, and those imported by its module according
+to their sources.  The controller merges them into a dependency map stored
+in the pytest cache directory, along with the git revision of the run.
+
+With ``--affected`` only the tests depending on a file changed since that
+revision, according to ``git diff`` and the untracked files, and the tests
+missing from the map are run.  The bins are rebuilt from them and packed by
+their expected duration, which may leave fewer bins than workers.  Changes
+to a ``conftest.py`` or to the ini file select every test, as their effect
+is not visible in the map.
+"""
+import fnmatch
+import heapq
+import json
+import os
+import subprocess
+
+from xdist.history import bin_entry_selector, in_bin_entry, nodeid_file, TimingHistory
+
+
+def _git(rootdir, *args):
+    try:
+        result = subprocess.run(
+            ["git", *args],
+            cwd=str(rootdir),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout
+
+
+def git_revision(rootdir):
+    """Return the commit checked out in ``rootdir``, None without git."""
+    output = _git(rootdir, "rev-parse", "HEAD")
+    return output.strip() if output else None
+
+
+def changed_files(rootdir, revision):
+    """Return the files changed since ``revision``, relative to ``rootdir``.
+
+    Includes the uncommitted and the untracked files.  Return None if they
+    can't be determined.
+    """
+    toplevel = _git(rootdir, "rev-parse", "--show-toplevel")
+    diff = _git(rootdir, "diff", "--name-only", "--no-renames", revision, "--")
+    untracked = _git(
+        rootdir, "ls-files", "--others", "--exclude-standard", "--full-name"
+    )
+    if toplevel is None or diff is None or untracked is None:
+        return None
+    toplevel = toplevel.strip()
+    rootdir = os.path.realpath(str(rootdir))
+    changed = set()
+    for name in diff.splitlines() + untracked.splitlines():
+        path = os.path.relpath(os.path.join(toplevel, name), rootdir)
+        changed.add(path.replace(os.sep, "/"))
+    return changed
+
+
+class DependencyMap:
+    """The source files executed by each test, keyed by nodeid.
+
+    ``path`` is the JSON file the map is stored in, None when the cache
+    provider is disabled.
+    """
+
+    FILENAME = "affected.json"
+
+    def __init__(self, path=None):
+        self.path = path
+        self.revision = None
+        self.tests = {}
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.revision = data["revision"]
+            files = data["files"]
+            self.tests = {
+                nodeid: {files[i] for i in indexes}
+                for nodeid, indexes in data["tests"].items()
+            }
+
+    @classmethod
+    def from_config(cls, config):
+        cache = getattr(config, "cache", None)
+        if cache is None:
+            return cls()
+        return cls(str(cache.mkdir("xdist") / cls.FILENAME))
+
+    def update(self, dependencies):
+        """Merge the ``workeroutput["dependencies"]`` of a worker."""
+        files = dependencies["files"]
+        for nodeid, indexes in dependencies["tests"].items():
+            self.tests[nodeid] = {files[i] for i in indexes}
+
+    def save(self, revision):
+        self.revision = revision
+        if self.path is None:
+            return
+        files = sorted({name for deps in self.tests.values() for name in deps})
+        indexes = {name: i for i, name in enumerate(files)}
+        data = {
+            "revision": revision,
+            "files": files,
+            "tests": {
+                nodeid: sorted(indexes[name] for name in deps)
+                for nodeid, deps in sorted(self.tests.items())
+            },
+        }
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    def affected(self, changed):
+        """Return the recorded tests depending on one of the ``changed`` files."""
+        return {nodeid for nodeid, deps in self.tests.items() if deps & changed}
+
+
+def is_global_change(changed, inifile=None):
+    """Return True if ``changed`` may affect every test."""
+    return any(
+        path == inifile or path.rsplit("/", 1)[-1] == "conftest.py" for path in changed
+    )
+
+
+def select_bins(bins, tests, affected, expected, changed=(), default_duration=1.0):
+    """Rebuild ``bins`` with only the ``affected`` tests.
+
+    ``tests`` are the recorded nodeids, the entries of ``bins`` selecting no
+    recorded test are new and kept whole, as are those whose tests are all
+    affected; of the others only the affected nodeids are kept, along with
+    the ``changed`` test files below them which have no recorded test, as
+    they are new or untracked.  The kept entries are packed by their
+    ``expected`` duration, longest first, into at most as many bins as
+    before.  Empty bins are dropped.
+    """
+    selected_by = bin_entry_selector(tests)
+    recorded_files = {nodeid_file(nodeid) for nodeid in tests}
+    new_files = sorted(path for path in changed if path not in recorded_files)
+    pieces = []
+    for entries in bins:
+        for entry in entries:
+            selected = selected_by(entry)
+            if not selected or all(nodeid in affected for nodeid in selected):
+                pieces.append((entry, selected))
+            else:
+                pieces.extend(
+                    (nodeid, [nodeid]) for nodeid in selected if nodeid in affected
+                )
+                pieces.extend(
+                    (path, []) for path in new_files if in_bin_entry(path, entry)
+                )
+    if not pieces:
+        return []
+
+    def duration(nodeids):
+        if not nodeids:
+            return default_duration
+        return sum(expected.get(nodeid, default_duration) for nodeid in nodeids)
+
+    pieces.sort(key=lambda piece: duration(piece[1]), reverse=True)
+    count = min(len(bins), len(pieces))
+    loads = [(0.0, i) for i in range(count)]
+    selected_bins = [[] for _ in range(count)]
+    for entry, nodeids in pieces:
+        load, i = heapq.heappop(loads)
+        selected_bins[i].append(entry)
+        heapq.heappush(loads, (load + duration(nodeids), i))
+    return selected_bins
+
+
+def affected_bins(config, bins):
+    """Return ``bins`` restricted to the tests affected by the changes.
+
+    Return ``bins`` unchanged, along with the reason, when the affected
+    tests can't be determined.
+    """
+    dependencies = DependencyMap.from_config(config)
+    if dependencies.revision is None:
+        return bins, "no dependency map recorded, run with --affected-record"
+    changed = changed_files(config.rootpath, dependencies.revision)
+    if changed is None:
+        return bins, f"cannot diff against {dependencies.revision[:12]}"
+    inifile = None
+    if config.inipath:
+        inifile = os.path.relpath(config.inipath, config.rootpath).replace(os.sep, "/")
+    if is_global_change(changed, inifile):
+        return bins, "a conftest.py or the ini file changed"
+    affected = dependencies.affected(changed)
+    expected = TimingHistory.from_config(config).ewma(phase=None)
+    patterns = config.getini("python_files")
+    test_files = [
+        path
+        for path in changed
+        if any(fnmatch.fnmatch(path.rsplit("/", 1)[-1], p) for p in patterns)
+        and os.path.isfile(os.path.join(config.rootpath, path))
+    ]
+    selected = select_bins(bins, dependencies.tests, affected, expected, test_files)
+    return selected, (
+        f"{len(affected)} recorded tests affected by {len(changed)} changed files "
+        f"since {dependencies.revision[:12]}"
+    )
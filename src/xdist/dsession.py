@@ -1,20 +1,25 @@
 from __future__ import annotations
+import contextlib
+import copy
+import json
+import sqlite3
 import sys
+import time
 from enum import Enum, auto
 from typing import Sequence
 
 import pytest
 
-from xdist.remote import Producer
-from xdist.workermanage import NodeManager
-from xdist.scheduler import (
-    EachScheduling,
-    LoadScheduling,
-    LoadScopeScheduling,
-    LoadFileScheduling,
-    LoadGroupScheduling,
-    WorkStealingScheduling,
-)
+from xdist.affected import DependencyMap, git_revision
+from xdist.elastic import ElasticScaler
+from xdist.history import TimingHistory, suggest_bins
+from xdist.metrics import MetricsExporter
+from xdist.recycle import WorkerRecycler
+from xdist.remote import Producer, log_enabled
+from xdist.trace import TraceRecorder
+from xdist.watchdog import Watchdog
+from xdist.workermanage import NodeManager, WorkerController
+from xdist.scheduler import SCHEDULERS
 
 
 from queue import Empty, Queue
@@ -40,9 +45,30 @@ class DSession:
 
     def __init__(self, config):
         self.config = config
-        self.log = Producer("dsession", enabled=config.option.debug)
+        self.log = Producer("dsession", enabled=log_enabled(config))
         self.nodemanager = None
         self.sched = None
+        self.timing_history = None
+        self.startup_timings = {}
+        self.time_to_first_test = {}
+        self.utilization = WorkerUtilization()
+        self.bin_suggestion = None
+        self.dependency_map = None
+        self._revision = None
+        self.elastic = None
+        if config.getoption("elastic", False):
+            self.elastic = ElasticScaler.from_config(self, config)
+        self.recycler = WorkerRecycler.from_config(self, config)
+        self.watchdog = Watchdog(self)
+        self.metrics = None
+        if config.getoption("metricsfile", None):
+            self.metrics = MetricsExporter(
+                self,
+                config.getoption("metricsfile"),
+                config.getoption("metricsinterval"),
+            )
+        self._bin_index = {}
+        self._start_time = None
         self.shuttingdown = False
         self.countfailures = 0
         self.maxfail = config.getvalue("maxfail")
@@ -59,6 +85,10 @@ class DSession:
         if self.terminal:
             self.trdist = TerminalDistReporter(config)
             config.pluginmanager.register(self.trdist, "terminaldistreporter")
+        self.trace = None
+        if config.getoption("xdisttrace", None):
+            self.trace = TraceRecorder(config.getoption("xdisttrace"))
+            config.pluginmanager.register(self.trace, "xdisttrace")
 
     @property
     def session_finished(self):
@@ -80,8 +110,27 @@ class DSession:
         The nodes are setup to put their events onto self.queue.  As
         soon as nodes start they will emit the worker_workerready event.
         """
+        if getattr(self.config, "cache", None) is not None:
+            try:
+                self.timing_history = TimingHistory.from_config(self.config)
+                self.timing_history.start_run()
+            except (OSError, sqlite3.OperationalError) as e:
+                self._disable_timing_history(e)
+        self._start_time = time.time()
+        if self.config.getoption("affectedrecord"):
+            self.dependency_map = DependencyMap.from_config(self.config)
+            self._revision = git_revision(self.config.rootpath)
         self.nodemanager = NodeManager(self.config)
+        if self.nodemanager.affected_reason:
+            self.report_line(f"affected tests: {self.nodemanager.affected_reason}")
+        priority = self.nodemanager.priority
+        if priority:
+            self.report_line(
+                f"prioritized: {len(priority['failed'])} failed tests, "
+                f"{len(priority['changed'])} changed files"
+            )
         nodes = self.nodemanager.setup_nodes(putevent=self.queue.put)
+        self._bin_index = {node.gateway.id: i for i, node in enumerate(nodes)}
         self._active_nodes.update(nodes)
         self._session = session
 
@@ -90,7 +139,18 @@ class DSession:
         """Shutdown all nodes."""
         nm = getattr(self, "nodemanager", None)  # if not fully initialized
         if nm is not None:
-            nm.teardown_nodes()
+            nm.teardown_nodes(self.recycler.retired if self.recycler else ())
+        if self.timing_history is not None:
+            try:
+                self.timing_history.finish_run()
+            except sqlite3.OperationalError as e:
+                self._disable_timing_history(e)
+        if nm is not None and self.config.getoption("suggestbins"):
+            self.bin_suggestion = self._suggest_bins(nm)
+        if self.metrics is not None:
+            self.metrics.write()
+        if self.dependency_map is not None and self._revision is not None:
+            self.dependency_map.save(self._revision)
         self._session = None
 
     @pytest.hookimpl
@@ -101,18 +161,13 @@ class DSession:
     @pytest.hookimpl(trylast=True)
     def pytest_xdist_make_scheduler(self, config, log):
         dist = config.getvalue("dist")
-        schedulers = {
-            "each": EachScheduling,
-            "load": LoadScheduling,
-            "loadscope": LoadScopeScheduling,
-            "loadfile": LoadFileScheduling,
-            "loadgroup": LoadGroupScheduling,
-            "worksteal": WorkStealingScheduling,
-        }
-        return schedulers[dist](config, log)
+        return SCHEDULERS[dist](config, log)
 
     @pytest.hookimpl
     def pytest_runtestloop(self):
+        if not self._active_nodes:
+            # no bin left to run, see --affected
+            return True
         self.sched = self.config.hook.pytest_xdist_make_scheduler(
             config=self.config, log=self.log
         )
@@ -122,7 +177,7 @@ class DSession:
         while not self.session_finished:
             self.loop_once()
             if self.shouldstop:
-                self.triggershutdown()
+                self.triggershutdown(cancel=True)
                 raise Interrupted(str(self.shouldstop))
         return True
 
@@ -133,6 +188,11 @@ class DSession:
                 # If everything has died stop looping
                 self.triggershutdown()
                 raise RuntimeError("Unexpectedly no active workers available")
+            if self.elastic is not None:
+                self.elastic.tick()
+            self.watchdog.tick()
+            if self.metrics is not None:
+                self.metrics.tick()
             try:
                 eventcall = self.queue.get(timeout=2.0)
                 break
@@ -142,7 +202,14 @@ class DSession:
         assert callname, kwargs
         method = "worker_" + callname
         call = getattr(self, method)
-        call(**kwargs)
+        if self.trace is None:
+            call(**kwargs)
+        else:
+            start = time.time()
+            call(**kwargs)
+            self.trace.controller_event(callname, start, kwargs.get("node"))
+        if self.metrics is not None:
+            self.metrics.event_processed(self.queue.qsize())
         if self.sched.tests_finished:
             self.triggershutdown()
 
@@ -159,6 +226,8 @@ class DSession:
         node.workerinfo = workerinfo
         node.workerinfo["id"] = node.gateway.id
         node.workerinfo["spec"] = node.gateway.spec
+        node.mark_startup_phase("bootstrap", workerinfo.get("startup"))
+        self.startup_timings[node.gateway.id] = node.startup_timings
 
         self.config.hook.pytest_testnodeready(node=node)
         if self.shuttingdown:
@@ -179,6 +248,9 @@ class DSession:
             self.shouldstop = f"{node} received keyboard-interrupt"
             self.worker_errordown(node, "keyboard-interrupt")
             return
+        dependencies = node.workeroutput.get("dependencies")
+        if self.dependency_map is not None and dependencies:
+            self.dependency_map.update(dependencies)
         if node in self.sched.nodes:
             crashitem = self.sched.remove_node(node)
             assert not crashitem, (crashitem, node)
@@ -203,15 +275,29 @@ class DSession:
             self.config.hook.pytest_internalerror(excrepr=excrepr, excinfo=excinfo)
 
     def worker_errordown(self, node, error):
-        """Emitted by the WorkerController when a node dies."""
+        """Emitted by the WorkerController when a node dies.
+
+        This includes the nodes killed by the watchdog, whose test timed out.
+        Their test is reported as failed, and they are replaced without
+        counting as crashed.
+        """
         self.config.hook.pytest_testnodedown(node=node, error=error)
+        hang = self.watchdog.hangs.pop(node, None)
         try:
             crashitem = self.sched.remove_node(node)
         except KeyError:
-            pass
-        else:
-            if crashitem:
-                self.handle_crashitem(crashitem, node)
+            crashitem = None
+        if hang is not None:
+            self.handle_crashitem(
+                crashitem or hang.nodeid, node, hang.report(node.gateway.id)
+            )
+            if not self.shuttingdown:
+                self.report_line("\nreplacing hung worker %s" % node.gateway.id)
+                self._clone_node(node)
+            self._active_nodes.remove(node)
+            return
+        if crashitem:
+            self.handle_crashitem(crashitem, node)
 
         self._failed_nodes_count += 1
         maximum_reached = (
@@ -238,6 +324,99 @@ class DSession:
     def pytest_terminal_summary(self, terminalreporter):
         if self.config.option.verbose >= 0 and self._summary_report:
             terminalreporter.write_sep("=", f"xdist: {self._summary_report}")
+        retry_summary = getattr(self.sched, "retry_summary", None)
+        if self.config.option.verbose >= 0 and retry_summary is not None:
+            for line in retry_summary():
+                terminalreporter.write_sep("=", f"xdist: {line}")
+        utilization = self.utilization.summary(self.config.option.verbose > 0)
+        if self.config.option.verbose >= 0 and utilization:
+            terminalreporter.write_sep("=", f"xdist: {utilization[0]}")
+            for line in utilization[1:]:
+                terminalreporter.write_line(line)
+        if self.config.option.verbose >= 0 and self.bin_suggestion:
+            self._write_bin_suggestion(terminalreporter)
+        if self.config.option.verbose > 0 and self.startup_timings:
+            self._write_startup_timings(terminalreporter)
+
+    def _record_timing(self, node, rep):
+        if self.timing_history is None:
+            return
+        try:
+            self.timing_history.record_report(rep, worker=node.gateway.id)
+        except sqlite3.OperationalError as e:
+            self._disable_timing_history(e)
+
+    def _disable_timing_history(self, error):
+        """Stop recording the timing history, the run goes on without it."""
+        if self.timing_history is not None:
+            with contextlib.suppress(sqlite3.Error):
+                self.timing_history.connection.close()
+            self.timing_history = None
+        self.report_line(f"timing history not recorded: {error}")
+
+    def _suggest_bins(self, nodemanager):
+        """Analyse the critical path of the run, suggest better bins.
+
+        The suggestion is written to the ``--suggest-bins`` file if given.
+        """
+        durations = getattr(self.sched, "durations", None)
+        if not durations:
+            return None
+        bins = [
+            [entry for entry in path.split(",") if entry] for path in nodemanager.paths
+        ]
+        suggestion = suggest_bins(bins, durations)
+        if self.utilization.finished:
+            last = max(self.utilization.finished, key=self.utilization.finished.get)
+            suggestion["last_worker"] = last
+            suggestion["last_worker_bin"] = self._bin_index.get(last)
+        path = self.config.getoption("suggestbins")
+        if path:
+            with open(path, "w") as f:
+                json.dump(suggestion, f, indent=2)
+        return suggestion
+
+    def _write_bin_suggestion(self, terminalreporter):
+        suggestion = self.bin_suggestion
+        loads = suggestion["loads"]
+        line = (
+            f"critical bin {suggestion['critical_bin']} takes "
+            f"{suggestion['makespan']:.2f}s, the mean bin "
+            f"{sum(loads) / len(loads):.2f}s"
+        )
+        if "last_worker" in suggestion:
+            line = f"{suggestion['last_worker']} finished last, {line}"
+        terminalreporter.write_sep("=", f"xdist: {line}")
+        for unit in suggestion["dominant"]:
+            share = unit["duration"] / suggestion["makespan"]
+            terminalreporter.write_line(
+                f"{unit['duration']:10.2f}s {share:6.1%}  {unit['entry']}"
+            )
+        saving = suggestion["makespan"] - suggestion["predicted_makespan"]
+        moves = len(suggestion["moves"])
+        if moves:
+            line = f"moving {moves} bin entries would save {saving:.2f}s"
+            path = self.config.getoption("suggestbins")
+            if path:
+                line += f", see {path}"
+            terminalreporter.write_line(line)
+
+    def _write_startup_timings(self, terminalreporter):
+        phases = WorkerController.STARTUP_PHASES
+        terminalreporter.write_sep("=", "xdist: worker startup phases (seconds)")
+        columns = [*phases, "time_to_first"]
+        terminalreporter.write_line(
+            " ".join(["worker  ", *(f"{column:>13}" for column in columns)])
+        )
+        for worker, timings in self.startup_timings.items():
+            timings = dict(timings)
+            if worker in self.time_to_first_test:
+                timings["time_to_first"] = self.time_to_first_test[worker]
+            durations = [
+                f"{timings[column]:13.3f}" if column in timings else f"{'-':>13}"
+                for column in columns
+            ]
+            terminalreporter.write_line(" ".join([f"{worker:<8}", *durations]))
 
     def worker_collectionfinish(self, node, ids):
         """worker has finished test collection.
@@ -253,6 +432,7 @@ class DSession:
         self.config.hook.pytest_xdist_node_collection_finished(node=node, ids=ids)
         # tell session which items were effectively collected otherwise
         # the controller node will finish the session with EXIT_NOTESTSCOLLECTED
+        node.mark_startup_phase("collection")
         total = self.sched.add_node_collection(node, ids)
         self._session.testscollected = total
         if self.terminal:
@@ -260,6 +440,10 @@ class DSession:
                 node.gateway.spec, WorkerStatus.CollectionDone, tests_collected=len(ids)
             )
         if self.sched.collection_is_completed:
+            for collected in self.sched.nodes:
+                if "wait" not in collected.startup_timings:
+                    collected.mark_startup_phase("wait")
+                self.utilization.start(collected.gateway.id)
             if self.terminal and not self.sched.has_pending:
                 self.trdist.ensure_show_status()
                 self.terminal.write_line("")
@@ -269,8 +453,46 @@ class DSession:
                     )
             self.sched.schedule()
 
+    def worker_collectionextended(self, node, ids, error=None):
+        """worker has collected more tests in response to 'collect_and_run'.
+
+        The new items have been appended to the worker's collection and
+        queued for execution by the worker itself, the scheduler only needs
+        to start tracking them.  The requested tests the worker could not
+        collect are reported as failed.
+        """
+        missing = self.sched.extend_node_collection(node, ids)
+        for nodeid in missing:
+            msg = f"worker {node.gateway.id!r} could not collect {nodeid!r}"
+            if error:
+                msg += f"\n\n{error}"
+            self.config.hook.pytest_runtest_logreport(
+                report=self._failed_report(nodeid, node, msg)
+            )
+
+    def worker_retried(self, node, rep, item_index, retries, passed, duration):
+        """worker has retried a test in place, its final reports follow."""
+        self._record_timing(node, rep)
+        if self.trace is not None:
+            self.trace.retried(node, rep, retries, passed)
+        self.sched.handle_retried_test(node, rep, item_index, retries, passed, duration)
+
     def worker_logstart(self, node, nodeid, location):
         """Emitted when a node calls the pytest_runtest_logstart hook."""
+        self.utilization.test_started(node.gateway.id)
+        if "first_test" not in node.startup_timings:
+            node.mark_startup_phase("first_test")
+            elapsed = time.time() - self._start_time
+            self.time_to_first_test[node.gateway.id] = elapsed
+            self.config.hook.pytest_xdist_node_started(
+                node=node,
+                timings={
+                    phase: node.startup_timings[phase]
+                    for phase in node.STARTUP_PHASES
+                    if phase in node.startup_timings
+                },
+                time_to_first_test=elapsed,
+            )
         self.config.hook.pytest_runtest_logstart(nodeid=nodeid, location=location)
 
     def worker_logfinish(self, node, nodeid, location):
@@ -280,6 +502,11 @@ class DSession:
     def worker_testreport(self, node, rep):
         """Emitted when a node calls the pytest_runtest_logreport hook."""
         rep.node = node
+        self._record_timing(node, rep)
+        if self.trace is not None:
+            self.trace.test_report(node, rep)
+        if self.metrics is not None:
+            self.metrics.report_received(rep)
 
         if rep.failed:
             should_count = self._handlefailures(node, rep)
@@ -288,19 +515,32 @@ class DSession:
                 self.failures[rep.nodeid] = rep
 
             if should_count:
-                self.config.hook.pytest_runtest_logreport(report=self.failures[rep.nodeid])
-        else:
+                self.config.hook.pytest_runtest_logreport(
+                    report=self.failures[rep.nodeid]
+                )
+        elif self._handlepassed(node, rep):
             self.config.hook.pytest_runtest_logreport(report=rep)
 
 
-    def worker_runtest_protocol_complete(self, node, item_index, duration):
+    def worker_runtest_protocol_complete(self, node, item_index, duration, rss=None):
         """
         Emitted when a node fires the 'runtest_protocol_complete' event,
         signalling that a test has completed the runtestprotocol and should be
         removed from the pending list in the scheduler.
+
+        ``rss`` is the resident memory of the worker, with --max-worker-rss.
         """
         self.log("worker_runtest_protocol_complete", node, item_index, duration)
+        self.utilization.test_finished(node.gateway.id)
+        if self.metrics is not None:
+            self.metrics.test_finished(node.gateway.id)
         self.sched.mark_test_complete(node, item_index, duration)
+        if self.recycler is not None:
+            self.recycler.test_finished(node, rss)
+
+    def worker_stacks(self, node, stacks):
+        """Emitted when a node answers the 'dump_stacks' command."""
+        self.watchdog.stacks_received(node, stacks)
 
     def worker_unscheduled(self, node, indices):
         """
@@ -336,6 +576,21 @@ class DSession:
         )
         self.config.hook.pytest_warning_recorded.call_historic(kwargs=kwargs)
 
+    def add_worker(self, template):
+        """Start a worker without a bin of its own.
+
+        See ``xdist.elastic`` and ``xdist.recycle``.  It uses the spec of the
+        ``template`` node and gets its tests from the other workers once it
+        has joined the scheduler.
+        """
+        spec = copy.copy(template.gateway.spec)
+        spec.id = None
+        self.nodemanager.group.allocate_id(spec)
+        self.log("adding worker", spec.id)
+        node = self.nodemanager.setup_node(spec, self.queue.put, None)
+        self._active_nodes.add(node)
+        return node
+
     def _clone_node(self, node):
         """Return new node based on an existing one.
 
@@ -347,7 +602,11 @@ class DSession:
         spec = node.gateway.spec
         spec.id = None
         self.nodemanager.group.allocate_id(spec)
-        node = self.nodemanager.setup_node(spec, self.queue.put)
+        path = node.path
+        if node in getattr(self.sched, "registered_collections", ()):
+            # the scheduler hands the tests left by the node to another one
+            path = None
+        node = self.nodemanager.setup_node(spec, self.queue.put, path)
         self._active_nodes.add(node)
         return node
 
@@ -375,21 +634,30 @@ class DSession:
             return should_count
         return True
 
-    def triggershutdown(self):
+    def _handlepassed(self, node, rep):
+        # only schedulers which retry failed tests may hold back other reports
+        handle_passed_test = getattr(self.sched, "handle_passed_test", None)
+        return handle_passed_test is None or handle_passed_test(node, rep)
+
+    def triggershutdown(self, cancel=False):
+        """Shut all nodes down.
+
+        With ``cancel`` the session is stopped early, e.g. on maxfail: the
+        nodes drop their queued tests and stop after their current one.
+        """
         self.shuttingdown = True
         for node in self.sched.nodes:
-            node.shutdown()
+            if cancel:
+                node.cancel()
+            else:
+                node.shutdown()
 
-    def handle_crashitem(self, nodeid, worker):
+    def handle_crashitem(self, nodeid, worker, msg=None):
         # XXX get more reporting info by recording pytest_runtest_logstart?
         # XXX count no of failures and retry N times
-        runner = self.config.pluginmanager.getplugin("runner")
-        fspath = nodeid.split("::")[0]
-        msg = f"worker {worker.gateway.id!r} crashed while running {nodeid!r}"
-        rep = runner.TestReport(
-            nodeid, (fspath, None, fspath), (), "failed", msg, "???"
-        )
-        rep.node = worker
+        if msg is None:
+            msg = f"worker {worker.gateway.id!r} crashed while running {nodeid!r}"
+        rep = self._failed_report(nodeid, worker, msg)
 
         self.config.hook.pytest_handlecrashitem(
             crashitem=nodeid,
@@ -398,6 +666,81 @@ class DSession:
         )
         self.config.hook.pytest_runtest_logreport(report=rep)
 
+    def _failed_report(self, nodeid, worker, msg):
+        """Return a failed report of ``nodeid``, which ``worker`` did not run."""
+        runner = self.config.pluginmanager.getplugin("runner")
+        fspath = nodeid.split("::")[0]
+        rep = runner.TestReport(
+            nodeid, (fspath, None, fspath), (), "failed", msg, "???"
+        )
+        rep.node = worker
+        return rep
+
+
+class WorkerUtilization:
+    """Busy and idle time of each worker, as seen by the controller.
+
+    A worker is idle from the start of the scheduling until its first
+    'logstart' event, between each 'runtest_protocol_complete' event and the
+    next 'logstart' one, and from its last test until the last worker
+    finishes its tests.
+    """
+
+    def __init__(self):
+        self.idle = {}
+        self.started = {}
+        self.finished = {}
+        self._idle_since = {}
+
+    def start(self, worker, now=None):
+        """Start accounting for ``worker``, which is waiting for tests."""
+        now = time.time() if now is None else now
+        self.idle.setdefault(worker, 0.0)
+        self.started.setdefault(worker, now)
+        self._idle_since.setdefault(worker, now)
+
+    def test_started(self, worker, now=None):
+        now = time.time() if now is None else now
+        if worker not in self.started:
+            # a worker replacing a crashed one
+            self.start(worker, now)
+        idle_since = self._idle_since.pop(worker, None)
+        if idle_since is not None:
+            self.idle[worker] += now - idle_since
+
+    def test_finished(self, worker, now=None):
+        now = time.time() if now is None else now
+        self._idle_since[worker] = now
+        self.finished[worker] = now
+
+    def summary(self, verbose=False):
+        """Return the lines summarizing the utilization of the workers."""
+        if not self.finished:
+            return []
+        end = max(self.finished.values())
+        idle = {
+            worker: self.idle[worker] + end - self._idle_since.get(worker, end)
+            for worker in self.idle
+        }
+        total = sum(end - started for started in self.started.values())
+        idle_total = sum(idle.values())
+        utilization = 1.0 - idle_total / total if total else 1.0
+        lines = [
+            f"worker utilization {utilization:.1%}, "
+            f"{idle_total:.2f} idle core-seconds, "
+            f"{end - min(self.finished.values()):.2f}s between the first and last "
+            "worker to finish"
+        ]
+        if verbose:
+            for worker in sorted(self.idle):
+                window = end - self.started[worker]
+                busy = window - idle[worker]
+                lines.append(
+                    f"{worker}: busy {busy:.2f}s, idle {idle[worker]:.2f}s "
+                    f"({busy / window if window else 1.0:.1%})"
+                )
+        return lines
+
 
 class WorkerStatus(Enum):
     """Status of each worker during creation/collection."""
@@ -457,9 +800,11 @@ class TerminalDistReporter:
     @pytest.hookimpl
     def pytest_xdist_setupnodes(self, specs) -> None:
         self._specs = specs
-        for spec in specs:
+        if not specs:
+            return
+        for spec in specs[:-1]:
             self.setstatus(spec, WorkerStatus.Created, tests_collected=0, show=False)
-        self.setstatus(spec, WorkerStatus.Created, tests_collected=0, show=True)
+        self.setstatus(specs[-1], WorkerStatus.Created, tests_collected=0, show=True)
         self.ensure_show_status()
 
     @pytest.hookimpl
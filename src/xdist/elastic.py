@@ -0,0 +1,106 @@
+"""
+Elastic number of workers.
+
+With ``--elastic`` the controller starts more workers during the run while
+tests are waiting in the queues of the workers and the host CPU is underused,
+e.g. while I/O bound tests run, up to ``--maxprocesses`` or the number of
+CPUs.  The new workers collect no bin of their own and take their tests from
+the busiest workers, as idle workers do.  Workers are retired as before, once
+they are idle and there is nothing left to take from the others.
+"""
+import os
+import time
+
+import pytest
+
+from xdist.scheduler import dist_modes_supporting_new_nodes
+
+
+def cpu_usage():
+    """Return the fraction of the host CPU in use, None if unknown.
+
+    Uses psutil when installed, else the load average.
+    """
+    try:
+        import psutil
+    except ImportError:
+        pass
+    else:
+        return psutil.cpu_percent(interval=None) / 100.0
+    try:
+        load = os.getloadavg()[0]
+    except (AttributeError, OSError):
+        return None
+    return load / (os.cpu_count() or 1)
+
+
+class ElasticScaler:
+    """Decide when ``dsession`` should start another worker.
+
+    ``tick()`` is called by the controller loop, at most every ``INTERVAL``
+    seconds it adds a worker if at least ``MIN_BACKLOG`` tests could be taken
+    from the others, the CPU usage is below ``max_cpu`` and fewer than
+    ``max_workers`` are running.  Only one worker is started at a time.
+    Only schedulers supporting new nodes can take new workers, i.e.
+    ``--dist=loadscope`` and its subclasses; ``--elastic`` is refused with
+    the other ``--dist`` modes.
+    """
+
+    INTERVAL = 5.0
+
+    MIN_BACKLOG = 4
+
+    def __init__(self, dsession, max_workers, max_cpu=0.75):
+        self.dsession = dsession
+        self.max_workers = max_workers
+        self.max_cpu = max_cpu
+        self.added = []
+        self._last_tick = time.monotonic()
+        # the first psutil measure is meaningless, start measuring now
+        cpu_usage()
+
+    @classmethod
+    def from_config(cls, dsession, config):
+        dist_modes = dist_modes_supporting_new_nodes()
+        if config.getvalue("dist") not in dist_modes:
+            raise pytest.UsageError(
+                f"--elastic is only supported by --dist={', '.join(dist_modes)}."
+            )
+        max_workers = config.getoption("maxprocesses") or os.cpu_count() or 1
+        return cls(dsession, max_workers)
+
+    def tick(self):
+        now = time.monotonic()
+        if now - self._last_tick < self.INTERVAL:
+            return
+        self._last_tick = now
+        node = self.should_add()
+        if node is not None:
+            self.added.append(self.dsession.add_worker(node))
+
+    def should_add(self):
+        """Return the node whose spec a new worker should use, or None."""
+        dsession = self.dsession
+        sched = dsession.sched
+        backlog = getattr(sched, "backlog", None)
+        if (
+            dsession.shuttingdown
+            or backlog is None
+            or not sched.collection_is_completed
+        ):
+            return None
+        if any(
+            node in dsession._active_nodes and node not in sched.registered_collections
+            for node in self.added
+        ):
+            # the last worker added is still starting
+            return None
+        running = [node for node in sched.nodes if not node.shutting_down]
+        if not running or len(running) >= self.max_workers:
+            return None
+        if backlog() < self.MIN_BACKLOG:
+            return None
+        usage = cpu_usage()
+        if usage is None or usage >= self.max_cpu:
+            return None
+        return running[0]
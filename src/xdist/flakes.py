@@ -0,0 +1,96 @@
+"""
+Persistent per-test flakiness statistics.
+
+Every run adds the outcome of each test to a table stored in the pytest
+cache, which is then used to decide how many times a failing test is
+retried: tests which were never flaky fail fast, known flaky tests get
+enough retries to make a spurious failure unlikely.
+"""
+import math
+
+
+class FlakeHistory:
+    """Flakiness statistics of each test, keyed by nodeid.
+
+    For each test the following counters are kept:
+
+    :runs: Number of runs the test took part in.
+    :failed: Number of runs in which the first attempt failed.
+    :flaky: Number of runs in which the test passed on a retry.
+    :retries: Number of retry attempts.
+    :retry_failures: Number of retry attempts which failed.
+
+    ``cache`` is a pytest ``Cache`` instance, or None when the cache
+    provider is disabled, in which case nothing is persisted and every test
+    gets the maximum number of retries.
+    """
+
+    CACHE_KEY = "xdist/flakes"
+
+    # Desired probability of a flaky test failing all of its retries.
+    TARGET_FAILURE_PROBABILITY = 0.01
+
+    # Number of failures, all of whose retries failed too, after which a
+    # test which never passed on a retry is no longer retried.
+    DETERMINISTIC_FAILURES = 3
+
+    def __init__(self, cache=None):
+        self.cache = cache
+        if cache is None:
+            self.tests = {}
+        else:
+            self.tests = cache.get(self.CACHE_KEY, {})
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(getattr(config, "cache", None))
+
+    def retries_for(self, nodeid, max_retries):
+        """Return the number of retries a failure of ``nodeid`` deserves.
+
+        Tests which were never retried get a single retry, so new flakiness
+        can be detected, and tests which failed all of their retries in
+        several runs, without ever passing on a retry, get none.
+        """
+        if self.cache is None:
+            return max_retries
+        stats = self.tests.get(nodeid)
+        if stats is None or not stats["retries"]:
+            return min(1, max_retries)
+        if not stats["flaky"]:
+            if stats["failed"] >= self.DETERMINISTIC_FAILURES:
+                return 0
+            return min(1, max_retries)
+
+        retry_failure_rate = stats["retry_failures"] / stats["retries"]
+        if retry_failure_rate <= 0:
+            return min(1, max_retries)
+        if retry_failure_rate >= 1:
+            return max_retries
+        needed = math.ceil(
+            math.log(self.TARGET_FAILURE_PROBABILITY) / math.log(retry_failure_rate)
+        )
+        return max(1, min(needed, max_retries))
+
+    def record(self, nodeid, failed=False, retries=0, retry_failures=0):
+        """Record the outcome of ``nodeid`` in the current run.
+
+        ``retries`` is the number of retry attempts which were taken into
+        account and ``retry_failures`` how many of them failed; the test is
+        flaky if at least one retry passed.
+        """
+        stats = self.tests.setdefault(
+            nodeid,
+            {"runs": 0, "failed": 0, "flaky": 0, "retries": 0, "retry_failures": 0},
+        )
+        stats["runs"] += 1
+        if failed:
+            stats["failed"] += 1
+            stats["retries"] += retries
+            stats["retry_failures"] += retry_failures
+            if retry_failures < retries:
+                stats["flaky"] += 1
+
+    def save(self):
+        if self.cache is not None:
+            self.cache.set(self.CACHE_KEY, self.tests)
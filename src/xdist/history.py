@@ -0,0 +1,584 @@
+"""
+Persistent per-test timing history.
+
+Every run appends the duration of each phase (setup, call and teardown) of
+each test to a SQLite database in the pytest cache directory, along with the
+worker which ran it and its outcome.  Schedulers and bin packers can then
+query aggregates (EWMA, percentiles, last N samples) of the whole history.
+
+Running ``python -m xdist.history`` answers common questions about it, see
+``python -m xdist.history --help``.
+"""
+import argparse
+import json
+import math
+import os
+import sqlite3
+import statistics
+import sys
+import time
+from collections import defaultdict
+
+
+class TimingHistory:
+    """Timing history of each test, keyed by nodeid.
+
+    ``path`` is the database file, or ``":memory:"`` when the cache provider
+    is disabled, in which case only the current run is available.
+
+    Rows are written as reports come in and committed every
+    ``COMMIT_INTERVAL`` seconds, so an interrupted run keeps most of its
+    timings.
+
+    A test has one sample of each phase per run.  When it runs again in the
+    same run, e.g. when it is retried, the rows of the earlier attempts are
+    marked as ``superseded``: they only count in ``flake_rates``.
+    """
+
+    FILENAME = "history.sqlite"
+
+    COMMIT_INTERVAL = 1.0
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY,
+            started REAL NOT NULL,
+            finished REAL
+        );
+        CREATE TABLE IF NOT EXISTS durations (
+            run INTEGER NOT NULL REFERENCES runs (id),
+            nodeid TEXT NOT NULL,
+            phase TEXT NOT NULL,
+            duration REAL NOT NULL,
+            worker TEXT,
+            outcome TEXT,
+            superseded INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS durations_phase ON durations (phase, run);
+        CREATE INDEX IF NOT EXISTS durations_nodeid
+            ON durations (nodeid, phase, run);
+    """
+
+    # Samples whose weight in an EWMA is below this are not queried
+    EWMA_PRECISION = 1e-6
+
+    def __init__(self, path=":memory:"):
+        self.path = str(path)
+        self.connection = sqlite3.connect(self.path, timeout=30)
+        columns = [
+            row[1] for row in self.connection.execute("PRAGMA table_info(durations)")
+        ]
+        if columns and "superseded" not in columns:
+            # created by an older version, its earlier attempts stay samples
+            self.connection.execute(
+                "ALTER TABLE durations"
+                " ADD COLUMN superseded INTEGER NOT NULL DEFAULT 0"
+            )
+        self.connection.executescript(self.SCHEMA)
+        self.run = None
+        self._last_commit = time.monotonic()
+
+    @classmethod
+    def from_config(cls, config):
+        cache = getattr(config, "cache", None)
+        if cache is None:
+            return cls()
+        return cls(cache.mkdir("xdist") / cls.FILENAME)
+
+    def start_run(self):
+        """Start recording a new run, return its id."""
+        cursor = self.connection.execute(
+            "INSERT INTO runs (started) VALUES (?)", (time.time(),)
+        )
+        self.connection.commit()
+        self.run = cursor.lastrowid
+        return self.run
+
+    def record(self, nodeid, phase, duration, worker=None, outcome=None):
+        """Record the duration of one phase of ``nodeid`` in the current run."""
+        if self.run is None:
+            self.start_run()
+        self.connection.execute(
+            "UPDATE durations SET superseded = 1"
+            " WHERE nodeid = ? AND phase = ? AND run = ? AND NOT superseded",
+            (nodeid, phase, self.run),
+        )
+        self.connection.execute(
+            "INSERT INTO durations (run, nodeid, phase, duration, worker, outcome)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (self.run, nodeid, phase, duration, worker, outcome),
+        )
+        if time.monotonic() - self._last_commit >= self.COMMIT_INTERVAL:
+            self.commit()
+
+    def record_report(self, rep, worker=None):
+        self.record(rep.nodeid, rep.when, rep.duration, worker, rep.outcome)
+
+    def commit(self):
+        self.connection.commit()
+        self._last_commit = time.monotonic()
+
+    def finish_run(self):
+        """Mark the current run as finished and close the database."""
+        if self.run is not None:
+            self.connection.execute(
+                "UPDATE runs SET finished = ? WHERE id = ?", (time.time(), self.run)
+            )
+        self.commit()
+        self.connection.close()
+
+    def last_finished_run_start(self):
+        """Return when the last finished run started, None if there is none."""
+        row = self.connection.execute(
+            "SELECT MAX(started) FROM runs WHERE finished IS NOT NULL"
+        ).fetchone()
+        return row[0]
+
+    def _first_run(self, runs):
+        """Return the id of the oldest of the last ``runs`` runs."""
+        if runs is None:
+            return 0
+        row = self.connection.execute(
+            "SELECT id FROM runs ORDER BY id DESC LIMIT 1 OFFSET ?", (runs - 1,)
+        ).fetchone()
+        return 0 if row is None else row[0]
+
+    def _select_nodeids(self, nodeids):
+        """Return a condition restricting a query on durations to ``nodeids``."""
+        self.connection.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS selected (nodeid TEXT PRIMARY KEY)"
+        )
+        self.connection.execute("DELETE FROM temp.selected")
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO temp.selected VALUES (?)",
+            ((nodeid,) for nodeid in nodeids),
+        )
+        return " AND nodeid IN (SELECT nodeid FROM temp.selected)"
+
+    @staticmethod
+    def has_window_functions():
+        return sqlite3.sqlite_version_info >= (3, 25)
+
+    def samples(self, nodeids=None, phase="call", last=None, runs=None):
+        """Return the durations of each test, oldest first.
+
+        ``phase`` is one of "setup", "call" and "teardown", or None for the
+        sum of all phases of each run.  ``last`` limits the result to the
+        last N samples of each test, ``runs`` to the last N runs.
+        """
+        where = "run >= ? AND NOT superseded"
+        params = [self._first_run(runs)]
+        if phase is not None:
+            where += " AND phase = ?"
+            params.append(phase)
+        if nodeids is None:
+            # scanning the table beats a row lookup per entry of an index
+            table = "durations NOT INDEXED"
+        else:
+            table = "durations"
+            where += self._select_nodeids(nodeids)
+        query = (
+            f"SELECT nodeid, run, SUM(duration) AS duration FROM {table}"
+            f" WHERE {where} GROUP BY nodeid, run"
+        )
+        # window functions need SQLite 3.25, older versions drop the older
+        # samples of each test below
+        window = last is not None and self.has_window_functions()
+        if window:
+            query = (
+                "SELECT nodeid, run, duration FROM ("
+                "  SELECT *, ROW_NUMBER() OVER ("
+                "    PARTITION BY nodeid ORDER BY run DESC"
+                f"  ) AS recent FROM ({query})"
+                ") WHERE recent <= ?"
+            )
+            params.append(last)
+        result = defaultdict(list)
+        rows = self.connection.execute(query + " ORDER BY nodeid, run", params)
+        for nodeid, _, duration in rows:
+            result[nodeid].append(duration)
+        if last is not None and not window:
+            for durations in result.values():
+                del durations[: max(len(durations) - last, 0)]
+        return dict(result)
+
+    def ewma(self, nodeids=None, phase="call", alpha=0.3, runs=None):
+        """Return the exponentially weighted moving average of each test.
+
+        The most recent sample has weight ``alpha``.  Only the samples
+        weighing more than ``EWMA_PRECISION`` are queried.
+        """
+        last = None
+        if 0 < alpha < 1:
+            last = math.ceil(math.log(self.EWMA_PRECISION) / math.log(1 - alpha))
+        elif alpha >= 1:
+            last = 1
+        result = {}
+        for nodeid, durations in self.samples(nodeids, phase, last, runs).items():
+            average = durations[0]
+            for duration in durations[1:]:
+                average = alpha * duration + (1 - alpha) * average
+            result[nodeid] = average
+        return result
+
+    def percentile(self, q, nodeids=None, phase="call", last=None, runs=None):
+        """Return the ``q``-th percentile (0-100) of the durations of each test.
+
+        Uses the nearest-rank method, so the result is always an actual
+        sample.
+        """
+        result = {}
+        for nodeid, durations in self.samples(nodeids, phase, last, runs).items():
+            durations.sort()
+            rank = max(1, math.ceil(q / 100 * len(durations)))
+            result[nodeid] = durations[rank - 1]
+        return result
+
+    def last(self, n, nodeids=None, phase="call"):
+        """Return the last ``n`` durations of each test."""
+        return self.samples(nodeids, phase, last=n)
+
+    def flake_rates(self, runs=None):
+        """Return the number of runs and of flaky runs of each test.
+
+        A run is flaky for a test when its call both failed and passed in it,
+        i.e. it passed on a retry.
+        """
+        rows = self.connection.execute(
+            "SELECT nodeid, COUNT(*), SUM(failed AND passed) FROM ("
+            "  SELECT nodeid, MAX(outcome = 'failed') AS failed,"
+            "    MAX(outcome = 'passed') AS passed"
+            "  FROM durations WHERE phase = 'call' AND run >= ?"
+            "  GROUP BY run, nodeid"
+            ") GROUP BY nodeid",
+            (self._first_run(runs),),
+        )
+        return {nodeid: (total, flaky) for nodeid, total, flaky in rows}
+
+
+def nodeid_file(nodeid):
+    return nodeid.split("::", 1)[0]
+
+
+def in_bin_entry(nodeid, entry):
+    """Return True if ``nodeid`` is selected by a bins.json ``entry``.
+
+    Entries are directories, files or node ids, like pytest arguments.
+    """
+    entry = entry.rstrip("/")
+    return (
+        nodeid == entry
+        or nodeid.startswith(entry + "::")
+        or nodeid_file(nodeid).startswith(entry + "/")
+    )
+
+
+def bin_entry_selector(nodeids):
+    """Return a function listing the ``nodeids`` selected by a bins.json entry.
+
+    The nodeids are indexed by file, so only directory entries have to look
+    at all of them.
+    """
+    by_file = defaultdict(list)
+    for nodeid in nodeids:
+        by_file[nodeid_file(nodeid)].append(nodeid)
+
+    def selected_by(entry):
+        path = nodeid_file(entry)
+        # directories are the only entries selecting tests of several files
+        candidates = by_file.get(path, []) if path.endswith(".py") else nodeids
+        return [nodeid for nodeid in candidates if in_bin_entry(nodeid, entry)]
+
+    return selected_by
+
+
+def predict_bins(bins, expected):
+    """Return the predicted load of each bin and of the unassigned tests.
+
+    ``bins`` is the content of a bins.json file and ``expected`` maps the
+    nodeids to their expected duration.  Each bin load is a tuple of the
+    number of tests and their total expected duration.
+    """
+    selected_by = bin_entry_selector(list(expected))
+    # the first bin selecting a test gets it
+    bin_of = {}
+    for i, entries in enumerate(bins):
+        for entry in entries:
+            for nodeid in selected_by(entry):
+                bin_of.setdefault(nodeid, i)
+    loads = [[0, 0.0] for _ in bins]
+    unassigned = [0, 0.0]
+    for nodeid, duration in expected.items():
+        load = loads[bin_of[nodeid]] if nodeid in bin_of else unassigned
+        load[0] += 1
+        load[1] += duration
+    return [tuple(load) for load in loads], tuple(unassigned)
+
+
+def _split_pieces(nodeids):
+    """Return the pieces a bin entry selecting ``nodeids`` can be split in.
+
+    Entries spanning several files are split by file, single files by test.
+    """
+    files = defaultdict(list)
+    for nodeid in nodeids:
+        files[nodeid_file(nodeid)].append(nodeid)
+    if len(files) > 1:
+        return [(path, selected) for path, selected in files.items()]
+    return [(nodeid, [nodeid]) for nodeid in nodeids]
+
+
+def suggest_bins(bins, expected, max_moves=10, dominant=5):
+    """Suggest changes to bins.json shortening the critical path of a run.
+
+    ``bins`` is the content of a bins.json file and ``expected`` maps the
+    nodeids to their expected duration, in collection order.  Entries of the
+    bin with the largest load are moved, one at a time, to the bin with the
+    smallest load while this shortens the predicted makespan.  When every
+    entry of the critical bin is too large to be moved, the largest one is
+    split by file or by test, and part of it is moved instead.
+
+    Return a JSON-serializable dict with the critical bin, the entries
+    dominating it, the suggested moves and the resulting bins.
+    """
+    bins = [list(entries) for entries in bins]
+    selected_by = bin_entry_selector(list(expected))
+    selected = {}
+    for entries in bins:
+        for entry in entries:
+            selected[entry] = selected_by(entry)
+
+    def duration(nodeids):
+        return sum(expected[nodeid] for nodeid in nodeids)
+
+    loads = [sum(duration(selected[entry]) for entry in entries) for entries in bins]
+    critical = max(range(len(bins)), key=loads.__getitem__)
+    units = sorted(
+        ((duration(selected[entry]), entry) for entry in bins[critical]),
+        reverse=True,
+    )
+    suggestion = {
+        "makespan": loads[critical],
+        "critical_bin": critical,
+        "loads": list(loads),
+        "dominant": [
+            {"entry": entry, "duration": entry_duration}
+            for entry_duration, entry in units[:dominant]
+        ],
+        "moves": [],
+    }
+
+    for _ in range(max_moves):
+        source = max(range(len(bins)), key=loads.__getitem__)
+        target = min(range(len(bins)), key=loads.__getitem__)
+        gap = loads[source] - loads[target]
+        # moving a duration d shortens the makespan when 0 < d < gap,
+        # the most when d is gap / 2
+        candidates = [
+            (abs(gap / 2 - duration(selected[entry])), entry)
+            for entry in bins[source]
+            if 0 < duration(selected[entry]) < gap
+        ]
+        split = not candidates
+        if split:
+            entry = max(bins[source], key=lambda e: duration(selected[e]), default=None)
+            if entry is None or len(selected[entry]) < 2:
+                break
+            # move pieces from the end of the entry while they fit in half
+            # the gap, the other pieces stay in the source bin
+            moved_entries, kept_entries, moved = [], [], []
+            for piece, nodeids in reversed(_split_pieces(selected[entry])):
+                selected[piece] = nodeids
+                if duration(moved) + duration(nodeids) <= gap / 2:
+                    moved_entries.insert(0, piece)
+                    moved = nodeids + moved
+                else:
+                    kept_entries.insert(0, piece)
+        else:
+            _, entry = min(candidates)
+            moved_entries, kept_entries = [entry], []
+            moved = selected[entry]
+
+        others = [load for i, load in enumerate(loads) if i not in (source, target)]
+        moved_duration = duration(moved)
+        makespan = max(
+            [loads[source] - moved_duration, loads[target] + moved_duration, *others]
+        )
+        saving = max(loads) - makespan
+        if not moved or saving <= 0:
+            break
+
+        index = bins[source].index(entry)
+        bins[source][index : index + 1] = kept_entries
+        bins[target].extend(moved_entries)
+        loads[source] -= moved_duration
+        loads[target] += moved_duration
+        suggestion["moves"].append(
+            {
+                "entries": moved_entries,
+                "split_from": entry if split else None,
+                "from": source,
+                "to": target,
+                "duration": moved_duration,
+                "saving": saving,
+            }
+        )
+
+    suggestion["predicted_makespan"] = max(loads) if loads else 0.0
+    suggestion["bins"] = bins
+    return suggestion
+
+
+def _expected_durations(history, args):
+    phase = None if args.phase == "total" else args.phase
+    if args.stat == "ewma":
+        return history.ewma(phase=phase, runs=args.runs)
+    q = {"p50": 50, "p95": 95}[args.stat]
+    return history.percentile(q, phase=phase, runs=args.runs)
+
+
+def cmd_slowest(history, args):
+    expected = _expected_durations(history, args)
+    if args.files:
+        per_file = defaultdict(float)
+        for nodeid, duration in expected.items():
+            per_file[nodeid_file(nodeid)] += duration
+        expected = per_file
+    slowest = sorted(expected.items(), key=lambda x: x[1], reverse=True)
+    for name, duration in slowest[: args.top]:
+        print(f"{duration:10.3f}s  {name}")
+
+
+def cmd_regressions(history, args):
+    regressions = []
+    for nodeid, durations in history.samples(phase=None, runs=args.runs).items():
+        if len(durations) <= args.recent:
+            continue
+        baseline = statistics.median(durations[: -args.recent])
+        recent = statistics.mean(durations[-args.recent :])
+        if baseline > 0 and recent > baseline * (1 + args.threshold / 100):
+            regressions.append((recent / baseline - 1, baseline, recent, nodeid))
+    for increase, baseline, recent, nodeid in sorted(regressions, reverse=True):
+        print(f"{increase:+8.0%}  {baseline:8.3f}s -> {recent:8.3f}s  {nodeid}")
+
+
+def cmd_flaky(history, args):
+    rates = [
+        (flaky / total, flaky, total, nodeid)
+        for nodeid, (total, flaky) in history.flake_rates(runs=args.runs).items()
+        if flaky
+    ]
+    for rate, flaky, total, nodeid in sorted(rates, reverse=True)[: args.top]:
+        print(f"{rate:6.1%}  {flaky:4d}/{total:<4d}  {nodeid}")
+
+
+def cmd_bins(history, args):
+    with open(args.bins) as f:
+        bins = json.load(f)
+    expected = _expected_durations(history, args)
+    loads, unassigned = predict_bins(bins, expected)
+    for i, (count, duration) in enumerate(loads):
+        print(f"bin {i}: {count:5d} tests  {duration:10.3f}s")
+    if unassigned[0]:
+        print(f"unassigned: {unassigned[0]:5d} tests  {unassigned[1]:10.3f}s")
+    durations = [duration for _, duration in loads]
+    if durations and statistics.mean(durations):
+        imbalance = max(durations) / statistics.mean(durations)
+        print(f"predicted makespan: {max(durations):.3f}s (max/mean {imbalance:.2f})")
+    if args.suggest:
+        suggestion = suggest_bins(bins, expected)
+        with open(args.suggest, "w") as f:
+            json.dump(suggestion, f, indent=2)
+        print(
+            f"suggested bins: {len(suggestion['moves'])} moves, predicted makespan "
+            f"{suggestion['predicted_makespan']:.3f}s"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m xdist.history",
+        description="Query the test timing history recorded by pytest-xdist.",
+    )
+    parser.add_argument(
+        "--db",
+        default=os.path.join(".pytest_cache", "d", "xdist", TimingHistory.FILENAME),
+        help="history database (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        metavar="N",
+        help="only consider the last N runs (default: all)",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_expected_arguments(subparser):
+        subparser.add_argument(
+            "--phase",
+            choices=["setup", "call", "teardown", "total"],
+            default="total",
+            help="phase of the tests to consider (default: %(default)s)",
+        )
+        subparser.add_argument(
+            "--stat",
+            choices=["ewma", "p50", "p95"],
+            default="ewma",
+            help="expected duration of a test (default: %(default)s)",
+        )
+
+    slowest = subparsers.add_parser("slowest", help="slowest tests or files")
+    slowest.add_argument("-n", "--top", type=int, default=20)
+    slowest.add_argument(
+        "--files", action="store_true", help="aggregate the tests of each file"
+    )
+    add_expected_arguments(slowest)
+    slowest.set_defaults(func=cmd_slowest)
+
+    regressions = subparsers.add_parser(
+        "regressions", help="tests whose duration regressed recently"
+    )
+    regressions.add_argument(
+        "--threshold",
+        type=float,
+        default=50.0,
+        metavar="PERCENT",
+        help="minimum increase of the duration (default: %(default)s)",
+    )
+    regressions.add_argument(
+        "--recent",
+        type=int,
+        default=3,
+        metavar="K",
+        help="number of recent runs compared to the older ones "
+        "(default: %(default)s)",
+    )
+    regressions.set_defaults(func=cmd_regressions)
+
+    flaky = subparsers.add_parser("flaky", help="tests which passed on a retry")
+    flaky.add_argument("-n", "--top", type=int, default=20)
+    flaky.set_defaults(func=cmd_flaky)
+
+    bins = subparsers.add_parser("bins", help="predicted load of each bin")
+    bins.add_argument("bins", help="path to a bins.json file")
+    bins.add_argument(
+        "--suggest",
+        metavar="PATH",
+        help="write suggested moves of entries between the bins to PATH",
+    )
+    add_expected_arguments(bins)
+    bins.set_defaults(func=cmd_bins)
+
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.db):
+        parser.error(f"no history found at {args.db}")
+    history = TimingHistory(args.db)
+    try:
+        args.func(history, args)
+    finally:
+        history.connection.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
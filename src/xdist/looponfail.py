@@ -6,9 +6,13 @@
     processes) otherwise changes to source code can crash
     the controlling process which should best never happen.
 """
+import ast
+import errno
+import importlib.util
 import os
+import types
 from pathlib import Path
-from typing import Dict, Sequence
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple, Union
 
 import pytest
 import sys
@@ -16,7 +20,7 @@ import time
 import execnet
 from _pytest._io import TerminalWriter
 
-from xdist._path import visit_path
+from xdist import _inotify
 
 
 @pytest.hookimpl
@@ -43,30 +47,69 @@ def pytest_cmdline_main(config):
         return 2  # looponfail only can get stop with ctrl-C anyway
 
 
-def looponfail_main(config: "pytest.Config") -> None:
-    remotecontrol = RemoteControl(config)
+@pytest.hookimpl(trylast=True)
+def pytest_collection_modifyitems(config, items):
+    # on the workers of a distributed looponfail run, only run the failures
+    workerinput = getattr(config, "workerinput", {})
+    trails = workerinput.get("looponfailtrails")
+    if not trails:
+        return
+    selected, deselected = [], []
+    for item in items:
+        if any(
+            item.nodeid == trail
+            or item.nodeid.startswith(trail + "::")
+            or item.nodeid.startswith(trail + "/")
+            for trail in trails
+        ):
+            selected.append(item)
+        else:
+            deselected.append(item)
+    if deselected:
+        config.hook.pytest_deselected(items=deselected)
+        items[:] = selected
+
+
+def looponfail_roots(config: "pytest.Config") -> List[Path]:
     config_roots = config.getini("looponfailroots")
     if not config_roots:
         config_roots = [Path.cwd()]
-    rootdirs = [Path(root) for root in config_roots]
-    statrecorder = StatRecorder(rootdirs)
+    return [Path(root) for root in config_roots]
+
+
+def looponfail_main(config: "pytest.Config") -> None:
+    remotecontrol = RemoteControl(config, keepalive=True)
+    rootdirs = looponfail_roots(config)
+    statrecorder = make_recorder(rootdirs)
+    changed: Optional[Set[Path]] = set()
     try:
         while 1:
-            remotecontrol.loop_once()
+            remotecontrol.loop_once(changed)
             if not remotecontrol.failures and remotecontrol.wasfailing:
                 # the last failures passed, let's immediately rerun all
+                changed = set()
                 continue
             repr_pytest_looponfailinfo(
                 failreports=remotecontrol.failures, rootdirs=rootdirs
             )
-            statrecorder.waitonchange(checkinterval=2.0)
+            changed = statrecorder.waitonchange(checkinterval=2.0)
     except KeyboardInterrupt:
         print()
+    finally:
+        remotecontrol.ensure_teardown()
 
 
 class RemoteControl:
-    def __init__(self, config):
+    """Run the tests in a subprocess and record the failures.
+
+    With ``keepalive`` the subprocess is kept between runs, ``loop_once``
+    is then told which files changed so that only the modules importing
+    them are reloaded before the next run.
+    """
+
+    def __init__(self, config, keepalive=False):
         self.config = config
+        self.keepalive = keepalive
         self.failures = []
 
     def trace(self, *args):
@@ -109,21 +152,51 @@ class RemoteControl:
             self.gateway.exit()
             del self.gateway
 
+    def reload(self, changed: Optional[Set[Path]]) -> bool:
+        """Make the running worker forget the modules affected by ``changed``.
+
+        Return False if the worker has to be restarted instead, because the
+        changed files are unknown or a module can't be safely reloaded.
+        """
+        if changed is None or self.channel.isclosed():
+            return False
+        paths = [str(p) for p in changed]
+        roots = [str(p) for p in looponfail_roots(self.config)]
+        self.trace("reloading", paths)
+        try:
+            self.channel.send(("reload", (paths, roots)))
+            return bool(self.channel.receive())
+        except (OSError, EOFError, self.channel.RemoteError):
+            return False
+
     def runsession(self):
+        keep = False
         try:
             self.trace("sending", self.failures)
-            self.channel.send(self.failures)
+            self.channel.send(("run", self.failures))
             try:
-                return self.channel.receive()
+                result = self.channel.receive()
             except self.channel.RemoteError:
                 e = sys.exc_info()[1]
                 self.trace("ERROR", e)
                 raise
+            keep = self.keepalive
+            return result
         finally:
-            self.ensure_teardown()
+            if not keep:
+                self.ensure_teardown()
 
-    def loop_once(self):
-        self.setup()
+    def loop_once(self, changed: Optional[Set[Path]] = None) -> None:
+        """Run the failing tests, or all tests if there are none.
+
+        ``changed`` are the files changed since the last run, None if they
+        are not known.
+        """
+        if hasattr(self, "channel") and not self.reload(changed):
+            self.trace("restarting worker")
+            self.ensure_teardown()
+        if not hasattr(self, "channel"):
+            self.setup()
         self.wasfailing = self.failures and len(self.failures)
         result = self.runsession()
         failures, reports, collection_failed = result
@@ -168,20 +241,177 @@ def init_worker_session(channel, args, option_dict):
     # fullwidth, hasmarkup = channel.receive()
     from _pytest.config import Config
 
-    config = Config.fromdictargs(option_dict, list(args))
-    config.args = args
+    from xdist.looponfail import invalidate_modules
+    from xdist.looponfail import WarmGateways
     from xdist.looponfail import WorkerFailSession
 
-    WorkerFailSession(config, channel).main()
+    # Every run gets a new config so that changed conftest and ini files
+    # are read again, the modules not invalidated since are kept loaded,
+    # as are the -n workers.
+    gateways = WarmGateways()
+    try:
+        while 1:
+            try:
+                command, arg = channel.receive()
+            except (KeyboardInterrupt, EOFError):
+                return  # in the worker we can't do much about this
+            if command == "reload":
+                gateways.reload(*arg)
+                channel.send(invalidate_modules(*arg))
+                continue
+            config = Config.fromdictargs(option_dict, list(args))
+            config.args = args
+            WorkerFailSession(config, channel, gateways).main(arg)
+    finally:
+        gateways.terminate()
+
+
+# Packages the worker itself runs on, they are never reloaded under it
+WORKER_PACKAGES = {"_pytest", "pytest", "pluggy", "execnet", "xdist", "py"}
+
+
+def _imported_modules(module) -> Set[str]:
+    """Return the names of the modules ``module`` got names from."""
+    deps: Set[str] = set()
+    try:
+        values = list(vars(module).values())
+    except TypeError:
+        return deps
+    for value in values:
+        dep: object
+        try:
+            if isinstance(value, types.ModuleType):
+                dep = value.__name__
+            else:
+                dep = getattr(value, "__module__", None)
+        except Exception:
+            continue
+        if isinstance(dep, str):
+            deps.add(dep)
+    return deps
+
+
+# filename -> (mtime, names of the modules imported by its source)
+_source_imports_cache: Dict[str, Tuple[float, Set[str]]] = {}
+
+
+def _source_imports(module) -> Set[str]:
+    """Return the names of the modules imported in the source of ``module``.
+
+    This finds the imports of names without a ``__module__``, like
+    ``from config import TIMEOUT``.
+    """
+    filename = module.__file__
+    try:
+        mtime = os.stat(filename).st_mtime
+    except OSError:
+        return set()
+    cached = _source_imports_cache.get(filename)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    try:
+        with open(filename, "rb") as f:
+            tree = ast.parse(f.read(), filename)
+    except (OSError, SyntaxError, ValueError):
+        return set()
+    package = getattr(module, "__package__", None) or ""
+    deps: Set[str] = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            deps.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            base = "." * node.level + (node.module or "")
+            try:
+                base = importlib.util.resolve_name(base, package)
+            except (ImportError, ValueError):
+                continue
+            deps.add(base)
+            # the imported names may be submodules
+            deps.update(f"{base}.{alias.name}" for alias in node.names)
+    _source_imports_cache[filename] = (mtime, deps)
+    return deps
+
+
+def _below(location: str, roots: Sequence[str]) -> bool:
+    location = os.path.realpath(location)
+    return any(location.startswith(root) for root in roots)
+
+
+def invalidate_modules(paths: Sequence[str], roots: Sequence[str]) -> bool:
+    """Remove the modules of ``paths`` and their importers from sys.modules.
+
+    They are imported again by the next run.  Returns False and leaves
+    sys.modules alone when that isn't safe: if a changed module is an
+    extension module, or a module to remove is not below ``roots`` or is
+    part of the worker itself.
+    """
+    changed = {os.path.realpath(p) for p in paths}
+    basenames = {os.path.basename(p) for p in changed}
+    modules = dict(sys.modules)
+    stale = set()
+    for name, module in modules.items():
+        filename = getattr(module, "__file__", None)
+        if (
+            isinstance(filename, str)
+            and os.path.basename(filename) in basenames
+            and os.path.realpath(filename) in changed
+        ):
+            if not filename.endswith(".py"):
+                return False  # extension modules can't be unloaded
+            stale.add(name)
+
+    roots = [os.path.join(os.path.realpath(root), "") for root in roots]
+    importers: Dict[str, Set[str]] = {}
+    for name, module in modules.items():
+        deps = _imported_modules(module)
+        filename = getattr(module, "__file__", None)
+        if (
+            isinstance(filename, str)
+            and filename.endswith(".py")
+            and _below(filename, roots)
+        ):
+            deps |= _source_imports(module)
+        for dep in deps:
+            if dep != name:
+                importers.setdefault(dep, set()).add(name)
+    pending = list(stale)
+    while pending:
+        name = pending.pop()
+        dependents = set(importers.get(name, ()))
+        # the submodules of a package are stale with it, the new package
+        # would not have them as attributes
+        dependents.update(n for n in modules if n.startswith(name + "."))
+        for dep in dependents - stale:
+            stale.add(dep)
+            pending.append(dep)
+
+    for name in stale:
+        if name.partition(".")[0] in WORKER_PACKAGES:
+            return False
+        module = modules[name]
+        filename = getattr(module, "__file__", None)
+        locations = [filename] if filename else list(getattr(module, "__path__", []))
+        if not locations:
+            return False
+        if not all(_below(location, roots) for location in locations):
+            return False
+
+    for name in stale:
+        sys.modules.pop(name, None)
+    importlib.invalidate_caches()
+    return True
 
 
 class WorkerFailSession:
-    def __init__(self, config, channel):
+    def __init__(self, config, channel, gateways=None):
         self.config = config
         self.channel = channel
         self.recorded_failures = []
         self.collection_failed = False
         config.pluginmanager.register(self)
+        if gateways is not None:
+            # found by the NodeManager of -n runs
+            config.pluginmanager.register(gateways, "warmgateways")
         config.option.looponfail = False
         config.option.usepdb = False
 
@@ -191,6 +421,9 @@ class WorkerFailSession:
 
     @pytest.hookimpl
     def pytest_collection(self, session):
+        if self.config.pluginmanager.has_plugin("dsession"):
+            # with -n the workers collect, see pytest_configure_node
+            return None
         self.session = session
         self.trails = self.current_command
         hook = self.session.ihook
@@ -204,6 +437,10 @@ class WorkerFailSession:
         hook.pytest_collection_finish(session=session)
         return True
 
+    @pytest.hookimpl
+    def pytest_configure_node(self, node):
+        node.workerinput["looponfailtrails"] = self.current_command
+
     @pytest.hookimpl
     def pytest_runtest_logreport(self, report):
         if report.failed:
@@ -215,14 +452,9 @@ class WorkerFailSession:
             self.recorded_failures.append(report)
             self.collection_failed = True
 
-    def main(self):
-        self.DEBUG("WORKER: received configuration, waiting for command trails")
-        try:
-            command = self.channel.receive()
-        except KeyboardInterrupt:
-            return  # in the worker we can't do much about this
-        self.DEBUG("received", command)
-        self.current_command = command
+    def main(self, trails):
+        self.DEBUG("WORKER: received command trails", trails)
+        self.current_command = trails
         self.config.hook.pytest_cmdline_main(config=self.config)
         trails, failreports = [], []
         for rep in self.recorded_failures:
@@ -233,11 +465,120 @@ class WorkerFailSession:
         self.channel.send((trails, failreports, self.collection_failed))
 
 
+def _invalidate_worker_modules(channel):
+    from xdist.looponfail import invalidate_modules
+
+    channel.send(invalidate_modules(*channel.receive()))
+
+
+class WarmGateways:
+    """The worker gateways of ``-n`` runs, kept by the looponfail subprocess.
+
+    Each run gets a new config and so a new ``NodeManager``; the gateways
+    of the workers which finished their session are handed to the next run
+    instead of starting new processes, along with the modules they
+    imported.  The modules affected by changed files are invalidated in
+    them as in the subprocess.  Only ``popen`` gateways are kept, as the
+    invalidation needs xdist to be importable by the worker.
+    """
+
+    EXIT_TIMEOUT = 10
+
+    def __init__(self) -> None:
+        self.group = execnet.Group()
+        self.idle: List[execnet.Gateway] = []
+        # gateways given to the specs of the current run, by id
+        self.reserved: Dict[str, execnet.Gateway] = {}
+
+    def allocate_id(self, spec: execnet.XSpec) -> None:
+        """Give ``spec`` the id of an idle gateway it can reuse, else a new one."""
+        for gateway in self.idle:
+            if gateway.spec._spec == spec._spec:
+                self.idle.remove(gateway)
+                self.reserved[gateway.id] = gateway
+                spec.id = gateway.id
+                return
+        self.group.allocate_id(spec)
+
+    def take(self, spec: execnet.XSpec) -> Optional[execnet.Gateway]:
+        """Return the gateway reserved for ``spec``, None if it has none."""
+        if spec.id is None:
+            return None
+        return self.reserved.pop(spec.id, None)
+
+    def release(self, nodes, retired=()) -> None:
+        """Keep the gateways of ``nodes`` which finished their session.
+
+        The others are exited, as are the ``retired`` ones: they were
+        recycled for going over a limit.
+        """
+        self.idle.extend(self.reserved.values())
+        self.reserved.clear()
+        for node in nodes:
+            gateway = node.gateway
+            if (
+                hasattr(node, "workeroutput")
+                and node not in retired
+                and gateway.spec.popen
+                and gateway.hasreceiver()
+            ):
+                try:
+                    # the worker session ends after reporting it finished
+                    node.channel.waitclose(self.EXIT_TIMEOUT)
+                except (OSError, execnet.RemoteError):
+                    pass
+                else:
+                    self.idle.append(gateway)
+                    continue
+            gateway.exit()
+
+    def reload(self, paths: Sequence[str], roots: Sequence[str]) -> None:
+        """Make the idle gateways forget the modules affected by ``paths``.
+
+        The gateways which can't are exited, the next run starts new ones.
+        """
+        for gateway in list(self.idle):
+            try:
+                channel = gateway.remote_exec(_invalidate_worker_modules)
+                channel.send((paths, roots))
+                reloaded = channel.receive(self.EXIT_TIMEOUT)
+            except (OSError, EOFError, execnet.RemoteError):
+                reloaded = False
+            if not reloaded:
+                self.idle.remove(gateway)
+                gateway.exit()
+
+    def terminate(self) -> None:
+        self.group.terminate(self.EXIT_TIMEOUT)
+
+
+def make_recorder(
+    rootdirlist: Sequence[Path],
+) -> "Union[StatRecorder, InotifyRecorder]":
+    """Return an inotify based recorder if available, else a polling one."""
+    try:
+        return InotifyRecorder(rootdirlist)
+    except OSError:
+        return StatRecorder(rootdirlist)
+
+
+# directory -> (mtime_ns, read at, files, subdirectories)
+_DirCache = Dict[Path, Tuple[int, int, List[Path], List[Path]]]
+
+
 class StatRecorder:
+    # Listings of directories modified less than this many nanoseconds
+    # before they were read are not reused, as a file could have been added
+    # in the same timestamp tick without changing the directory's mtime.
+    RACY_NS = 2_000_000_000
+
     def __init__(self, rootdirlist: Sequence[Path]) -> None:
         self.rootdirlist = rootdirlist
         self.statcache: Dict[Path, os.stat_result] = {}
+        self.dircache: _DirCache = {}
+        self.changed: Set[Path] = set()
         self.check()  # snapshot state
+        self.changed.clear()
 
     def fil(self, p: Path) -> bool:
         return p.is_file() and not p.name.startswith(".") and p.suffix != ".pyc"
@@ -245,24 +586,77 @@ class StatRecorder:
     def rec(self, p: Path) -> bool:
         return not p.name.startswith(".") and p.exists()
 
+    def take_changed(self) -> Optional[Set[Path]]:
+        """Return the files changed since the last call, None if not known."""
+        changed, self.changed = self.changed, set()
+        return changed or None
+
     def waitonchange(self, checkinterval=1.0):
+        """Wait until files change, return them as ``take_changed``."""
         while 1:
             changed = self.check()
             if changed:
-                return
+                return self.take_changed()
             time.sleep(checkinterval)
 
+    def listdir(
+        self, dirpath: Path, newcache: _DirCache
+    ) -> Tuple[List[Path], List[Path]]:
+        """Return the watched files and subdirectories of ``dirpath``.
+
+        The listing is reused while the mtime of the directory is unchanged,
+        so only the files need to be stat'ed for unchanged directories.
+        """
+        try:
+            mtime = dirpath.stat().st_mtime_ns
+        except OSError:
+            return [], []
+        cached = self.dircache.get(dirpath)
+        if (
+            cached is not None
+            and cached[0] == mtime
+            and cached[1] - mtime > self.RACY_NS
+        ):
+            newcache[dirpath] = cached
+            return cached[2], cached[3]
+        now = time.time_ns()
+        files: List[Path] = []
+        dirs: List[Path] = []
+        try:
+            with os.scandir(dirpath) as entries:
+                for entry in entries:
+                    p = Path(entry.path)
+                    if entry.is_dir():
+                        # like os.walk, symlinked directories are not followed
+                        if not entry.is_symlink() and self.rec(p):
+                            dirs.append(p)
+                    elif self.fil(p):
+                        files.append(p)
+        except OSError:
+            return [], []
+        newcache[dirpath] = (mtime, now, files, dirs)
+        return files, dirs
+
+    def visit(self, rootdir: Path, newcache: _DirCache) -> Iterator[Path]:
+        pending = [rootdir]
+        while pending:
+            files, dirs = self.listdir(pending.pop(), newcache)
+            yield from files
+            pending.extend(reversed(dirs))
+
     def check(self, removepycfiles: bool = True) -> bool:  # noqa, too complex
         changed = False
         newstat: Dict[Path, os.stat_result] = {}
+        newcache: _DirCache = {}
         for rootdir in self.rootdirlist:
-            for path in visit_path(rootdir, filter=self.fil, recurse=self.rec):
+            for path in self.visit(rootdir, newcache):
                 oldstat = self.statcache.pop(path, None)
                 try:
                     curstat = path.stat()
                 except OSError:
                     if oldstat:
                         changed = True
+                        self.changed.add(path)
                 else:
                     newstat[path] = curstat
                     if oldstat is not None:
@@ -271,6 +665,7 @@ class StatRecorder:
                             or oldstat.st_size != curstat.st_size
                         ):
                             changed = True
+                            self.changed.add(path)
                             print("# MODIFIED", path)
                             if removepycfiles and path.suffix == ".py":
                                 pycfile = path.with_suffix(".pyc")
@@ -279,7 +674,164 @@ class StatRecorder:
 
                     else:
                         changed = True
+                        self.changed.add(path)
         if self.statcache:
             changed = True
+            self.changed.update(self.statcache)
         self.statcache = newstat
+        self.dircache = newcache
         return changed
+
+
+class InotifyRecorder:
+    """Wait for changes with Linux inotify instead of polling the files.
+
+    Every non-hidden directory below the roots is watched, directories
+    created later are watched as they appear.  A burst of changes, like a
+    checkout or an editor saving several files, is reported once.
+    """
+
+    MASK = (
+        _inotify.IN_MODIFY
+        | _inotify.IN_ATTRIB
+        | _inotify.IN_CREATE
+        | _inotify.IN_DELETE
+        | _inotify.IN_MOVED_FROM
+        | _inotify.IN_MOVED_TO
+        | _inotify.IN_DELETE_SELF
+        | _inotify.IN_MOVE_SELF
+        | _inotify.IN_ONLYDIR
+    )
+
+    # Wait until no event came for this long before returning a change,
+    # but no longer than MAX_SETTLE in total.
+    SETTLE = 0.2
+    MAX_SETTLE = 2.0
+
+    def __init__(self, rootdirlist: Sequence[Path]) -> None:
+        self.rootdirlist = rootdirlist
+        self.inotify = _inotify.Inotify()
+        self.watches: Dict[int, Path] = {}
+        self.fallback: Optional[StatRecorder] = None
+        self.changed: Set[Path] = set()
+        # set when changes were missed, the changed files are then unknown
+        self.lost = False
+        try:
+            for rootdir in rootdirlist:
+                self.watch(rootdir)
+        except OSError:
+            # most likely out of watches, see fs.inotify.max_user_watches
+            self.close()
+            raise
+
+    def rec(self, p: Path) -> bool:
+        return not p.name.startswith(".")
+
+    def fil(self, p: Path) -> bool:
+        return not p.name.startswith(".") and p.suffix != ".pyc"
+
+    def watch(self, rootdir: Path) -> List[Path]:
+        """Watch ``rootdir`` and its subdirectories.
+
+        Return the files they contain, which may have been created before
+        the watches were added.
+        """
+        files: List[Path] = []
+        for dirpath, dirnames, filenames in os.walk(rootdir):
+            dirnames[:] = [x for x in dirnames if self.rec(Path(dirpath, x))]
+            files.extend(Path(dirpath, x) for x in filenames)
+            try:
+                wd = self.inotify.add_watch(dirpath, self.MASK)
+            except OSError as e:
+                if e.errno in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                    continue  # removed in the meantime or not readable
+                raise
+            self.watches[wd] = Path(dirpath)
+        return [p for p in files if self.fil(p)]
+
+    def close(self) -> None:
+        self.inotify.close()
+
+    def process(self, events) -> bool:
+        changed = False
+        for wd, mask, name in events:
+            if mask & _inotify.IN_Q_OVERFLOW:
+                changed = self.lost = True
+                continue
+            if mask & _inotify.IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            dirpath = self.watches.get(wd)
+            if dirpath is None:
+                continue
+            if mask & (_inotify.IN_DELETE_SELF | _inotify.IN_MOVE_SELF):
+                if dirpath in self.rootdirlist:
+                    changed = self.lost = True
+                continue
+            path = dirpath / name
+            if mask & _inotify.IN_ISDIR:
+                if not self.rec(path):
+                    continue
+                if mask & (_inotify.IN_CREATE | _inotify.IN_MOVED_TO):
+                    files = self.watch(path)
+                    self.changed.update(files)
+                    changed = changed or bool(files)
+                elif mask & _inotify.IN_MOVED_FROM:
+                    # its files are gone without events
+                    changed = self.lost = True
+                continue
+            if not self.fil(path):
+                continue
+            changed = True
+            self.changed.add(path)
+            if mask & _inotify.IN_MODIFY:
+                print("# MODIFIED", path)
+                if path.suffix == ".py":
+                    pycfile = path.with_suffix(".pyc")
+                    if pycfile.is_file():
+                        os.unlink(pycfile)
+        return changed
+
+    def check(self, timeout: Optional[float] = 0.0) -> bool:
+        """Return whether files changed since the last call.
+
+        Waits up to ``timeout`` seconds for a change, forever if None.
+        """
+        try:
+            return self.process(self.inotify.read(timeout))
+        except OSError:
+            self._fall_back()
+            return True
+
+    def _fall_back(self) -> None:
+        # out of watches for new directories, poll from now on
+        self.close()
+        self.fallback = StatRecorder(self.rootdirlist)
+        self.lost = True
+
+    def take_changed(self) -> Optional[Set[Path]]:
+        """Return the files changed since the last call, None if not known."""
+        changed, self.changed = self.changed, set()
+        lost, self.lost = self.lost, False
+        return None if lost or not changed else changed
+
+    def waitonchange(self, checkinterval=None):
+        """Wait until files change, return them as ``take_changed``."""
+        if self.fallback is not None:
+            return self.fallback.waitonchange(checkinterval or 1.0)
+        while not self.check(timeout=None):
+            pass
+        if self.fallback is not None:
+            return self.take_changed()
+        # coalesce the rest of the burst of changes
+        deadline = time.monotonic() + self.MAX_SETTLE
+        while time.monotonic() < deadline:
+            try:
+                events = self.inotify.read(self.SETTLE)
+                if not events:
+                    break
+                self.process(events)
+            except OSError:
+                self._fall_back()
+                break
+        return self.take_changed()
@@ -0,0 +1,181 @@
+"""
+OpenMetrics export of the metrics of a distributed run.
+
+With ``--metrics-file=PATH`` the controller writes its metrics to ``PATH``
+at the end of the session, and every ``--metrics-interval`` seconds during
+the run if given, in the OpenMetrics text format read by node_exporter's
+textfile collector.  The file is replaced atomically, so a scraper never
+reads a partial file.
+
+Every metric is a gauge giving the value for the current run, counts are
+reset by the next run.
+"""
+import os
+import time
+
+from xdist.workermanage import WorkerController
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+class MetricsExporter:
+    """Collect the metrics of the run of ``dsession`` and write them to ``path``.
+
+    ``DSession`` feeds the exporter with the tests completed by each worker,
+    the latency of the test reports and the depth of its event queue, the
+    other metrics are read from the session when writing the file.
+    """
+
+    def __init__(self, dsession, path, interval=None):
+        self.dsession = dsession
+        self.path = path
+        self.interval = interval
+        self.start = time.time()
+        self.tests = {}
+        self.latency_count = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.queue_depth_max = 0
+        self._last_write = time.monotonic()
+
+    def test_finished(self, worker):
+        self.tests[worker] = self.tests.get(worker, 0) + 1
+
+    def report_received(self, rep):
+        """Record the time since ``rep`` was produced by its worker."""
+        # TestReport.stop is only available with pytest 7+
+        stop = getattr(rep, "stop", None)
+        if stop is None:
+            return
+        latency = max(time.time() - stop, 0.0)
+        self.latency_count += 1
+        self.latency_sum += latency
+        self.latency_max = max(self.latency_max, latency)
+
+    def event_processed(self, queue_depth):
+        """Called after each event, write the file if the interval elapsed."""
+        self.queue_depth_max = max(self.queue_depth_max, queue_depth)
+        self.tick()
+
+    def tick(self):
+        """Write the file if the interval elapsed.
+
+        Also called by the controller loop while it waits for events, so the
+        file is refreshed while the workers are busy with long tests.
+        """
+        if (
+            self.interval is not None
+            and time.monotonic() - self._last_write >= self.interval
+        ):
+            self.write()
+
+    def metrics(self):
+        """Return a list of (name, help, samples) of the run's metrics.
+
+        ``samples`` is a list of (labels, value) with labels as a dict.
+        """
+        dsession = self.dsession
+        now = time.time()
+        started = dsession.utilization.started
+        rates = []
+        for worker, count in sorted(self.tests.items()):
+            elapsed = now - started.get(worker, self.start)
+            rates.append(({"worker": worker}, count / elapsed if elapsed else 0.0))
+        latency_mean = (
+            self.latency_sum / self.latency_count if self.latency_count else 0.0
+        )
+        sched = dsession.sched
+        return [
+            (
+                "xdist_worker_tests",
+                "Tests run by each worker.",
+                [({"worker": w}, count) for w, count in sorted(self.tests.items())],
+            ),
+            (
+                "xdist_worker_tests_per_second",
+                "Tests run per second by each worker since its first test.",
+                rates,
+            ),
+            (
+                "xdist_controller_queue_depth",
+                "Events waiting to be processed by the controller.",
+                [({}, dsession.queue.qsize())],
+            ),
+            (
+                "xdist_controller_queue_depth_max",
+                "Largest number of events waiting to be processed by the controller.",
+                [({}, self.queue_depth_max)],
+            ),
+            (
+                "xdist_reports_received",
+                "Test reports received by the controller.",
+                [({}, self.latency_count)],
+            ),
+            (
+                "xdist_report_latency_seconds_mean",
+                "Mean time between the end of a test and the controller "
+                "receiving its report.",
+                [({}, latency_mean)],
+            ),
+            (
+                "xdist_report_latency_seconds_max",
+                "Longest time between the end of a test and the controller "
+                "receiving its report.",
+                [({}, self.latency_max)],
+            ),
+            (
+                "xdist_retries",
+                "Retries of failing tests sent to the workers.",
+                [({}, getattr(sched, "retries_sent", 0))],
+            ),
+            (
+                "xdist_skipped_retries",
+                "Failing tests not retried because the retry budget was exhausted.",
+                [({}, getattr(sched, "skipped_retries", 0))],
+            ),
+            (
+                "xdist_worker_restarts",
+                "Workers replaced after crashing.",
+                [({}, dsession._failed_nodes_count)],
+            ),
+            (
+                "xdist_worker_startup_seconds",
+                "Duration of each startup phase of each worker, "
+                "including its collection.",
+                [
+                    ({"worker": worker, "phase": phase}, timings[phase])
+                    for worker, timings in sorted(dsession.startup_timings.items())
+                    for phase in WorkerController.STARTUP_PHASES
+                    if phase in timings
+                ],
+            ),
+            (
+                "xdist_elapsed_seconds",
+                "Time since the start of the session.",
+                [({}, now - self.start)],
+            ),
+        ]
+
+    def render(self):
+        lines = []
+        for name, help, samples in self.metrics():
+            lines.append(f"# HELP {name} {_escape(help)}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                if labels:
+                    labels = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+                    lines.append(f"{name}{{{labels}}} {value}")
+                else:
+                    lines.append(f"{name} {value}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        """Replace the metrics file with the current metrics."""
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(self.render())
+        os.replace(tmp, self.path)
+        self._last_write = time.monotonic()
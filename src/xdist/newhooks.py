@@ -63,6 +63,18 @@ def pytest_xdist_node_collection_finished(node, ids):
     """called by the controller node when a worker node finishes collecting."""
 
 
+@pytest.hookspec()
+def pytest_xdist_node_started(node, timings, time_to_first_test):
+    """
+    Called by the controller node when a worker node starts running its first test.
+
+    ``timings`` maps each startup phase of the node, in the order of
+    ``WorkerController.STARTUP_PHASES``, to its duration in seconds, and
+    ``time_to_first_test`` is the time since the start of the session.
+    Nodes which never run a test are not reported.
+    """
+
+
 @pytest.hookspec(firstresult=True)
 def pytest_xdist_make_scheduler(config, log):
     """return a node scheduler implementation"""
@@ -178,6 +178,181 @@ def pytest_addoption(parser):
             "Unlimited if not set."
         ),
     )
+    group.addoption(
+        "--retry-budget",
+        action="store",
+        type=int,
+        dest="retrybudget",
+        metavar="N",
+        help=(
+            "Maximum number of retries of failing tests in the whole session "
+            "for --dist=loadscope. Once exhausted, failing tests are reported "
+            "without being retried. Unlimited if not set."
+        ),
+    )
+    group.addoption(
+        "--retry-time-budget",
+        action="store",
+        type=float,
+        dest="retrytimebudget",
+        metavar="SECONDS",
+        help=(
+            "Maximum time spent running retries of failing tests in the whole "
+            "session for --dist=loadscope. Unlimited if not set."
+        ),
+    )
+    group.addoption(
+        "--retry-in-place",
+        action="store_true",
+        dest="retryinplace",
+        default=False,
+        help=(
+            "For --dist=loadscope, retry tests whose call failed right away "
+            "in the worker, reusing the fixtures of broader scopes, instead of "
+            "sending the retries back through the controller."
+        ),
+    )
+    group.addoption(
+        "--suggest-bins",
+        action="store",
+        dest="suggestbins",
+        metavar="PATH",
+        help=(
+            "For --dist=loadscope, analyse the critical path of the run at its "
+            "end and write to PATH suggested moves of bins.json entries, along "
+            "with the resulting bins."
+        ),
+    )
+    group.addoption(
+        "--affected-record",
+        action="store_true",
+        dest="affectedrecord",
+        default=False,
+        help=(
+            "Record the source files executed by each test in a dependency map "
+            "stored in the pytest cache, for --affected."
+        ),
+    )
+    group.addoption(
+        "--affected",
+        action="store_true",
+        dest="affected",
+        default=False,
+        help=(
+            "For --dist=loadscope, only run the tests depending on the files "
+            "changed since the run recorded with --affected-record, according "
+            "to git, and the tests not recorded yet."
+        ),
+    )
+    group.addoption(
+        "--elastic",
+        action="store_true",
+        dest="elastic",
+        default=False,
+        help=(
+            "For --dist=loadscope, start more workers during the run while "
+            "tests are waiting and the CPU is underused, up to --maxprocesses "
+            "or the number of CPUs. They take their tests from the other "
+            "workers."
+        ),
+    )
+    group.addoption(
+        "--max-worker-rss",
+        action="store",
+        type=int,
+        dest="maxworkerrss",
+        metavar="MB",
+        default=None,
+        help=(
+            "For --dist=loadscope, replace a worker once its resident memory "
+            "exceeds MB megabytes after a test. It hands its unstarted tests "
+            "to a replacement started ahead of time."
+        ),
+    )
+    group.addoption(
+        "--max-tests-per-worker",
+        action="store",
+        type=int,
+        dest="maxtestsperworker",
+        metavar="N",
+        default=None,
+        help=(
+            "For --dist=loadscope, replace a worker once it has run N tests, "
+            "like --max-worker-rss."
+        ),
+    )
+    group.addoption(
+        "--test-timeout",
+        action="store",
+        type=float,
+        dest="testtimeout",
+        metavar="SECONDS",
+        default=None,
+        help=(
+            "Kill a worker whose test runs for more than SECONDS, after dumping "
+            "the stacks of its threads, report the test as failed and replace "
+            "the worker. Tests can set their own timeout with the "
+            "xdist_timeout marker."
+        ),
+    )
+    group.addoption(
+        "--prioritize",
+        action="store_true",
+        dest="prioritize",
+        default=False,
+        help=(
+            "Run first on each worker the tests which failed in the last run, "
+            "then the tests of the files changed according to git, or modified "
+            "since the last run without git, newest first."
+        ),
+    )
+    group.addoption(
+        "--metrics-file",
+        action="store",
+        dest="metricsfile",
+        metavar="PATH",
+        help=(
+            "Write the metrics of the distributed run to PATH at the end of the "
+            "session, in the OpenMetrics text format."
+        ),
+    )
+    group.addoption(
+        "--metrics-interval",
+        action="store",
+        type=float,
+        dest="metricsinterval",
+        metavar="SECONDS",
+        help="Also write the --metrics-file every SECONDS during the run.",
+    )
+    group.addoption(
+        "--xdist-log-dir",
+        action="store",
+        dest="xdistlogdir",
+        metavar="DIR",
+        help=(
+            "Write the xdist debug logs of the controller and of each worker as "
+            "JSON lines to DIR/controller.jsonl and DIR/<worker id>.jsonl. The "
+            "records are buffered in memory and written by a background thread."
+        ),
+    )
+    group.addoption(
+        "--xdist-log-level",
+        action="store",
+        dest="xdistloglevel",
+        choices=["debug", "info", "warning", "error"],
+        default="debug",
+        help="Minimum level of the records written to --xdist-log-dir (default: debug).",
+    )
+    group.addoption(
+        "--xdist-trace",
+        action="store",
+        dest="xdisttrace",
+        metavar="PATH",
+        help=(
+            "Write a timeline of the distributed run to PATH, in the Chrome "
+            "trace-event format read by chrome://tracing and Perfetto."
+        ),
+    )
 
     parser.addini(
         "rsyncdirs",
@@ -220,6 +395,11 @@ def pytest_configure(config):
         "in relation to one another. Provided by pytest-xdist."
     )
     config.addinivalue_line("markers", config_line)
+    config.addinivalue_line(
+        "markers",
+        "xdist_timeout(seconds): kill the worker and fail the test if it runs "
+        "for more than seconds, see --test-timeout. Provided by pytest-xdist.",
+    )
 
     # Skip this plugin entirely when only doing collection.
     if config.getvalue("collectonly"):
@@ -229,6 +409,15 @@ def pytest_configure(config):
     # mode and test environments.
     if config.getoption("dist") != "no" and config.getoption("tx"):
         from xdist.dsession import DSession
+        from xdist.remote import start_logging
+
+        logdir = config.getoption("xdistlogdir")
+        if logdir:
+            os.makedirs(logdir, exist_ok=True)
+            start_logging(
+                os.path.join(logdir, "controller.jsonl"),
+                config.getoption("xdistloglevel"),
+            )
 
         session = DSession(config)
         config.pluginmanager.register(session, "dsession")
@@ -252,6 +441,13 @@ def pytest_configure(config):
         config.issue_config_time_warning(warning, 2)
 
 
+@pytest.hookimpl
+def pytest_unconfigure(config):
+    from xdist.remote import stop_logging
+
+    stop_logging()
+
+
 @pytest.hookimpl(tryfirst=True)
 def pytest_cmdline_main(config):
     usepdb = config.getoption("usepdb", False)  # a core option
@@ -0,0 +1,91 @@
+"""
+Ordering of the tests most likely to fail in front of each worker's queue.
+
+With ``--prioritize`` every worker reorders its collection to run first the
+files of the tests which failed in the last run, according to the
+``lastfailed`` data of pytest's cache provider, then the recently changed
+files, newest first.  A file is changed if it or one of the files its tests
+executed in the run recorded with ``--affected-record`` is uncommitted
+according to ``git status``, or without git modified since the start of the
+last finished run.
+
+Tests of a file are kept together so their module-scoped fixtures are still
+set up once, only the failed tests are moved in front of their file.  With
+``--maxfail`` a regression then stops the session early.
+"""
+import os
+
+from xdist.affected import changed_files, DependencyMap
+from xdist.history import nodeid_file, TimingHistory
+
+
+def changed_mtimes(rootdir, candidates, since=None):
+    """Return the modification time of each recently changed file.
+
+    These are the uncommitted and untracked files, or without git the
+    ``candidates`` modified after ``since``.  Deleted files are left out.
+    """
+    changed = changed_files(rootdir, "HEAD")
+    if changed is None:
+        if since is None:
+            return {}
+        changed = candidates
+    else:
+        since = None
+    mtimes = {}
+    for path in changed:
+        try:
+            mtime = os.stat(os.path.join(str(rootdir), path)).st_mtime
+        except OSError:
+            continue
+        if since is None or mtime > since:
+            mtimes[path] = mtime
+    return mtimes
+
+
+def changed_file_ranks(test_files, mtimes, dependencies=None):
+    """Return the rank of each changed file of ``test_files``, 0 is the newest.
+
+    ``mtimes`` are the changed files and their modification time, and
+    ``dependencies`` the files executed by each recorded test.
+    """
+    newest = {}
+    for path in test_files:
+        if path in mtimes:
+            newest[path] = mtimes[path]
+    for nodeid, deps in (dependencies or {}).items():
+        path = nodeid_file(nodeid)
+        for dep in deps & mtimes.keys():
+            newest[path] = max(newest.get(path, 0.0), mtimes[dep])
+    ordered = sorted(newest, key=lambda path: newest[path], reverse=True)
+    return {path: rank for rank, path in enumerate(ordered)}
+
+
+def worker_priority(config, bins):
+    """Return the ``workerinput["priority"]`` of the workers running ``bins``.
+
+    It has the last failed nodeids in ``failed`` and the rank of each changed
+    file in ``changed``.
+    """
+    cache = getattr(config, "cache", None)
+    failed = sorted(cache.get("cache/lastfailed", {})) if cache is not None else []
+    dependencies = DependencyMap.from_config(config).tests
+    test_files = set()
+    for entries in bins:
+        for entry in entries:
+            path = nodeid_file(entry)
+            if os.path.isabs(path):
+                path = os.path.relpath(path, config.rootpath).replace(os.sep, "/")
+            test_files.add(path)
+    candidates = test_files | {dep for deps in dependencies.values() for dep in deps}
+    history = TimingHistory.from_config(config)
+    try:
+        since = history.last_finished_run_start()
+    finally:
+        history.connection.close()
+    mtimes = changed_mtimes(config.rootpath, candidates, since)
+    test_files |= {nodeid_file(nodeid) for nodeid in dependencies}
+    return {
+        "failed": failed,
+        "changed": changed_file_ranks(test_files, mtimes, dependencies),
+    }
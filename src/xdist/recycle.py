@@ -0,0 +1,85 @@
+"""
+Recycling of workers over a memory or test count limit.
+
+With ``--max-worker-rss`` or ``--max-tests-per-worker`` a worker which
+crosses a limit after a test is retired: it runs the test it already took
+from its queue, hands its unstarted tests to a replacement and exits
+normally, so neither a crash nor a restart is reported.  The replacement is
+started ahead of time, once the worker reaches ``PRESPAWN_AT`` of a limit,
+so it has usually joined by the time it is needed.  It has no bin of its
+own, as the workers added by ``--elastic``.
+"""
+from collections import Counter
+
+import pytest
+
+from xdist.scheduler import dist_modes_supporting_new_nodes
+
+
+class WorkerRecycler:
+    """Retire the nodes of ``dsession`` over ``max_rss`` bytes or ``max_tests``.
+
+    ``test_finished()`` is called by the controller for each test completed
+    by a node, with the resident memory of the worker if it reported it.
+    Only schedulers supporting new nodes, with ``add_replacement`` and
+    ``retire_node``, are handled, i.e. ``--dist=loadscope`` and its
+    subclasses; the limits are refused with the other ``--dist`` modes.
+    """
+
+    PRESPAWN_AT = 0.8
+
+    def __init__(self, dsession, max_rss=None, max_tests=None):
+        self.dsession = dsession
+        self.max_rss = max_rss
+        self.max_tests = max_tests
+        self.tests = Counter()
+        self.replaced = set()
+        self.retired = set()
+
+    @classmethod
+    def from_config(cls, dsession, config):
+        """Return a recycler for the configured limits, None without any."""
+        max_rss = config.getoption("maxworkerrss", None)
+        max_tests = config.getoption("maxtestsperworker", None)
+        if not max_rss and not max_tests:
+            return None
+        dist_modes = dist_modes_supporting_new_nodes()
+        if config.getvalue("dist") not in dist_modes:
+            raise pytest.UsageError(
+                "--max-worker-rss and --max-tests-per-worker are only supported "
+                f"by --dist={', '.join(dist_modes)}."
+            )
+        return cls(dsession, max_rss and max_rss * 1024 * 1024, max_tests)
+
+    def usage(self, node, rss=None):
+        """Return the highest fraction of a limit used by ``node``."""
+        usage = 0.0
+        if self.max_tests:
+            usage = self.tests[node] / self.max_tests
+        if self.max_rss and rss is not None:
+            usage = max(usage, rss / self.max_rss)
+        return usage
+
+    def test_finished(self, node, rss=None):
+        self.tests[node] += 1
+        dsession = self.dsession
+        sched = dsession.sched
+        if (
+            node in self.retired
+            or node.shutting_down
+            or dsession.shuttingdown
+            or not hasattr(sched, "retire_node")
+        ):
+            return
+        usage = self.usage(node, rss)
+        if usage >= self.PRESPAWN_AT and node not in self.replaced:
+            self.replaced.add(node)
+            sched.add_replacement(node, dsession.add_worker(node))
+        if usage >= 1:
+            self.retired.add(node)
+            if self.max_tests and self.tests[node] >= self.max_tests:
+                reason = f"after {self.tests[node]} tests"
+            else:
+                reason = f"at {rss / 1024 / 1024:.0f} MB"
+            dsession.report_line(f"\nrecycling worker {node.gateway.id} {reason}")
+            sched.retire_node(node)
@@ -6,16 +6,24 @@
     needs not to be installed in remote environments.
 """
 
+import ast
 import contextlib
+import faulthandler
+import importlib.util
+import json
 import sys
 import os
+import tempfile
+import threading
 import time
-from typing import Any
+from collections import deque, namedtuple
+from typing import Any, Tuple
 
 import pytest
 from execnet.gateway_base import dumps, DumpError
 
 from _pytest.config import _prepareconfig, Config
+from _pytest.runner import call_and_report, show_test_item
 
 try:
     from setproctitle import setproctitle
@@ -25,12 +33,100 @@ except ImportError:
         pass
 
 
+LOG_LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+
+
+class LogSink:
+    """Ring buffer of structured log records, written to a JSONL file.
+
+    Logging a record only appends a tuple to the buffer, the records are
+    formatted and written to ``path`` by a background thread every
+    ``interval`` seconds.  When the buffer is full, the oldest records are
+    dropped and counted in ``dropped``.
+    """
+
+    CAPACITY = 100_000
+
+    def __init__(self, path, level="debug", interval=0.5):
+        self.path = path
+        self.level = LOG_LEVELS[level]
+        self.interval = interval
+        self.records = deque(maxlen=self.CAPACITY)
+        self.dropped = 0
+        self._closed = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="xdist-log-sink", daemon=True
+        )
+        self._thread.start()
+
+    def emit(self, level, name, args):
+        if len(self.records) == self.CAPACITY:
+            self.dropped += 1
+        self.records.append((time.time(), level, name, args))
+
+    def _run(self):
+        with open(self.path, "a") as f:
+            while not self._closed.wait(self.interval):
+                self._flush(f)
+            self._flush(f)
+
+    def _flush(self, f):
+        levels = {value: name for name, value in LOG_LEVELS.items()}
+        while self.records:
+            when, level, name, args = self.records.popleft()
+            record = {
+                "ts": when,
+                "level": levels[level],
+                "logger": name,
+                "msg": " ".join(str(arg) for arg in args),
+            }
+            f.write(json.dumps(record) + "\n")
+        if self.dropped:
+            record = {"ts": time.time(), "level": "warning", "logger": "xdist"}
+            record["msg"] = f"dropped {self.dropped} records, the buffer was full"
+            f.write(json.dumps(record) + "\n")
+            self.dropped = 0
+        f.flush()
+
+    def close(self):
+        """Write the remaining records and stop the background thread."""
+        self._closed.set()
+        self._thread.join()
+
+
+# Sink of the Producers of this process, logging goes to stderr without one
+_log_sink = None
+
+
+def start_logging(path, level="debug"):
+    """Send the records of all the Producers of this process to ``path``."""
+    global _log_sink
+    stop_logging()
+    _log_sink = LogSink(path, level)
+
+
+def stop_logging():
+    global _log_sink
+    if _log_sink is not None:
+        _log_sink.close()
+        _log_sink = None
+
+
+def log_enabled(config):
+    """Return True if the xdist Producers of ``config`` should log."""
+    return bool(config.option.debug or config.getoption("xdistlogdir", None))
+
+
 class Producer:
     """
     Simplified implementation of the same interface as py.log, for backward compatibility
     since we dropped the dependency on pylib.
     Note: this is defined here because this module can't depend on xdist, so we need
     to have the other way around.
+
+    Calling the producer logs at the debug level, the ``info``, ``warning``
+    and ``error`` methods at the other levels.  Records go to the log sink of
+    the process if one was started, to stderr otherwise.
     """
 
     def __init__(self, name: str, *, enabled: bool = True):
@@ -40,9 +136,28 @@ class Producer:
     def __repr__(self) -> str:
         return f"{type(self).__name__}({self.name!r}, enabled={self.enabled})"
 
+    def _log(self, level: int, args: Tuple[Any, ...], **k: Any) -> None:
+        sink = _log_sink
+        if sink is None:
+            print(f"[{self.name}]", *args, **k, file=sys.stderr)
+        elif level >= sink.level:
+            sink.emit(level, self.name, args)
+
     def __call__(self, *a: Any, **k: Any) -> None:
         if self.enabled:
-            print(f"[{self.name}]", *a, **k, file=sys.stderr)
+            self._log(LOG_LEVELS["debug"], a, **k)
+
+    def info(self, *a: Any) -> None:
+        if self.enabled:
+            self._log(LOG_LEVELS["info"], a)
+
+    def warning(self, *a: Any) -> None:
+        if self.enabled:
+            self._log(LOG_LEVELS["warning"], a)
+
+    def error(self, *a: Any) -> None:
+        if self.enabled:
+            self._log(LOG_LEVELS["error"], a)
 
     def __getattr__(self, name: str) -> "Producer":
         return type(self)(name, enabled=self.enabled)
@@ -56,19 +171,284 @@ def worker_title(title):
         pass
 
 
+def current_rss():
+    """Return the resident memory of this process in bytes, None if unknown."""
+    try:
+        import psutil
+    except ImportError:
+        pass
+    else:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def dump_stacks():
+    """Return the stacks of all the threads, as dumped by faulthandler."""
+    with tempfile.TemporaryFile("w+") as f:
+        faulthandler.dump_traceback(f, all_threads=True)
+        f.seek(0)
+        return f.read()
+
+
+# Request to collect more tests in the main thread, queued ahead of test indices.
+CollectRequest = namedtuple("CollectRequest", ["paths"])
+
+
+class StartupTimer:
+    """Time the startup phases of the worker which run before its session.
+
+    Registered while the config is prepared, the durations are sent to the
+    controller with the 'workerready' event.
+    """
+
+    def __init__(self):
+        self.timings = {}
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_load_initial_conftests(self):
+        start = time.perf_counter()
+        yield
+        self.timings["conftests"] = time.perf_counter() - start
+
+
+def prioritize(items, failed, changed):
+    """Reorder ``items`` in place to run the failed and changed files first.
+
+    ``changed`` maps the changed files to their rank.  The tests of a file
+    stay together, its ``failed`` tests in front.
+    """
+    failed = set(failed)
+    files = {}
+    for item in items:
+        files.setdefault(item.nodeid.split("::", 1)[0], []).append(item)
+
+    def file_key(path):
+        if any(item.nodeid in failed for item in files[path]):
+            return (0, 0)
+        if path in changed:
+            return (1, changed[path])
+        return (2, 0)
+
+    items[:] = [
+        item
+        for path in sorted(files, key=file_key)
+        for item in sorted(files[path], key=lambda item: item.nodeid not in failed)
+    ]
+
+
+class DependencyRecorder:
+    """Record the source files below ``rootdir`` executed by each test.
+
+    The files imported by the module of a test are included.  The result
+    is sent to the controller in ``workeroutput["dependencies"]`` as a list
+    of paths relative to ``rootdir`` and, for each test, the indexes of its
+    files in that list.
+
+    Uses ``sys.monitoring`` when available, where each function is only
+    reported once per test, else a profile function seeing every call.
+    """
+
+    TOOL_IDS = (3, 4)
+
+    def __init__(self, rootdir):
+        self.rootdir = os.path.join(os.path.realpath(str(rootdir)), "")
+        self.names = []
+        self._name_indexes = {}
+        # filename -> index in names, -1 if not below rootdir
+        self._indexes = {}
+        self.tests = {}
+        # module name -> indexes of the files it imports
+        self.modules = {}
+        self._current = None
+        self._saved_profile = None
+        self.tool_id = None
+        monitoring = getattr(sys, "monitoring", None)
+        for tool_id in self.TOOL_IDS if monitoring is not None else ():
+            try:
+                monitoring.use_tool_id(tool_id, "xdist-dependencies")
+            except ValueError:
+                continue  # used by another tool
+            monitoring.register_callback(
+                tool_id, monitoring.events.PY_START, self._py_start
+            )
+            self.tool_id = tool_id
+            break
+
+    def _py_start(self, code, offset):
+        if self._current is not None:
+            self._current.add(code.co_filename)
+        return sys.monitoring.DISABLE
+
+    def _profile(self, frame, event, arg):
+        if event == "call":
+            self._current.add(frame.f_code.co_filename)
+
+    def start(self):
+        self._current = set()
+        if self.tool_id is not None:
+            sys.monitoring.restart_events()
+            sys.monitoring.set_events(self.tool_id, sys.monitoring.events.PY_START)
+        else:
+            self._saved_profile = sys.getprofile()
+            sys.setprofile(self._profile)
+
+    def stop(self):
+        """Stop recording, return the indexes of the files executed."""
+        if self.tool_id is not None:
+            sys.monitoring.set_events(self.tool_id, 0)
+        else:
+            sys.setprofile(self._saved_profile)
+        filenames, self._current = self._current, None
+        indexes = set()
+        for filename in filenames:
+            index = self._indexes.get(filename)
+            if index is None:
+                index = self._indexes[filename] = self._add_name(filename)
+            if index >= 0:
+                indexes.add(index)
+        return indexes
+
+    def _add_name(self, filename):
+        # skip "<frozen os>", "<string>" and the like
+        if not os.path.isabs(filename):
+            return -1
+        path = os.path.realpath(filename)
+        if not path.startswith(self.rootdir):
+            return -1
+        name = path[len(self.rootdir) :].replace(os.sep, "/")
+        if name not in self._name_indexes:
+            self._name_indexes[name] = len(self.names)
+            self.names.append(name)
+        return self._name_indexes[name]
+
+    def _source_imports(self, module):
+        """Return the names of the modules imported in the source of ``module``."""
+        try:
+            with open(module.__file__, "rb") as f:
+                tree = ast.parse(f.read())
+        except (OSError, SyntaxError, ValueError):
+            return []
+        package = getattr(module, "__package__", None) or ""
+        names = []
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names.extend(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom):
+                base = "." * node.level + (node.module or "")
+                try:
+                    base = importlib.util.resolve_name(base, package)
+                except (ImportError, ValueError):
+                    continue
+                names.append(base)
+                # the imported names may be submodules
+                names.extend(f"{base}.{alias.name}" for alias in node.names)
+        return names
+
+    def _module_files(self, modname):
+        """Return the indexes of the files imported by the module ``modname``.
+
+        Only the modules already imported are followed, and not the ones
+        outside of ``rootdir``.  Found from the sources instead of tracing
+        the imports, as a module is only executed by the first test module
+        importing it.
+        """
+        if modname in self.modules:
+            return self.modules[modname]
+        files = set()
+        seen = set()
+        pending = [modname]
+        while pending:
+            name = pending.pop()
+            if name in seen:
+                continue
+            seen.add(name)
+            # importing a submodule executes its packages
+            parts = name.split(".")
+            pending.extend(".".join(parts[:i]) for i in range(1, len(parts)))
+            module = sys.modules.get(name)
+            filename = getattr(module, "__file__", None)
+            if not filename:
+                continue
+            index = self._indexes.get(filename)
+            if index is None:
+                index = self._indexes[filename] = self._add_name(filename)
+            if index < 0:
+                continue
+            files.add(index)
+            pending.extend(self._source_imports(module))
+        self.modules[modname] = files
+        return files
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_protocol(self, item):
+        self.start()
+        try:
+            yield
+        finally:
+            files = self.stop()
+            module = getattr(item, "module", None)
+            if module is not None:
+                files |= self._module_files(module.__name__)
+            self.tests[item.nodeid] = files
+
+    @pytest.hookimpl
+    def pytest_sessionfinish(self, session):
+        if self.tool_id is not None:
+            sys.monitoring.register_callback(
+                self.tool_id, sys.monitoring.events.PY_START, None
+            )
+            sys.monitoring.free_tool_id(self.tool_id)
+            self.tool_id = None
+        session.config.workeroutput["dependencies"] = {
+            "files": self.names,
+            "tests": {nodeid: sorted(files) for nodeid, files in self.tests.items()},
+        }
+
+
 class WorkerInteractor:
     SHUTDOWN_MARK = object()
     QUEUE_REPLACED_MARK = object()
+    COLLECT_PRIORITY = -1
 
-    def __init__(self, config, channel):
+    # Seconds between two heartbeats sent while a test runs
+    HEARTBEAT_INTERVAL = 1.0
+
+    def __init__(self, config, channel, startup_timings=None):
         self.config = config
+        self.startup_timings = startup_timings or {}
         self.workerid = config.workerinput.get("workerid", "?")
         self.testrunuid = config.workerinput["testrunuid"]
-        self.log = Producer(f"worker-{self.workerid}", enabled=config.option.debug)
+        logdir = config.getoption("xdistlogdir", None)
+        if logdir:
+            start_logging(
+                os.path.join(logdir, f"{self.workerid}.jsonl"),
+                config.getoption("xdistloglevel"),
+            )
+        self.log = Producer(f"worker-{self.workerid}", enabled=log_enabled(config))
         self.channel = channel
         self.torun = self._make_queue()
         self.nextitem_index = None
         self.already_run_tests = set()
+        self.cancelled = False
+        # the controller recycles workers over --max-worker-rss
+        self.report_rss = bool(config.getoption("maxworkerrss", None))
+        self.test_timeout = config.getoption("testtimeout", None)
+        # (item index, nodeid, start time, timeout) of the running test
+        self.current_test = None
+        self._heartbeat_lock = threading.Lock()
+        self._heartbeat_stop = threading.Event()
+        self.retry_budgets = {}
+        # events of the thread running in-place retries are held back
+        self._held_events = None
+        self._holding_thread = None
+        # can_retry of the attempt run by pytest_runtest_protocol, and its result
+        self._attempt_can_retry = None
+        self._attempt_result = None
+        self._collecting_more = False
         config.pluginmanager.register(self)
 
     def _make_queue(self):
@@ -76,28 +456,38 @@ class WorkerInteractor:
 
     def _get_next_item_index(self):
         """Gets the next item from test queue. Handles the case when the queue
-        is replaced concurrently in another thread.
+        is replaced concurrently in another thread, and performs pending
+        collection requests (which must run in the main thread).
         """
         _, result = self.torun.get()
-        while result is self.QUEUE_REPLACED_MARK:
+        while result is self.QUEUE_REPLACED_MARK or isinstance(result, CollectRequest):
+            if isinstance(result, CollectRequest):
+                self.collect_more(result.paths)
             _, result = self.torun.get()
         return result
 
     def sendevent(self, name, **kwargs):
         # self.log("sending", name)
-        self.channel.send((name, kwargs))
+        if (
+            self._held_events is not None
+            and threading.current_thread() is self._holding_thread
+        ):
+            self._held_events.append((name, kwargs))
+        else:
+            self.channel.send((name, kwargs))
 
     @pytest.hookimpl
     def pytest_internalerror(self, excrepr):
         formatted_error = str(excrepr)
         for line in formatted_error.split("\n"):
-            self.log("IERROR>", line)
+            self.log.error("IERROR>", line)
         interactor.sendevent("internal_error", formatted_error=formatted_error)
 
     @pytest.hookimpl
     def pytest_sessionstart(self, session):
         self.session = session
         workerinfo = getinfodict()
+        workerinfo["startup"] = self.startup_timings
         self.sendevent("workerready", workerinfo=workerinfo)
 
     @pytest.hookimpl(hookwrapper=True)
@@ -106,10 +496,15 @@ class WorkerInteractor:
         self.config.workeroutput["exitstatus"] = int(exitstatus)
         yield
         self.sendevent("workerfinished", workeroutput=self.config.workeroutput)
+        stop_logging()
 
-    @pytest.hookimpl
+    @pytest.hookimpl(tryfirst=True)
     def pytest_collection(self, session):
         self.sendevent("collectionstart")
+        if self.config.workerinput.get("empty_collection"):
+            # the tests are sent with 'collect_and_run'
+            session.perform_collect([])
+            return True
 
     def handle_command(self, command):
         if command is self.SHUTDOWN_MARK:
@@ -129,6 +524,60 @@ class WorkerInteractor:
             self.torun.put((100, self.SHUTDOWN_MARK))
         elif name == "steal":
             self.steal(kwargs["indices"])
+        elif name == "cancel":
+            self.cancel()
+        elif name == "collect_and_run":
+            paths = tuple(kwargs["paths"])
+            self.torun.put((self.COLLECT_PRIORITY, CollectRequest(paths)))
+        elif name == "retry_budgets":
+            self.retry_budgets.update(kwargs["budgets"])
+        elif name == "dump_stacks":
+            # the main thread may be stuck, reply from the receiver thread
+            self.channel.send(("stacks", {"stacks": dump_stacks()}))
+
+    def timeout_of(self, item):
+        """Return the timeout of ``item`` in seconds, None if it has none."""
+        mark = item.get_closest_marker("xdist_timeout")
+        if mark is None:
+            return self.test_timeout
+        seconds = mark.args[0] if mark.args else mark.kwargs["seconds"]
+        return float(seconds)
+
+    def send_heartbeat(self):
+        """Send the progress of the running test, with the heartbeat lock held.
+
+        Heartbeats bypass the events held back during in-place retries, and
+        a heartbeat never follows the 'runtest_protocol_complete' event of
+        its test.
+        """
+        item_index, nodeid, start, timeout = self.current_test
+        kwargs = dict(
+            item_index=item_index,
+            nodeid=nodeid,
+            elapsed=time.time() - start,
+            timeout=timeout,
+        )
+        self.channel.send(("heartbeat", kwargs))
+
+    def start_heartbeat(self, nodeid, start, timeout):
+        """Mark ``nodeid`` as running since ``start`` and send a first heartbeat.
+
+        The next heartbeats may never come if the test holds the GIL.
+        """
+        with self._heartbeat_lock:
+            self.current_test = (self.item_index, nodeid, start, timeout)
+            self.send_heartbeat()
+
+    def _heartbeat_loop(self):
+        while not self._heartbeat_stop.wait(self.HEARTBEAT_INTERVAL):
+            with self._heartbeat_lock:
+                if self.current_test is None:
+                    continue
+                try:
+                    self.send_heartbeat()
+                except OSError:
+                    # the channel is closed
+                    return
 
     def steal(self, indices):
         indices = set(indices)
@@ -140,13 +589,24 @@ class WorkerInteractor:
             with contextlib.suppress(self.channel.gateway.execmodel.queue.Empty):
                 return old_queue.get_nowait()
 
-        for i in iter(old_queue_get_nowait_noraise, None):
+        for priority, i in iter(old_queue_get_nowait_noraise, None):
             if i in indices:
                 stolen.append(i)
             else:
-                self.torun.put((0, i))
+                self.torun.put((priority, i))
 
-        self.sendevent("unscheduled", indices=stolen)
+        # called from the receiver thread, never held back during in-place retries
+        self.channel.send(("unscheduled", {"indices": stolen}))
+        old_queue.put((50, self.QUEUE_REPLACED_MARK))
+
+    def cancel(self):
+        """Drop the queued tests, only the running one is finished."""
+        self.cancelled = True
+        old_queue, self.torun = self.torun, self._make_queue()
+        with contextlib.suppress(self.channel.gateway.execmodel.queue.Empty):
+            while True:
+                old_queue.get_nowait()
+        self.torun.put((100, self.SHUTDOWN_MARK))
         old_queue.put((50, self.QUEUE_REPLACED_MARK))
 
     @pytest.hookimpl
@@ -157,8 +617,13 @@ class WorkerInteractor:
         self.log("nextitem_index", self.nextitem_index)
         self.log(self.SHUTDOWN_MARK)
         self.log(self.nextitem_index is not self.SHUTDOWN_MARK)
-        while self.nextitem_index is not self.SHUTDOWN_MARK:
-            self.run_one_test()
+        heartbeat = threading.Thread(target=self._heartbeat_loop, daemon=True)
+        heartbeat.start()
+        try:
+            while self.nextitem_index is not self.SHUTDOWN_MARK and not self.cancelled:
+                self.run_one_test()
+        finally:
+            self._heartbeat_stop.set()
         return True
 
     def run_one_test(self):
@@ -166,6 +631,9 @@ class WorkerInteractor:
         self.log("before get next item index")
         self.nextitem_index = self._get_next_item_index()
         self.log("after get next item index")
+        if self.cancelled:
+            # cancelled while waiting for the next test, before this one started
+            return
 
         items = self.session.items
         item = items[self.item_index]
@@ -182,19 +650,174 @@ class WorkerInteractor:
 
         self.log("running", self.item_index)
         start = time.time()
-        self.config.hook.pytest_runtest_protocol(
-            item=item, nextitem=nextitem if nextitem else items[0]
-        )
+        timeout = self.timeout_of(item)
+        if timeout is not None:
+            # heartbeats are only watched for tests with a timeout
+            self.start_heartbeat(item.nodeid, start, timeout)
+        max_retries = self.retry_budgets.get(self.item_index, 0)
+        if max_retries:
+            self.run_with_retries(item, nextitem if nextitem else items[0], max_retries)
+        else:
+            self.config.hook.pytest_runtest_protocol(
+                item=item, nextitem=nextitem if nextitem else items[0]
+            )
         duration = time.time() - start
+        if self.current_test is not None:
+            with self._heartbeat_lock:
+                self.current_test = None
 
         self.already_run_tests.add(self.item_index)
 
         worker_title("[pytest-xdist idle]")
 
+        kwargs = {}
+        if self.report_rss:
+            kwargs["rss"] = current_rss()
         self.sendevent(
-            "runtest_protocol_complete", item_index=self.item_index, duration=duration
+            "runtest_protocol_complete",
+            item_index=self.item_index,
+            duration=duration,
+            **kwargs,
+        )
+
+    def run_with_retries(self, item, nextitem, max_retries):
+        """Run ``item``, retrying it right away while its call fails.
+
+        An attempt which is going to be retried is only torn down up to the
+        item's parent, so the next attempt reuses the fixtures of broader
+        scopes.  The events of each attempt are held back and only the ones
+        of the last attempt are sent, preceded by a 'retried' event carrying
+        the first failure when the test was retried.
+
+        Each attempt goes through ``pytest_runtest_protocol``, so the
+        hookwrappers of other plugins run around it.
+        """
+        ihook = item.ihook
+        ihook.pytest_runtest_logstart(nodeid=item.nodeid, location=item.location)
+        first_failure = None
+        retries_start = None
+        self._holding_thread = threading.current_thread()
+        for attempt in range(max_retries + 1):
+            if attempt and self.current_test is not None:
+                # the timeout applies to each attempt, not to all of them
+                _, nodeid, _, timeout = self.current_test
+                self.start_heartbeat(nodeid, time.time(), timeout)
+            self._held_events = []
+            self._attempt_can_retry = attempt < max_retries
+            try:
+                self.config.hook.pytest_runtest_protocol(item=item, nextitem=nextitem)
+            finally:
+                self._attempt_can_retry = None
+            reports, retrying = self._attempt_result
+            if not retrying:
+                break
+            if first_failure is None:
+                first_failure = reports[-2]
+                retries_start = time.time()
+            self.log("retrying in place", item.nodeid)
+        held_events, self._held_events = self._held_events, None
+        if attempt:
+            data = self.config.hook.pytest_report_to_serializable(
+                config=self.config, report=first_failure
+            )
+            self.sendevent(
+                "retried",
+                item_index=self.item_index,
+                retries=attempt,
+                passed=not any(rep.failed for rep in reports),
+                duration=time.time() - retries_start,
+                data=data,
+            )
+        for event in held_events:
+            self.channel.send(event)
+        ihook.pytest_runtest_logfinish(nodeid=item.nodeid, location=item.location)
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_runtest_protocol(self, item, nextitem):
+        if self._attempt_can_retry is None:
+            return None
+        self._attempt_result = self._run_attempt(
+            item, nextitem, self._attempt_can_retry
         )
+        return True
+
+    def _run_attempt(self, item, nextitem, can_retry):
+        """Run one attempt of ``item``, like ``runtestprotocol``.
 
+        Return the reports and whether the attempt failed in its call and
+        ``can_retry`` allows retrying it.
+        """
+        hasrequest = hasattr(item, "_request")
+        if hasrequest and not item._request:
+            item._initrequest()
+        try:
+            reports = [call_and_report(item, "setup")]
+            if reports[0].passed:
+                setup_only = item.config.getoption("setuponly", False)
+                if item.config.getoption("setupshow", False):
+                    show_test_item(item, add_space=not setup_only)
+                if not setup_only:
+                    reports.append(call_and_report(item, "call"))
+            session = item.session
+            if session.shouldfail or session.shouldstop:
+                can_retry = False
+                nextitem = None
+            retrying = can_retry and len(reports) == 2 and reports[1].failed
+            reports.append(
+                call_and_report(
+                    item, "teardown", nextitem=item.parent if retrying else nextitem
+                )
+            )
+        finally:
+            if hasrequest:
+                item._request = False
+                item.funcargs = None
+        return reports, retrying
+
+    def collect_more(self, paths):
+        """Collect ``paths`` in the running session and queue the new items.
+
+        Used by the controller to move unstarted tests from a busy worker to
+        an idle one.  The new items are appended to ``session.items`` so that
+        indices already known by the controller stay valid.
+
+        ``paths`` are relative to the rootdir, like nodeids.  When some of
+        them cannot be collected, the others are collected one by one and
+        the error is sent to the controller, which fails the missing tests.
+        """
+        items = list(self.session.items)
+        args = []
+        for path in paths:
+            fspath, sep, rest = path.partition("::")
+            if self.config.getvalue("loadgroup") and rest.rfind("@") > rest.rfind("]"):
+                # drop the group suffix, pytest_collection_modifyitems adds it back
+                rest = rest.rpartition("@")[0]
+            args.append(str(self.config.rootpath / fspath) + sep + rest)
+        error = None
+        self._collecting_more = True
+        try:
+            try:
+                new_items = list(self.session.perform_collect(args))
+            except pytest.UsageError as e:
+                self.log("collect_and_run failed:", e)
+                error = str(e)
+                new_items = []
+                for arg in args:
+                    with contextlib.suppress(pytest.UsageError):
+                        new_items.extend(self.session.perform_collect([arg]))
+        finally:
+            self._collecting_more = False
+        self.session.items = items + new_items
+        self.sendevent(
+            "collectionextended",
+            ids=[item.nodeid for item in new_items],
+            error=error,
+        )
+        for i in range(len(items), len(items) + len(new_items)):
+            self.torun.put((0, i))
+
+    # after the other plugins, so that the prioritized order is final
+    @pytest.hookimpl(trylast=True)
     def pytest_collection_modifyitems(self, session, config, items):
         # add the group name to nodeid as suffix if --dist=loadgroup
         if config.getvalue("loadgroup"):
@@ -208,18 +831,23 @@ class WorkerInteractor:
                     else mark.kwargs.get("name", "default")
                 )
                 item._nodeid = f"{item.nodeid}@{gname}"
+        priority = config.workerinput.get("priority")
+        if priority:
+            prioritize(items, priority["failed"], priority["changed"])
 
     @pytest.hookimpl
     def pytest_collection_finish(self, session):
+        if self._collecting_more:
+            return
         try:
             topdir = str(self.config.rootpath)
         except AttributeError:  # pytest <= 6.1.0
             topdir = str(self.config.rootdir)
 
-        self.log(f"Collected {len(session.items)} items")
-        self.log(f"{session.shouldstop}")
-        self.log(f"{session.shouldfail}")
-        self.log(f"{session.trace}")
+        self.log("Collected", len(session.items), "items")
+        self.log(session.shouldstop)
+        self.log(session.shouldfail)
+        self.log(session.trace)
 
         self.sendevent(
             "collectionfinish",
@@ -361,15 +989,22 @@ if __name__ == "__channelexec__":
     os.environ["PYTEST_XDIST_WORKER"] = workerinput["workerid"]
     os.environ["PYTEST_XDIST_WORKER_COUNT"] = str(workerinput["workercount"])
 
+    startup = StartupTimer()
+    start = time.perf_counter()
     if hasattr(Config, "InvocationParams"):
-        config = _prepareconfig(args, None)
+        config = _prepareconfig(args, [startup])
     else:
         config = remote_initconfig(option_dict, args)
         config.args = args
+    startup.timings["prepareconfig"] = (
+        time.perf_counter() - start - startup.timings.get("conftests", 0.0)
+    )
 
     setup_config(config, option_dict.get("basetemp"))
     config._parser.prog = os.path.basename(workerinput["mainargv"][0])
     config.workerinput = workerinput  # type: ignore[attr-defined]
     config.workeroutput = {}  # type: ignore[attr-defined]
-    interactor = WorkerInteractor(config, channel)  # type: ignore[name-defined]
+    if workerinput.get("affected_record"):
+        config.pluginmanager.register(DependencyRecorder(config.rootpath))
+    interactor = WorkerInteractor(config, channel, startup.timings)  # type: ignore[name-defined]
     config.hook.pytest_cmdline_main(config=config)
@@ -4,3 +4,23 @@ from xdist.scheduler.loadfile import LoadFileScheduling  # noqa
 from xdist.scheduler.loadscope import LoadScopeScheduling  # noqa
 from xdist.scheduler.loadgroup import LoadGroupScheduling  # noqa
 from xdist.scheduler.worksteal import WorkStealingScheduling  # noqa
+
+
+# Scheduler class of each --dist mode
+SCHEDULERS = {
+    "each": EachScheduling,
+    "load": LoadScheduling,
+    "loadscope": LoadScopeScheduling,
+    "loadfile": LoadFileScheduling,
+    "loadgroup": LoadGroupScheduling,
+    "worksteal": WorkStealingScheduling,
+}
+
+
+def dist_modes_supporting_new_nodes():
+    """Return the --dist modes whose scheduler can add and retire nodes."""
+    return [
+        dist
+        for dist, scheduler in SCHEDULERS.items()
+        if getattr(scheduler, "supports_new_nodes", False)
+    ]
@@ -5,6 +5,7 @@ from _pytest.runner import CollectReport
 from xdist.remote import Producer
 from xdist.workermanage import parse_spec_config
 from xdist.report import report_collection_diff
+from xdist.weights import NodeWeights
 
 
 class LoadScheduling:
@@ -50,6 +51,9 @@ class LoadScheduling:
 
     :log: A py.log.Producer instance.
 
+    :weights: The ``NodeWeights`` of the nodes, the number of tests sent
+       to each node is proportional to its weight.
+
     :config: Config object, used for handling hooks.
     """
 
@@ -65,6 +69,7 @@ class LoadScheduling:
             self.log = log.loadsched
         self.config = config
         self.maxschedchunk = self.config.getoption("maxschedchunk")
+        self.weights = NodeWeights.from_config(config)
 
     @property
     def nodes(self):
@@ -150,6 +155,7 @@ class LoadScheduling:
         This is called by the ``DSession.worker_testreport`` hook.
         """
         self.node2pending[node].remove(item_index)
+        self.weights.record(node, self.collection[item_index], duration)
         self.check_schedule(node, duration=duration)
 
     def mark_test_pending(self, item):
@@ -172,12 +178,12 @@ class LoadScheduling:
             return
 
         if self.pending:
-            # how many nodes do we have?
-            num_nodes = len(self.node2pending)
+            # the share of this node, according to its weight
+            share = self.weights.share(node, self.node2pending, len(self.pending))
             # if our node goes below a heuristic minimum, fill it out to
             # heuristic maximum
-            items_per_node_min = max(2, len(self.pending) // num_nodes // 4)
-            items_per_node_max = max(2, len(self.pending) // num_nodes // 2)
+            items_per_node_min = max(2, share // 4)
+            items_per_node_max = max(2, share // 2)
             node_pending = self.node2pending[node]
             if len(node_pending) < items_per_node_min:
                 if duration >= 0.1 and len(node_pending) >= 2:
@@ -268,13 +274,15 @@ class LoadScheduling:
             # number of necessary fixture setup/teardown. Try to keep that
             # optimal order for every worker.
 
-            # how many items per node do we have about?
-            items_per_node = len(self.collection) // len(self.node2pending)
-            # take a fraction of tests for initial distribution
-            node_chunksize = min(items_per_node // 4, self.maxschedchunk)
-            node_chunksize = max(node_chunksize, 2)
-            # and initialize each node with a chunk of tests
             for node in self.nodes:
+                # how many items does this node get about?
+                items_per_node = self.weights.share(
+                    node, self.node2pending, len(self.collection)
+                )
+                # take a fraction of tests for initial distribution
+                node_chunksize = min(items_per_node // 4, self.maxschedchunk)
+                node_chunksize = max(node_chunksize, 2)
+                # and initialize each node with a chunk of tests
                 self._send_tests(node, node_chunksize)
 
         if not self.pending:
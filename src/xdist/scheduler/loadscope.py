@@ -1,21 +1,70 @@
+import math
 import re
 
 import csv
 from collections import OrderedDict, defaultdict
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import List, Tuple
 
 from _pytest.runner import CollectReport
 from _pytest.reports import TestReport
+from xdist.flakes import FlakeHistory
 from xdist.remote import Producer
 from xdist.report import report_collection_diff
+from xdist.weights import NodeWeights
 from xdist.workermanage import parse_spec_config
 
 
 
 @dataclass
 class RetryInfo:
+    """Retry state of a test which failed on its first run.
+
+    ``retry_count`` is the number of retries sent to the node so far, and
+    ``in_flight`` how many of those have not completed yet.  ``in_place`` is
+    set for tests the worker already retried itself (see
+    ``--retry-in-place``), whose final reports are all reported as is.
+    ``when`` is the phase of the original failure: a retry passes when its
+    call passes, or its teardown for a teardown failure.
+    """
+
     retry_count: int
     original_test_report: TestReport
+    when: str = "call"
+    max_retries: int = 5
+    in_flight: int = 0
+    passed_on_retry: int = 0
+    reported: bool = False
+    deterministic: bool = False
+    in_place: bool = False
+    signatures: List[Tuple[object, ...]] = field(default_factory=list)
+
+    @property
+    def passed(self):
+        return self.passed_on_retry > 0
+
+    @property
+    def exhausted(self):
+        """No more retries will be sent for this test."""
+        return self.passed or self.retry_count >= self.max_retries
+
+
+def failure_signature(rep):
+    """Return what identifies the way a test failed.
+
+    This is the exception type and the location it was raised at, taken from
+    the last traceback entry, so two failures with different messages (e.g.
+    containing a timestamp) still have the same signature.
+    """
+    longrepr = rep.longrepr
+    reprentries = getattr(getattr(longrepr, "reprtraceback", None), "reprentries", [])
+    reprfileloc = getattr(reprentries[-1], "reprfileloc", None) if reprentries else None
+    if reprfileloc is not None:
+        return (rep.when, reprfileloc.path, reprfileloc.lineno, reprfileloc.message)
+    reprcrash = getattr(longrepr, "reprcrash", None)
+    if reprcrash is not None:
+        return (rep.when, reprcrash.path, reprcrash.lineno, reprcrash.message)
+    return (rep.when, str(longrepr))
 
 
 class LoadScopeScheduling:
@@ -91,6 +140,28 @@ class LoadScopeScheduling:
                 (...)
             }
 
+    :steal_requests: Map of donor nodes with a pending "steal" request and
+       the idle node the stolen tests will be handed to.  Once the donor
+       answers with the tests it actually removed from its queue, the idle
+       node is asked to collect and run them (``collect_and_run``).
+
+    :pending_collections: Map of idle nodes and the nodeids they were asked
+       to collect, until they report back the extended collection.
+
+    :replacements: Map of nodes about to be recycled and the node started
+       to replace them, see ``xdist.recycle``.  A replacement waits for the
+       tests of the node it replaces, it neither takes tests from the other
+       nodes nor is shut down for lack of work.
+
+    :orphaned: Nodeids of the tests left unfinished by dead nodes, handed to
+       the next node running out of tests with ``collect_and_run``.
+
+    :retiring: Nodes over their limits.  Their unstarted tests are handed
+       to their replacement as soon as it joined, then they are shut down.
+
+    :weights: The ``NodeWeights`` of the nodes, the tests taken from a
+       busy node are split between it and the idle node by weight.
+
     :log: A py.log.Producer instance.
 
     :config: Config object, used for handling hooks.
@@ -98,6 +169,20 @@ class LoadScopeScheduling:
 
     RETRIES_MODULE_AND_TEST_REGEX = re.compile('([^:]+)::(.+)')
 
+    # Every worker needs at least 2 tests in queue - the current and the next one.
+    MIN_PENDING = 2
+
+    # Maximum number of retries of a failing test before its failure is
+    # reported, the actual number depends on the flakiness history of the test.
+    MAX_RETRIES = 5
+
+    # Stop retrying a test once this many attempts in a row failed the same way.
+    DETERMINISTIC_FAILURE_ATTEMPTS = 3
+
+    # Nodes can join during the run and be retired, see add_node and
+    # retire_node: --elastic and the recycling limits rely on it.
+    supports_new_nodes = True
+
     def __init__(self, config, log=None):
         self.numnodes = len(parse_spec_config(config))
         self.collection = None
@@ -109,6 +194,25 @@ class LoadScopeScheduling:
         self.retries: dict[str, RetryInfo] = {}
         self.retry_queue = OrderedDict()
 
+        self.steal_requests = OrderedDict()
+        self.pending_collections = OrderedDict()
+
+        self.replacements = OrderedDict()
+        self.retiring = set()
+        self.orphaned = []
+
+        self.flake_history = FlakeHistory.from_config(config)
+        self.weights = NodeWeights.from_config(config)
+        self.retry_budget = config.getoption("retrybudget")
+        self.retry_time_budget = config.getoption("retrytimebudget")
+        self.retry_in_place = config.getoption("retryinplace")
+        self.retries_sent = 0
+        self.retry_time = 0.0
+        self.skipped_retries = 0
+        self.deterministic_failures = 0
+        self._in_place_retries_stopped = False
+        self._run_reported = False
+
         if log is None:
             self.log = Producer("loadscopesched")
         else:
@@ -146,39 +250,78 @@ class LoadScopeScheduling:
             # We haven't begun
             return False
 
+        if self.steal_requests or self.pending_collections or self.orphaned:
+            # Tests are being moved between nodes
+            return False
+
+        if any(retry_info.in_flight for retry_info in self.retries.values()):
+            return False
+
         for node in self.assigned_work:
             if not all([x for x in self.assigned_work[node].values()]):
                 return False
 
-        with open('durations.csv', 'w') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(['nodeid', 'duration'])
+        if not self._run_reported:
+            # This property is evaluated after every event, report only once
+            self._run_reported = True
+            self._report_run()
 
-            for nodeid, duration in self.durations.items():
-                writer.writerow([nodeid, duration])
+        return True
 
+    def _report_run(self):
+        """Write the flaky tests of the run, once it is over."""
+        retried = {
+            nodeid: retry_info
+            for nodeid, retry_info in self.retries.items()
+            if retry_info.retry_count
+        }
         with open('flakes.csv', 'w') as csvfile:
             writer = csv.writer(csvfile)
-            writer.writerow(['filepath', 'test', 'num_retries'])
-            for entry, num_retries in self.retries.items():
-                    match = LoadScopeScheduling.RETRIES_MODULE_AND_TEST_REGEX.match(entry)
-                    if match is None:
-                        continue
-                    try:
-                        filepath = match.groups()[0]
-                        test_name = match.groups()[1]
-                        writer.writerow([filepath, test_name, num_retries])
-                    except IndexError:
-                        print(f"FAILURE ON FLAKES REGEX {entry}")
-
-        if self.retries:
+            writer.writerow(['filepath', 'test', 'num_retries', 'outcome'])
+            for entry, retry_info in retried.items():
+                match = LoadScopeScheduling.RETRIES_MODULE_AND_TEST_REGEX.match(entry)
+                if match is None:
+                    continue
+                try:
+                    filepath = match.groups()[0]
+                    test_name = match.groups()[1]
+                    writer.writerow(
+                        [
+                            filepath,
+                            test_name,
+                            retry_info.retry_count,
+                            self._retry_outcome(retry_info),
+                        ]
+                    )
+                except IndexError:
+                    print(f"FAILURE ON FLAKES REGEX {entry}")
+
+        if retried:
             print("======== Flaky Tests Output ========")
-            for nodeid, retry_info in self.retries.items():
-                print(f"---- {nodeid} ----")
+            for nodeid, retry_info in retried.items():
+                print(f"---- {nodeid} ({self._retry_outcome(retry_info)}) ----")
                 print(retry_info.original_test_report.longreprtext)
                 print()
 
-        return True
+        for nodeid in self.durations:
+            retry_info = self.retries.get(nodeid)
+            if retry_info is None:
+                self.flake_history.record(nodeid)
+            elif retry_info.passed:
+                self.flake_history.record(
+                    nodeid,
+                    failed=True,
+                    retries=retry_info.passed_on_retry,
+                    retry_failures=retry_info.passed_on_retry - 1,
+                )
+            else:
+                self.flake_history.record(
+                    nodeid,
+                    failed=True,
+                    retries=retry_info.retry_count,
+                    retry_failures=retry_info.retry_count,
+                )
+        self.flake_history.save()
 
     @property
     def has_pending(self):
@@ -217,7 +360,103 @@ class LoadScopeScheduling:
         node has no more pending items.
         """
         self.log("remove_node", node)
-        return None
+
+        # Dead node won't respond to "steal" request
+        self.steal_requests.pop(node, None)
+        # nor run the tests it was asked to collect
+        self.orphaned.extend(self.pending_collections.pop(node, ()))
+        crashitem = self._orphan_unfinished(node)
+
+        self.retiring.discard(node)
+        for retiring, replacement in list(self.replacements.items()):
+            if replacement is node:
+                del self.replacements[retiring]
+        replacement = self.replacements.pop(node, None)
+        if replacement in self.assigned_work:
+            # No longer reserved, it can take tests from the others
+            self._reschedule(replacement)
+        return crashitem
+
+    def _orphan_unfinished(self, node):
+        """Take the tests ``node`` did not finish away from it.
+
+        They are handed to the next node running out of tests, usually the
+        one replacing ``node``.  Return the test it was running, i.e. the
+        first unfinished one, which is marked as done as it gets reported as
+        crashed.
+        """
+        work = self.assigned_work.get(node, {})
+        unfinished = [
+            nodeid
+            for nodeid in self.registered_collections.get(node, [])
+            if work.get(nodeid) is False
+        ]
+        if not unfinished:
+            return None
+        crashitem = unfinished.pop(0)
+        work[crashitem] = True
+        for nodeid in unfinished:
+            del work[nodeid]
+        self.log("Rescheduling", len(unfinished), "tests of", node)
+        self.orphaned.extend(unfinished)
+        return crashitem
+
+    def _adopt_orphans(self, node):
+        """Have ``node`` collect and run the tests left by dead nodes."""
+        orphaned, self.orphaned = self.orphaned, []
+        self.log(node, "adopts", len(orphaned), "tests")
+        self.pending_collections[node] = orphaned
+        node.send_collect_and_run(orphaned)
+
+    def add_replacement(self, node, replacement):
+        """Reserve the newly started ``replacement`` node for ``node``."""
+        self.log("replacement", replacement, "for", node)
+        self.replacements[node] = replacement
+
+    def retire_node(self, node):
+        """Hand the unstarted tests of ``node`` to its replacement.
+
+        The node runs its current test and the one it already took from its
+        queue, then it is shut down.  Without a replacement it is simply
+        shut down once out of tests.
+        """
+        self.log("retire_node", node)
+        self.retiring.add(node)
+        self._hand_over(node)
+
+    def _hand_over(self, node):
+        """Move the unstarted tests of a retiring node to its replacement.
+
+        ``node`` is either of them.  Return True once done, False if it has
+        to wait, e.g. until the replacement has joined or a steal request
+        from the retiring node was answered.
+        """
+        for retiring, replacement in self.replacements.items():
+            if node in (retiring, replacement) and retiring in self.retiring:
+                break
+        else:
+            return False
+        if (
+            replacement not in self.registered_collections
+            or replacement.shutting_down
+            or replacement in self.pending_collections
+            or replacement in self.steal_requests.values()
+            or retiring in self.steal_requests
+            or retiring in self.pending_collections
+        ):
+            return False
+
+        del self.replacements[retiring]
+        self.retiring.discard(retiring)
+        tail = self._unstarted_tail(retiring, fraction=1)
+        self.log("Handing over", len(tail), "tests of", retiring, "to", replacement)
+        retiring.shutdown()
+        if tail:
+            self.steal_requests[retiring] = replacement
+            retiring.send_steal(tail)
+        else:
+            self._reschedule(replacement)
+        return True
 
     def add_node_collection(self, node, collection):
         """Add the collected test items from a node.
@@ -255,7 +494,13 @@ class LoadScopeScheduling:
         """
         nodeid = self.registered_collections[node][item_index]
 
-        self.durations[nodeid] = duration
+        retry_info = self.retries.get(nodeid)
+        if self.assigned_work[node][nodeid] and retry_info and retry_info.in_flight:
+            retry_info.in_flight -= 1
+            self.retry_time += duration
+        else:
+            self.durations[nodeid] = duration
+            self.weights.record(node, nodeid, duration)
 
         self.assigned_work[node][nodeid] = True
         self._reschedule(node)
@@ -263,6 +508,154 @@ class LoadScopeScheduling:
     def mark_test_pending(self, item):
         raise NotImplementedError()
 
+    def extend_node_collection(self, node, collection):
+        """Add the tests collected by a node in response to 'collect_and_run'.
+
+        The worker appends them to its collection and queues them itself,
+        so they only need to be tracked as assigned work.
+
+        Called by the hook:
+
+        - ``DSession.worker_collectionextended``.
+
+        Return the requested tests the node did not collect, which are no
+        longer assigned to any node.
+        """
+        self.log("extend_node_collection", node, len(collection))
+        requested = self.pending_collections.pop(node, ())
+        start = len(self.registered_collections[node])
+        self.registered_collections[node].extend(collection)
+        assigned_to_node = self.assigned_work[node]
+        for nodeid in collection:
+            assigned_to_node[nodeid] = False
+        self._send_retry_budgets(node, range(start, start + len(collection)))
+        self._reschedule(node)
+        collected = set(collection)
+        return [nodeid for nodeid in requested if nodeid not in collected]
+
+    def remove_pending_tests_from_node(self, node, indices):
+        """Node returned some test indices back in response to 'steal' command.
+
+        The returned tests are handed to the idle node which requested them.
+
+        Called by the hook:
+
+        - ``DSession.worker_unscheduled``.
+        """
+        idle_node = self.steal_requests.pop(node)
+        nodeids = [self.registered_collections[node][i] for i in indices]
+        self.log(node, "gave away", len(nodeids), "tests to", idle_node)
+
+        if idle_node not in self.assigned_work or idle_node.shutting_down:
+            # The idle node went away in the meantime, give the tests back
+            if nodeids:
+                node.send_runtest_some(indices)
+            return
+
+        for nodeid in nodeids:
+            del self.assigned_work[node][nodeid]
+
+        if not nodeids:
+            self.log(f"Shutting down {idle_node}, nothing left to steal")
+            idle_node.shutdown()
+            return
+
+        self.pending_collections[idle_node] = nodeids
+        idle_node.send_collect_and_run(self._collection_args(node, nodeids))
+
+    def _collection_args(self, node, nodeids):
+        """Return the command line arguments selecting ``nodeids``.
+
+        Whole files are passed when all of their tests on ``node`` are
+        selected, so the receiving worker collects them in one go.
+        """
+        nodeids = set(nodeids)
+        by_file = OrderedDict()
+        for nodeid in self.registered_collections[node]:
+            by_file.setdefault(self._split_file(nodeid), []).append(nodeid)
+
+        args = []
+        for path, file_nodeids in by_file.items():
+            selected = [nodeid for nodeid in file_nodeids if nodeid in nodeids]
+            if len(selected) == len(file_nodeids):
+                args.append(path)
+            else:
+                args.extend(selected)
+        return args
+
+    def _split_file(self, nodeid):
+        return nodeid.split("::", 1)[0]
+
+    def _unstarted_tail(self, node, fraction=0.5):
+        """Return the indices of the tests ``node`` could give away.
+
+        The two lowest pending indices are left alone: the worker is running
+        one and has already pulled the next one out of its queue.  From the
+        rest, the last ``fraction`` is taken, moved to the nearest file
+        boundary to keep module-scoped fixtures on a single worker.
+        """
+        # a node added during the run may not have collected yet
+        collection = self.registered_collections.get(node, [])
+        work = self.assigned_work[node]
+        pending = sorted(
+            i for i, nodeid in enumerate(collection) if work.get(nodeid) is False
+        )[self.MIN_PENDING :]
+        if not pending:
+            return []
+
+        files = [self._split_file(collection[i]) for i in pending]
+        cut = len(pending) - math.ceil(len(pending) * fraction)
+        start = end = cut
+        while start > 0 and files[start - 1] == files[cut]:
+            start -= 1
+        while end < len(files) and files[end] == files[cut]:
+            end += 1
+        boundaries = [i for i in (start, end) if 0 < i < len(files)]
+        if boundaries:
+            cut = min(boundaries, key=lambda i: abs(i - cut))
+        return pending[cut:]
+
+    def backlog(self):
+        """Return the number of tests a new node could take from the others."""
+        return sum(
+            len(self._unstarted_tail(node))
+            for node in self.nodes
+            if not node.shutting_down
+            and node not in self.steal_requests
+            and node not in self.pending_collections
+        )
+
+    def _rebalance(self, node):
+        """Try to move unstarted tests from a busy node to the idle ``node``.
+
+        Return True if a steal request was sent.
+        """
+        candidates = [
+            other
+            for other in self.assigned_work
+            if other is not node
+            and not other.shutting_down
+            and other not in self.steal_requests
+            and other not in self.pending_collections
+        ]
+        # The node needing the longest to run its unstarted tests gives away
+        # the share of the idle node, by weight.
+        weight = self.weights.weight
+        best = (0, [], None)
+        for other in candidates:
+            fraction = weight(node) / (weight(node) + weight(other))
+            tail = self._unstarted_tail(other, fraction)
+            if len(tail) / weight(other) > best[0]:
+                best = (len(tail) / weight(other), tail, other)
+        _, tail, donor = best
+        if not tail:
+            return False
+
+        self.log("Stealing", len(tail), "tests from", donor, "for", node)
+        self.steal_requests[donor] = node
+        donor.send_steal(tail)
+        return True
+
     def _assign_work_unit(self, node):
         """Assign a work unit to a node."""
         self.log("assign work unit")
@@ -277,32 +670,223 @@ class LoadScopeScheduling:
             )
             assigned_to_node[nodeid] = False
 
-        self.log(f"Assigned work to {node}")
-        self.log(f"Running {nodeids_indexes}")
+        self.log("Assigned work to", node)
+        self.log("Running", nodeids_indexes)
 
+        self._send_retry_budgets(node, nodeids_indexes)
         node.send_runtest_some(nodeids_indexes)
 
     def handle_failed_test(self, node, rep):
-        if rep.nodeid not in self.retries:
-            self.retries[rep.nodeid] = RetryInfo(
+        """Handle a failed report, return True if the failure should count.
+
+        The first failure of a test is held back and the test is retried on
+        the same node, one attempt at a time.  Only when all retries failed
+        is the original failure reported.
+
+        Called by the hook:
+
+        - ``DSession._handlefailures``.
+        """
+        retry_info = self.retries.get(rep.nodeid)
+        if retry_info is not None and retry_info.in_place:
+            return True
+        if retry_info is None:
+            if rep.nodeid not in self.registered_collections[node]:
+                # Collection errors can't be retried
+                return True
+            retry_info = self.retries[rep.nodeid] = RetryInfo(
                 retry_count=0,
                 original_test_report=rep,
+                when=rep.when,
+                max_retries=self.flake_history.retries_for(
+                    rep.nodeid, self.MAX_RETRIES
+                ),
             )
-        retry_info = self.retries[rep.nodeid]
+            retry_info.signatures.append(failure_signature(rep))
+            if self._retry_budget_exhausted():
+                self._give_up(retry_info)
+            if node.shutting_down or not retry_info.max_retries:
+                # A node which was told to shut down stops after this test
+                retry_info.max_retries = 0
+                retry_info.reported = True
+                return True
+            self.retry_queue.setdefault(node, []).append(rep.nodeid)
+            self.log(
+                f"Retrying failed test {rep.nodeid} up to {retry_info.max_retries} times"
+            )
+            return False
 
-        print (f"Handling a failed test, nodeid: {rep.nodeid}, retry count: {retry_info.retry_count}")
+        if retry_info.in_flight == 0 or retry_info.passed or retry_info.reported:
+            # Another phase of an attempt already accounted for, or a
+            # speculative attempt sent before a pass was observed.
+            return False
 
-        if retry_info.retry_count >= 5:
+        attempt = retry_info.retry_count - retry_info.in_flight + 1
+        if len(retry_info.signatures) == attempt:
+            retry_info.signatures.append(failure_signature(rep))
+            last = retry_info.signatures[-self.DETERMINISTIC_FAILURE_ATTEMPTS :]
+            if len(last) == self.DETERMINISTIC_FAILURE_ATTEMPTS and len(set(last)) == 1:
+                self.log(f"{rep.nodeid} fails deterministically, not retrying")
+                self._give_up(retry_info, deterministic=True)
+            elif self._retry_budget_exhausted():
+                self._give_up(retry_info)
+
+        if retry_info.exhausted and retry_info.in_flight == 1:
+            # This was the last attempt
+            retry_info.reported = True
             return True
+        return False
+
+    def handle_passed_test(self, node, rep):
+        """Handle a non-failed report, return True if it should be reported.
 
-        if retry_info.retry_count == 0:
-            retry = self.retry_queue.setdefault(node, default=[])
-            retry.append(rep.nodeid)
+        A passing call of a retried test stops its retries.  When the test
+        failed in its teardown, its call was reported already: only the
+        teardown of the retries is reported, and stops them when it passes.
 
-        retry_info.retry_count += 1
+        Called by the hook:
 
+        - ``DSession.worker_testreport``.
+        """
+        retry_info = self.retries.get(rep.nodeid)
+        if retry_info is None or retry_info.in_flight == 0:
+            return True
+        if retry_info.when == "teardown":
+            if rep.when != "teardown":
+                return False
+        elif rep.when != "call":
+            return True
+        if retry_info.passed or retry_info.reported:
+            return False
+        retry_info.passed_on_retry = retry_info.retry_count - retry_info.in_flight + 1
+        self.log(f"{rep.nodeid} passed on retry {retry_info.passed_on_retry}")
+        return True
+
+    def handle_retried_test(self, node, rep, item_index, retries, passed, duration):
+        """Record the retries a worker ran itself before reporting a test.
+
+        ``rep`` is the report of the first failure, the reports of the last
+        attempt follow.
+
+        Called by the hook:
+
+        - ``DSession.worker_retried``.
+        """
+        nodeid = self.registered_collections[node][item_index]
+        self.retries[nodeid] = RetryInfo(
+            retry_count=retries,
+            original_test_report=rep,
+            max_retries=retries,
+            passed_on_retry=retries if passed else 0,
+            reported=True,
+            in_place=True,
+        )
+        self.retries_sent += retries
+        self.retry_time += duration
+        self.log(f"{nodeid} was retried {retries} times in place")
+        if self._retry_budget_exhausted() and not self._in_place_retries_stopped:
+            # Only a worker knows how many retries it ran, stop them all
+            self._in_place_retries_stopped = True
+            for other in self.nodes:
+                collection = self.registered_collections.get(other, ())
+                self._send_retry_budgets(other, range(len(collection)))
+
+    def _send_retry_budgets(self, node, indices):
+        """Tell ``node`` how many times it may retry tests in place."""
+        if not self.retry_in_place:
+            return
+        if self._retry_budget_exhausted():
+            budgets = {i: 0 for i in indices}
+        else:
+            collection = self.registered_collections[node]
+            budgets = {}
+            for i in indices:
+                max_retries = self.flake_history.retries_for(
+                    collection[i], self.MAX_RETRIES
+                )
+                if max_retries:
+                    budgets[i] = max_retries
+        if budgets:
+            node.send_retry_budgets(budgets)
+
+    def _retry_budget_exhausted(self):
+        """Return True if the session-wide retry budget has been used up."""
+        if self.retry_budget is not None and self.retries_sent >= self.retry_budget:
+            return True
+        if (
+            self.retry_time_budget is not None
+            and self.retry_time >= self.retry_time_budget
+        ):
+            return True
         return False
 
+    def _give_up(self, retry_info, deterministic=False):
+        """Send no more retries than the ones already sent for a test."""
+        if deterministic:
+            retry_info.deterministic = True
+            self.deterministic_failures += 1
+        else:
+            self.skipped_retries += retry_info.max_retries - retry_info.retry_count
+        retry_info.max_retries = retry_info.retry_count
+
+    def retry_summary(self):
+        """Return lines summarizing the retries which were not run."""
+        lines = []
+        if self.skipped_retries:
+            lines.append(
+                f"retry budget exhausted, {self.skipped_retries} retries skipped"
+            )
+        if self.deterministic_failures:
+            lines.append(
+                f"{self.deterministic_failures} tests failed the same way "
+                f"{self.DETERMINISTIC_FAILURE_ATTEMPTS} times in a row, "
+                "not retried further"
+            )
+        return lines
+
+    def _retry_outcome(self, retry_info):
+        if retry_info.passed:
+            return f"passed on retry {retry_info.passed_on_retry}"
+        return f"failed {retry_info.retry_count} retries"
+
+    def _in_flight_retries(self, node):
+        return sum(
+            self.retries[nodeid].in_flight for nodeid in self.retry_queue.get(node, [])
+        )
+
+    def _outstanding(self, node):
+        """Return the number of tests sent to ``node`` and not completed."""
+        pending = self._pending_of(self.assigned_work[node])
+        return pending + self._in_flight_retries(node)
+
+    def _send_retries(self, node):
+        """Send the next retry attempts of the failed tests of ``node``.
+
+        Attempts are sent one at a time.  The worker only starts a test once
+        it has received the next one (or a shutdown), so when a retry is all
+        the node has left a second, speculative attempt is queued with it,
+        unless the retry budget is exhausted.  A retry whose previous attempt
+        failed before the budget ran out is still sent.
+        """
+        retry_queue = self.retry_queue.get(node, [])
+        for nodeid in list(retry_queue):
+            retry_info = self.retries[nodeid]
+            nodeid_index = self.registered_collections[node].index(nodeid)
+            while not retry_info.exhausted and (
+                retry_info.in_flight == 0
+                or (
+                    self._outstanding(node) < self.MIN_PENDING
+                    and not self._retry_budget_exhausted()
+                )
+            ):
+                retry_info.retry_count += 1
+                retry_info.in_flight += 1
+                self.retries_sent += 1
+                node.send_runtest_some([nodeid_index])
+                self.log("Sending retry", retry_info.retry_count, "for", nodeid)
+            if retry_info.exhausted and not retry_info.in_flight:
+                retry_queue.remove(nodeid)
+
     def _pending_of(self, workload):
         """Return the number of pending tests in a workload."""
         pending = len([1 for scope in workload.values() if not scope])
@@ -314,22 +898,24 @@ class LoadScopeScheduling:
         If there are any globally pending work units left then this will check
         if the given node should be given any more tests.
         """
-        while self.retry_queue.get(node, []):
-            nodeid = self.retry_queue[node].pop()
-            if nodeid not in self.registered_collections[node]:
-                continue
+        self._send_retries(node)
 
-            nodeid_index = self.registered_collections[node].index(nodeid)
-            node.send_runtest_some([
-                nodeid_index,
-                nodeid_index,
-                nodeid_index,
-                nodeid_index,
-                nodeid_index
-            ])
-            print (f'Enqueing 5 retries for {nodeid}')
-
-        if self._pending_of(self.assigned_work[node]) <= 1:
+        if self._hand_over(node):
+            return
+
+        if node in self.pending_collections or node in self.steal_requests.values():
+            # Waiting for tests stolen from another node
+            return
+
+        if self._outstanding(node) <= 1:
+            if node.shutting_down or node in self.replacements.values():
+                # A replacement waits for the tests of the node it replaces
+                return
+            if self.orphaned and node not in self.retiring:
+                self._adopt_orphans(node)
+                return
+            if node not in self.retiring and self._rebalance(node):
+                return
             self.log("Shutting down node due to no more work")
             node.shutdown()
 
@@ -345,11 +931,33 @@ class LoadScopeScheduling:
         - ``DSession.worker_collectionfinish``.
         """
         assert self.collection_is_completed
-
-        # Collections are identical, create the final list of items
-        self.collection = list(next(iter(self.registered_collections.values())))
+        scheduled = self.collection is not None
+
+        # Every node collects its own bin, the run is all of their items
+        self.collection = [
+            nodeid
+            for collection in self.registered_collections.values()
+            for nodeid in collection
+        ]
+
+        if scheduled:
+            # A node was added during the run, only it needs work
+            for node in self.nodes:
+                if (
+                    node in self.registered_collections
+                    and not self.assigned_work[node]
+                    and not node.shutting_down
+                ):
+                    if self.registered_collections[node]:
+                        self._assign_work_unit(node)
+                    else:
+                        self._reschedule(node)
+            return
 
         if not self.collection:
+            # Nothing to run, e.g. everything was deselected
+            for node in self.nodes:
+                node.shutdown()
             return
 
         # Avoid having more workers than work
@@ -361,3 +969,9 @@ class LoadScopeScheduling:
         # Assign initial workload
         for node in self.nodes:
             self._assign_work_unit(node)
+
+        # A worker only runs its last test once it is told to shut down, or
+        # gets more tests
+        for node in self.nodes:
+            if not node.shutting_down and self._outstanding(node) < self.MIN_PENDING:
+                self._reschedule(node)
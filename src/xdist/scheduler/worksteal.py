@@ -5,6 +5,7 @@ from _pytest.runner import CollectReport
 from xdist.remote import Producer
 from xdist.workermanage import parse_spec_config
 from xdist.report import report_collection_diff
+from xdist.weights import NodeWeights
 
 
 NodePending = namedtuple("NodePending", ["node", "pending"])
@@ -16,7 +17,8 @@ MIN_PENDING = 2
 class WorkStealingScheduling:
     """Implement work-stealing scheduling.
 
-    Initially, tests are distributed evenly among all nodes.
+    Initially, tests are distributed among all nodes in proportion to
+    their weight.
 
     When some node completes most of its assigned tests (when only one pending
     test remains), an attempt is made to reassign ("steal") some tests from
@@ -51,6 +53,8 @@ class WorkStealingScheduling:
 
     :config: Config object, used for handling hooks.
 
+    :weights: The ``NodeWeights`` of the nodes.
+
     :steal_requested_from_node: The node to which the current "steal" request
        was sent. ``None`` if there is no request in progress. Only one request
        can be in progress at any time, the scheduler doesn't send multiple
@@ -69,6 +73,7 @@ class WorkStealingScheduling:
             self.log = log.workstealsched
         self.config = config
         self.steal_requested_from_node = None
+        self.weights = NodeWeights.from_config(config)
 
     @property
     def nodes(self):
@@ -153,6 +158,7 @@ class WorkStealingScheduling:
         This is called by the ``DSession.worker_testreport`` hook.
         """
         self.node2pending[node].remove(item_index)
+        self.weights.record(node, self.collection[item_index], duration)
         self.check_schedule()
 
     def mark_test_pending(self, item):
@@ -193,10 +199,9 @@ class WorkStealingScheduling:
             return
 
         if self.pending:
-            # Distribute pending tests evenly among idle nodes
+            # Distribute pending tests among idle nodes by weight
             for i, node in enumerate(idle_nodes):
-                nodes_remaining = len(idle_nodes) - i
-                num_send = len(self.pending) // nodes_remaining
+                num_send = self.weights.share(node, idle_nodes[i:], len(self.pending))
                 self._send_tests(node, num_send)
 
             idle_nodes = get_idle_nodes()
@@ -208,19 +213,27 @@ class WorkStealingScheduling:
         if self.steal_requested_from_node is not None:
             return
 
-        # Find the node that has the longest test queue
+        # Find the node that needs the longest to finish its test queue
+        weight = self.weights.weight
         steal_from = max(
-            nodes_up, key=lambda node_pending: len(node_pending.pending), default=None
+            nodes_up,
+            key=lambda node_pending: len(node_pending.pending)
+            / weight(node_pending.node),
+            default=None,
         )
 
         if steal_from is None:
             num_steal = 0
         else:
-            # Steal half of the test queue - but keep that node running too.
-            # If the node has 2 or less tests queued, stealing will fail
-            # anyway.
+            # Split the test queue by weight between that node and an average
+            # idle node (half of it for equal weights) - but keep that node
+            # running too.  If the node has 2 or less tests queued, stealing
+            # will fail anyway.
+            idle_weight = sum(map(weight, idle_nodes)) / len(idle_nodes)
+            share = len(steal_from.pending) * idle_weight
+            share //= idle_weight + weight(steal_from.node)
             max_steal = max(0, len(steal_from.pending) - MIN_PENDING)
-            num_steal = min(len(steal_from.pending) // 2, max_steal)
+            num_steal = min(int(share), max_steal)
 
         if num_steal == 0:
             # Can't get more work - shutdown idle nodes. This will force them
@@ -0,0 +1,391 @@
+"""
+Offline scheduler simulator.
+
+Replays per-test durations against the scheduler classes with fake worker
+nodes and a virtual clock, so scheduling changes can be evaluated in seconds
+without running the test suite.  The fake nodes follow the real worker
+protocol: tests are queued by index, a worker needs to know its next test
+(or to have been told to shut down) before running the current one, and
+'steal' only returns tests which have not been taken off the queue yet.
+
+Run ``python -m xdist.sim --help`` for the command line interface.
+"""
+import argparse
+import heapq
+import itertools
+import json
+import os
+import sys
+from dataclasses import dataclass, field
+from typing import Dict
+
+from _pytest.config import _prepareconfig
+
+from xdist.history import TimingHistory, in_bin_entry, nodeid_file
+from xdist.remote import Producer
+from xdist.scheduler import (
+    LoadFileScheduling,
+    LoadGroupScheduling,
+    LoadScheduling,
+    LoadScopeScheduling,
+    WorkStealingScheduling,
+)
+
+
+SCHEDULERS = {
+    "load": LoadScheduling,
+    "loadscope": LoadScopeScheduling,
+    "loadfile": LoadFileScheduling,
+    "loadgroup": LoadGroupScheduling,
+    "worksteal": WorkStealingScheduling,
+}
+
+
+@dataclass
+class SimResult:
+    """Outcome of a simulated run.
+
+    ``idle`` maps each worker id to the time it spent not running tests
+    before the end of the run, ``messages`` counts the commands sent to the
+    workers and the events they sent back.
+    """
+
+    scheduler: str
+    makespan: float
+    idle: Dict[str, float] = field(default_factory=dict)
+    messages: int = 0
+
+
+class SimGateway:
+    def __init__(self, id):
+        self.id = id
+        self.spec = id
+
+
+class SimNode:
+    """Fake ``WorkerController`` running tests on the simulator's clock."""
+
+    def __init__(self, sim, id, collection):
+        self.sim = sim
+        self.gateway = SimGateway(id)
+        self.collection = list(collection)
+        self.queue = []
+        self.held = None
+        self.running = None
+        self.last_file = None
+        self.busy = 0.0
+        self.finished_at = None
+        self._shutdown_received = False
+        self._shutdown_sent = False
+
+    def __repr__(self):
+        return f"<SimNode {self.gateway.id}>"
+
+    @property
+    def shutting_down(self):
+        return self._shutdown_sent
+
+    def send_runtest_some(self, indices):
+        self.sim.command(self._queue, list(indices))
+
+    def send_runtest_all(self):
+        self.sim.command(self._queue, list(range(len(self.collection))))
+
+    def send_steal(self, indices):
+        self.sim.command(self._steal, list(indices))
+
+    def send_collect_and_run(self, paths):
+        self.sim.command(self._collect_and_run, list(paths))
+
+    def send_retry_budgets(self, budgets):
+        self.sim.command(lambda budgets: None, budgets)
+
+    def shutdown(self):
+        if not self._shutdown_sent:
+            self._shutdown_sent = True
+            self.sim.command(self._shutdown)
+
+    def _queue(self, indices):
+        for i in indices:
+            heapq.heappush(self.queue, i)
+        self._advance()
+
+    def _steal(self, indices):
+        wanted = set(indices)
+        stolen = [i for i in self.queue if i in wanted]
+        self.queue = [i for i in self.queue if i not in wanted]
+        heapq.heapify(self.queue)
+        self.sim.event(self.sim.sched.remove_pending_tests_from_node, self, stolen)
+
+    def _collect_and_run(self, paths):
+        ids = [
+            nodeid
+            for nodeid in self.sim.collection
+            if any(in_bin_entry(nodeid, path) for path in paths)
+        ]
+        start = len(self.collection)
+        self.collection.extend(ids)
+        self.sim.event(self.sim.sched.extend_node_collection, self, ids)
+        self._queue(range(start, len(self.collection)))
+
+    def _shutdown(self):
+        self._shutdown_received = True
+        self._advance()
+
+    def _advance(self):
+        """Start the next test if the worker would."""
+        if self.running is not None or self.finished_at is not None:
+            return
+        if self.held is None and self.queue:
+            self.held = heapq.heappop(self.queue)
+        if self.held is None:
+            if self._shutdown_received:
+                self.finished_at = self.sim.now
+                self.sim.event(self.sim.node_finished, self)
+            return
+        if not self.queue and not self._shutdown_received:
+            # The worker waits for its next test before running this one
+            return
+
+        index = self.held
+        self.held = heapq.heappop(self.queue) if self.queue else None
+        nodeid = self.collection[index]
+        duration = self.sim.durations.get(nodeid, self.sim.default_duration)
+        if nodeid_file(nodeid) != self.last_file:
+            self.last_file = nodeid_file(nodeid)
+            duration += self.sim.setup_costs.get(self.last_file, 0.0)
+        self.running = index
+        self.busy += duration
+        self.sim.schedule(duration, self._complete, index, duration)
+
+    def _complete(self, index, duration):
+        self.running = None
+        self.sim.event(self.sim.sched.mark_test_complete, self, index, duration)
+        self._advance()
+
+
+class Simulator:
+    """Run one scheduler against simulated workers.
+
+    :durations: Maps the node ids to their duration, in collection order.
+    :setup_costs: Maps test files to the cost of setting up their module
+       fixtures, paid whenever a worker moves to a test of another file.
+    :bins: For each worker, the node ids it collects, for the schedulers
+       based on ``LoadScopeScheduling`` which run all the tests their workers
+       collect.  By default the files are spread over the workers by
+       duration, longest first.  Every worker collects all the tests with
+       the other schedulers.
+    :latency: Time taken by a message between the controller and a worker.
+    """
+
+    MAX_EVENTS = 10_000_000
+
+    def __init__(
+        self,
+        durations,
+        numworkers,
+        dist="load",
+        setup_costs=None,
+        bins=None,
+        latency=0.001,
+        default_duration=0.0,
+        args=(),
+    ):
+        self.durations = dict(durations)
+        self.collection = list(self.durations)
+        self.numworkers = numworkers
+        self.dist = dist
+        self.setup_costs = setup_costs or {}
+        if not issubclass(SCHEDULERS[dist], LoadScopeScheduling):
+            bins = None
+        elif bins is None:
+            bins = self.default_bins()
+        self.bins = bins
+        self.latency = latency
+        self.default_duration = default_duration
+        self.args = list(args)
+        self.now = 0.0
+        self.messages = 0
+        self._events = []
+        self._counter = itertools.count()
+
+    def default_bins(self):
+        files = {}
+        for nodeid, duration in self.durations.items():
+            files.setdefault(nodeid_file(nodeid), []).append(nodeid)
+        loads = [(0.0, i) for i in range(self.numworkers)]
+        bins = [[] for _ in range(self.numworkers)]
+        for nodeids in sorted(
+            files.values(),
+            key=lambda nodeids: sum(self.durations[nodeid] for nodeid in nodeids),
+            reverse=True,
+        ):
+            load, i = heapq.heappop(loads)
+            bins[i].extend(nodeids)
+            duration = sum(self.durations[nodeid] for nodeid in nodeids)
+            heapq.heappush(loads, (load + duration, i))
+        return bins
+
+    def schedule(self, delay, func, *args):
+        heapq.heappush(
+            self._events, (self.now + delay, next(self._counter), func, args)
+        )
+
+    def command(self, func, *args):
+        """Send a command from the controller to a worker."""
+        self.messages += 1
+        self.schedule(self.latency, func, *args)
+
+    def event(self, func, *args):
+        """Send an event from a worker to the controller."""
+        self.messages += 1
+        self.schedule(self.latency, self._controller, func, *args)
+
+    def _controller(self, func, *args):
+        func(*args)
+        if self.sched.tests_finished:
+            for node in self.sched.nodes:
+                node.shutdown()
+
+    def node_finished(self, node):
+        if node in self.sched.nodes:
+            self.sched.remove_node(node)
+
+    def make_scheduler(self):
+        config = _prepareconfig(
+            [
+                f"--tx={self.numworkers}*popen",
+                f"--dist={self.dist}",
+                "-p",
+                "no:cacheprovider",
+                *self.args,
+            ]
+        )
+        sched = SCHEDULERS[self.dist](config, Producer("sim", enabled=False))
+        if hasattr(sched, "_run_reported"):
+            # A simulated run has no flaky tests to report
+            sched._run_reported = True
+        return sched
+
+    def run(self):
+        self.sched = self.make_scheduler()
+        nodes = []
+        for i in range(self.numworkers):
+            collection = self.collection if self.bins is None else self.bins[i]
+            node = SimNode(self, f"gw{i}", collection)
+            self.sched.add_node(node)
+            nodes.append(node)
+        for node in nodes:
+            self.event(self._collected, node)
+
+        for _ in range(self.MAX_EVENTS):
+            if not self._events:
+                break
+            self.now, _, func, args = heapq.heappop(self._events)
+            func(*args)
+        else:
+            raise RuntimeError(f"simulation did not end after {self.MAX_EVENTS} events")
+
+        if not self.sched.tests_finished:
+            raise RuntimeError(f"{self.dist} did not run all the tests")
+        makespan = max(node.finished_at for node in nodes)
+        return SimResult(
+            scheduler=self.dist,
+            makespan=makespan,
+            idle={node.gateway.id: makespan - node.busy for node in nodes},
+            messages=self.messages,
+        )
+
+    def _collected(self, node):
+        self.sched.add_node_collection(node, list(node.collection))
+        if self.sched.collection_is_completed:
+            self.sched.schedule()
+
+
+def load_bins(path, collection):
+    """Return the node ids of each bin of a bins.json file."""
+    with open(path) as f:
+        bins = json.load(f)
+    return [
+        [
+            nodeid
+            for nodeid in collection
+            if any(in_bin_entry(nodeid, entry) for entry in entries)
+        ]
+        for entries in bins
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m xdist.sim",
+        description="Simulate a distributed run with recorded test durations.",
+    )
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument(
+        "--durations",
+        metavar="JSON",
+        help="JSON object mapping node ids to durations, in collection order",
+    )
+    source.add_argument(
+        "--db",
+        default=os.path.join(".pytest_cache", "d", "xdist", TimingHistory.FILENAME),
+        help="timing history to take EWMA durations from (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--setup-costs",
+        metavar="JSON",
+        help="JSON object mapping test files to their module setup cost",
+    )
+    parser.add_argument("-n", "--workers", type=int, default=4)
+    parser.add_argument(
+        "--dist",
+        action="append",
+        choices=sorted(SCHEDULERS),
+        help="scheduler to simulate, can be repeated (default: all)",
+    )
+    parser.add_argument(
+        "--bins", metavar="JSON", help="bins.json giving the tests of each worker"
+    )
+    parser.add_argument("--latency", type=float, default=0.001, metavar="SECONDS")
+    args, extra = parser.parse_known_args(argv)
+
+    if args.durations:
+        with open(args.durations) as f:
+            durations = json.load(f)
+    else:
+        if not os.path.exists(args.db):
+            parser.error(f"no history found at {args.db}")
+        history = TimingHistory(args.db)
+        durations = history.ewma(phase=None)
+        history.connection.close()
+    setup_costs = None
+    if args.setup_costs:
+        with open(args.setup_costs) as f:
+            setup_costs = json.load(f)
+    bins = None
+    if args.bins:
+        bins = load_bins(args.bins, list(durations))
+        if len(bins) != args.workers:
+            parser.error(f"{args.bins} has {len(bins)} bins for {args.workers} workers")
+
+    print(f"{'scheduler':<12} {'makespan':>10} {'max idle':>10} {'messages':>9}")
+    for dist in args.dist or sorted(SCHEDULERS):
+        result = Simulator(
+            durations,
+            args.workers,
+            dist=dist,
+            setup_costs=setup_costs,
+            bins=bins,
+            latency=args.latency,
+            args=extra,
+        ).run()
+        print(
+            f"{result.scheduler:<12} {result.makespan:>9.2f}s "
+            f"{max(result.idle.values()):>9.2f}s {result.messages:>9d}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
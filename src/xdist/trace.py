@@ -0,0 +1,223 @@
+"""
+Timeline export of a distributed run.
+
+With ``--xdist-trace=trace.json`` the controller records what each worker
+was doing over time and writes it as a Chrome trace-event file, which can be
+opened with ``chrome://tracing`` or https://ui.perfetto.dev.  Every worker
+gets a lane showing its gateway creation, rsync, startup, collection, the
+setup/call/teardown of each test, retries and the idle gaps in between, and
+the controller gets a lane showing the time it spends handling each event,
+including the scheduler's decisions.
+"""
+import json
+import time
+from collections import defaultdict
+
+import pytest
+
+
+class TraceRecorder:
+    """Collect trace events during the session, write them at its end.
+
+    Timestamps are taken with ``time.time()``, on the controller for the
+    node setup and the controller lane, and on the workers for the test
+    phases, so the clocks of remote workers are assumed to be in sync.
+    """
+
+    CONTROLLER = "controller"
+
+    # Gaps between the tests of a worker shorter than this are not shown
+    IDLE_THRESHOLD = 0.001
+
+    TEST_PHASES = ("setup", "call", "teardown", "retry")
+
+    def __init__(self, path):
+        self.path = path
+        self.start = time.time()
+        self.events = []
+        self._lanes = {self.CONTROLLER: 0}
+        self._mark = self.start
+        self._rsync_start = None
+        self._started = {}
+        self._collecting = {}
+        self._busy = defaultdict(list)
+
+    def _lane(self, name):
+        if name not in self._lanes:
+            self._lanes[name] = len(self._lanes)
+        return self._lanes[name]
+
+    def _timestamp(self, when):
+        return round((when - self.start) * 1e6)
+
+    def _span_event(self, lane, name, start, duration, cat, args):
+        return {
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": self._timestamp(start),
+            "dur": round(duration * 1e6),
+            "pid": 1,
+            "tid": self._lane(lane),
+            "args": args,
+        }
+
+    def span(self, lane, name, start, duration, cat, **args):
+        """Record ``name`` running on ``lane`` for ``duration`` seconds."""
+        self.events.append(self._span_event(lane, name, start, duration, cat, args))
+        if cat in self.TEST_PHASES:
+            self._busy[lane].append((start, start + duration))
+
+    def instant(self, lane, name, cat, when=None, **args):
+        """Record a point in time on ``lane``."""
+        self.events.append(
+            {
+                "name": name,
+                "cat": cat,
+                "ph": "i",
+                "s": "t",
+                "ts": self._timestamp(time.time() if when is None else when),
+                "pid": 1,
+                "tid": self._lane(lane),
+                "args": args,
+            }
+        )
+
+    def controller_event(self, callname, start, node=None):
+        """Record the controller handling event ``callname`` from ``node``."""
+        args = {} if node is None else {"worker": node.gateway.id}
+        self.span(
+            self.CONTROLLER,
+            callname,
+            start,
+            time.time() - start,
+            "controller",
+            **args,
+        )
+
+    def test_report(self, node, rep, cat=None):
+        """Record the phase of a test reported by ``node``."""
+        # TestReport.start is only available with pytest 7+
+        start = getattr(rep, "start", None) or time.time() - rep.duration
+        self.span(
+            node.gateway.id,
+            rep.nodeid,
+            start,
+            rep.duration,
+            cat or rep.when,
+            when=rep.when,
+            outcome=rep.outcome,
+        )
+
+    def retried(self, node, rep, retries, passed):
+        """Record a test retried in place, ``rep`` is its first failure."""
+        self.test_report(node, rep, cat="retry")
+        self.instant(
+            node.gateway.id, "retried", "retry", retries=retries, passed=passed
+        )
+
+    def idle_spans(self):
+        """Return the idle gaps between the tests of each worker."""
+        spans = []
+        for lane, busy in self._busy.items():
+            busy.sort()
+            end = busy[0][1]
+            for start, stop in busy[1:]:
+                if start - end > self.IDLE_THRESHOLD:
+                    spans.append((lane, end, start - end))
+                end = max(end, stop)
+        return spans
+
+    def trace(self):
+        """Return the trace as a JSON-serializable object."""
+        events = self.events + [
+            self._span_event(lane, "idle", start, duration, "idle", {})
+            for lane, start, duration in self.idle_spans()
+        ]
+        for name, tid in self._lanes.items():
+            events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": 1,
+                    "tid": tid,
+                    "args": {"name": name},
+                }
+            )
+            events.append(
+                {
+                    "name": "thread_sort_index",
+                    "ph": "M",
+                    "pid": 1,
+                    "tid": tid,
+                    "args": {"sort_index": tid},
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self):
+        with open(self.path, "w") as f:
+            json.dump(self.trace(), f)
+
+    @pytest.hookimpl
+    def pytest_xdist_setupnodes(self, config, specs):
+        self._mark = time.time()
+
+    @pytest.hookimpl
+    def pytest_xdist_newgateway(self, gateway):
+        now = time.time()
+        self.span(gateway.id, "gateway", self._mark, now - self._mark, "setup_nodes")
+        self._mark = now
+
+    @pytest.hookimpl
+    def pytest_xdist_rsyncstart(self, source, gateways):
+        self._rsync_start = time.time()
+
+    @pytest.hookimpl
+    def pytest_xdist_rsyncfinish(self, source, gateways):
+        now = time.time()
+        for gateway in gateways:
+            self.span(
+                gateway.id,
+                "rsync",
+                self._rsync_start,
+                now - self._rsync_start,
+                "setup_nodes",
+                source=str(source),
+            )
+        self._mark = now
+
+    @pytest.hookimpl
+    def pytest_configure_node(self, node):
+        now = time.time()
+        self._started[node.gateway.id] = now
+        self._mark = now
+
+    @pytest.hookimpl
+    def pytest_testnodeready(self, node):
+        now = time.time()
+        start = self._started.pop(node.gateway.id, now)
+        self.span(node.gateway.id, "startup", start, now - start, "setup_nodes")
+        self._collecting[node.gateway.id] = now
+
+    @pytest.hookimpl
+    def pytest_xdist_node_collection_finished(self, node, ids):
+        now = time.time()
+        start = self._collecting.pop(node.gateway.id, now)
+        self.span(
+            node.gateway.id,
+            "collection",
+            start,
+            now - start,
+            "collection",
+            tests=len(ids),
+        )
+
+    @pytest.hookimpl
+    def pytest_testnodedown(self, node, error):
+        error = None if error is None else str(error)
+        self.instant(node.gateway.id, "down", "setup_nodes", error=error)
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_sessionfinish(self, session):
+        self.write()
@@ -0,0 +1,91 @@
+"""
+Detection of hung tests.
+
+While a test runs its worker sends a heartbeat every second from a side
+thread, with the index of the test and the time it has been running.  The
+first one is sent by the main thread as the test starts, so a test running
+past its timeout is detected even if it holds the GIL and no other
+heartbeat comes.
+
+The timeout of a test is ``--test-timeout`` or the seconds given to its
+``xdist_timeout`` marker.  Once it is over, the controller asks the worker
+for the stacks of its threads, dumped with faulthandler, and kills it after
+at most ``STACKS_GRACE`` seconds.  The test is reported as failed with the
+stacks, the worker is replaced and the tests left in its queue are
+rescheduled, see ``DSession.worker_errordown``.
+"""
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class Hang:
+    """A test which ran past its timeout on a worker being killed."""
+
+    nodeid: str
+    timeout: float
+    # None once killed
+    kill_at: Optional[float]
+    stacks: Optional[str] = None
+
+    def report(self, worker_id):
+        """Return the longrepr of the failure of the test."""
+        msg = (
+            f"worker {worker_id!r} timed out after {self.timeout:g}s "
+            f"while running {self.nodeid!r}"
+        )
+        if self.stacks is None:
+            return msg + "\n\nno stack dump received from the worker"
+        return f"{msg}\n\n{self.stacks}"
+
+
+class Watchdog:
+    """Kill the workers of ``dsession`` running a test past its timeout.
+
+    ``tick()`` is called by the controller loop.  ``hangs`` maps the nodes
+    being killed to their ``Hang``.
+    """
+
+    STACKS_GRACE = 3.0
+
+    def __init__(self, dsession):
+        self.dsession = dsession
+        self.hangs = {}
+
+    def tick(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        for node in list(self.dsession._active_nodes):
+            hang = self.hangs.get(node)
+            if hang is not None:
+                if hang.kill_at is not None and now >= hang.kill_at:
+                    self._kill(node)
+                continue
+            heartbeat = node.heartbeat
+            if heartbeat is None or heartbeat.timeout is None:
+                continue
+            if now - heartbeat.started > heartbeat.timeout:
+                self.hangs[node] = Hang(
+                    heartbeat.nodeid, heartbeat.timeout, now + self.STACKS_GRACE
+                )
+                self.dsession.report_line(
+                    f"\nworker {node.gateway.id} timed out after "
+                    f"{heartbeat.timeout:g}s running {heartbeat.nodeid}"
+                )
+                try:
+                    node.send_dump_stacks()
+                except OSError:
+                    self._kill(node)
+
+    def stacks_received(self, node, stacks):
+        hang = self.hangs.get(node)
+        if hang is not None and hang.stacks is None:
+            hang.stacks = stacks
+            self._kill(node)
+
+    def _kill(self, node):
+        hang = self.hangs[node]
+        if hang.kill_at is not None:
+            hang.kill_at = None
+            node.kill()
@@ -0,0 +1,121 @@
+"""
+Relative capacity of the workers.
+
+A spec can declare how much work its workers do compared to a reference
+worker with a ``weight`` key, e.g. ``--tx 4*popen//weight=2 --tx
+ssh=slowhost//weight=0.5``.  The workers of specs with ``weight=auto`` are
+measured during the run instead: their weight is the expected duration of
+the tests they completed, according to the timing history, divided by the
+time they took.  Until enough tests were measured they weigh 1, as do the
+workers of specs without a weight.
+
+The schedulers give each worker a share of the tests proportional to its
+weight, and the longest bins are handed to the heaviest specs.
+"""
+import math
+
+from xdist.history import TimingHistory
+
+
+# weight of the specs whose workers are measured
+AUTO = "auto"
+
+
+def spec_weight(spec):
+    """Return the weight declared by ``spec``, None if it declares none.
+
+    ``weight=auto`` declares none either, see ``spec_measured``.  Raises
+    ValueError if the weight is not a positive number.
+    """
+    value = getattr(spec, "weight", None)
+    if value is None or value == AUTO:
+        return None
+    try:
+        weight = float(value)
+    except ValueError:
+        weight = math.nan
+    if not 0 < weight < math.inf:
+        raise ValueError(f"weight must be a positive number, got {value!r}")
+    return weight
+
+
+def spec_measured(spec):
+    """Return True if the weight of the workers of ``spec`` is measured."""
+    return getattr(spec, "weight", None) == AUTO
+
+
+class NodeWeights:
+    """Weight of the nodes of a scheduler.
+
+    ``expected`` maps nodeids to their expected duration, or is returned by
+    ``load`` when a node is first measured.  A node of a ``weight=auto``
+    spec is measured once it completed ``MIN_SAMPLES`` tests with an
+    expected duration, the other nodes without a declared weight weigh 1.
+    """
+
+    MIN_SAMPLES = 5
+
+    def __init__(self, expected=None, load=None):
+        self._expected = expected
+        self._load = load
+        # node -> [expected duration, actual duration, number of tests]
+        self.measured = {}
+
+    @classmethod
+    def from_config(cls, config):
+        """Return the weights of a run, reading the history only if needed."""
+
+        def load():
+            history = TimingHistory.from_config(config)
+            try:
+                return history.ewma(phase=None)
+            finally:
+                history.connection.close()
+
+        return cls(load=load)
+
+    @property
+    def expected(self):
+        if self._expected is None:
+            self._expected = self._load() if self._load is not None else {}
+        return self._expected
+
+    def declared(self, node):
+        """Return the weight declared by the spec of ``node``, if any."""
+        gateway = getattr(node, "gateway", None)
+        return spec_weight(getattr(gateway, "spec", None))
+
+    def measures(self, node):
+        """Return True if the weight of ``node`` is measured."""
+        gateway = getattr(node, "gateway", None)
+        return spec_measured(getattr(gateway, "spec", None))
+
+    def record(self, node, nodeid, duration):
+        """Record that ``node`` ran ``nodeid`` in ``duration`` seconds."""
+        if not duration or duration <= 0 or not self.measures(node):
+            return
+        expected = self.expected.get(nodeid)
+        if not expected:
+            return
+        totals = self.measured.setdefault(node, [0.0, 0.0, 0])
+        totals[0] += expected
+        totals[1] += duration
+        totals[2] += 1
+
+    def weight(self, node):
+        declared = self.declared(node)
+        if declared is not None:
+            return declared
+        if not self.measures(node):
+            return 1.0
+        expected, actual, samples = self.measured.get(node, (0.0, 0.0, 0))
+        if samples < self.MIN_SAMPLES:
+            return 1.0
+        return expected / actual
+
+    def share(self, node, nodes, num):
+        """Return the part of ``num`` tests ``node`` should get among ``nodes``."""
+        total = sum(self.weight(other) for other in nodes)
+        if not total:
+            return num // max(len(nodes), 1)
+        return int(num * self.weight(node) // total)
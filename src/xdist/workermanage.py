@@ -7,6 +7,7 @@ import os
 import re
 import sys
 import uuid
+from collections import namedtuple
 from pathlib import Path
 from typing import List, Union, Sequence, Optional, Any, Tuple, Set
 
@@ -14,8 +15,12 @@ import pytest
 import execnet
 
 import xdist.remote
-from xdist.remote import Producer
+from xdist.affected import affected_bins
+from xdist.history import nodeid_file, predict_bins, TimingHistory
+from xdist.priority import worker_priority
+from xdist.remote import Producer, log_enabled
 from xdist.plugin import _sys_path
+from xdist.weights import spec_weight
 
 
 def parse_spec_config(config):
@@ -45,7 +50,12 @@ class NodeManager:
         self.testrunuid = self.config.getoption("testrunuid")
         if self.testrunuid is None:
             self.testrunuid = uuid.uuid4().hex
-        self.group = execnet.Group()
+        # the gateways kept between the runs of --looponfail, if any
+        self.warm_gateways = config.pluginmanager.getplugin("warmgateways")
+        if self.warm_gateways is not None:
+            self.group = self.warm_gateways.group
+        else:
+            self.group = execnet.Group()
         if specs is None:
             specs = self._getxspecs()
         self.specs = []
@@ -54,12 +64,16 @@ class NodeManager:
                 spec = execnet.XSpec(spec)
             if not spec.chdir and not spec.popen:
                 spec.chdir = defaultchdir
-            self.group.allocate_id(spec)
+            if self.warm_gateways is not None:
+                self.warm_gateways.allocate_id(spec)
+            else:
+                self.group.allocate_id(spec)
             self.specs.append(spec)
+        self.nodes: List["WorkerController"] = []
         self.roots = self._getrsyncdirs()
         self.rsyncoptions = self._getrsyncoptions()
         self._rsynced_specs: Set[Tuple[Any, Any]] = set()
-        self.log = Producer(f"node-manager", enabled=config.option.debug)
+        self.log = Producer("node-manager", enabled=log_enabled(config))
         # paths = [
         #     ["tests/test_accounting/test_workflows"],
         #     ["tests/test_workflows"],
@@ -79,7 +93,8 @@ class NodeManager:
         for test in complete_tests:
             found = False
             for bucket in paths:
-                if test in bucket:
+                # entries may also select some tests of a file, once split
+                if any(nodeid_file(entry) == test for entry in bucket):
                     found = True
 
             if not found:
@@ -103,12 +118,63 @@ class NodeManager:
 
         for i in range(len(paths)):
             bucket = paths[i]
-            paths[i] = [test for test in bucket if test in complete_tests or '__init__.py' in test]
+            paths[i] = [
+                test
+                for test in bucket
+                if nodeid_file(test) in complete_tests or "__init__.py" in test
+            ]
 
         # paths[0] += new_tests
 
+        self.affected_reason = None
+        if config.getoption("affected", False):
+            paths, self.affected_reason = affected_bins(config, paths)
+            self.log.info("affected", self.affected_reason)
+            # bins left empty by the selection get no worker
+            if len(paths) < len(self.specs):
+                del self.specs[len(paths) :]
+                if paths and config.getvalue("tx"):
+                    config.option.tx = parse_spec_config(config)[: len(paths)]
+
+        self.priority = None
+        if config.getoption("prioritize", False):
+            self.priority = worker_priority(config, paths)
+
+        self._pair_specs_with_bins(paths)
         self.paths = [",".join(path) for path in paths]
 
+    def _pair_specs_with_bins(self, paths):
+        """Reorder the specs so the heaviest run the longest bins.
+
+        Bins are compared by their expected duration, or by their number of
+        entries without timing history.  Nothing changes if all specs have
+        the same weight.
+        """
+        try:
+            weights = [spec_weight(spec) for spec in self.specs]
+        except ValueError as e:
+            raise pytest.UsageError(f"--tx: {e}")
+        weights = [1.0 if weight is None else weight for weight in weights]
+        if len(set(weights)) < 2:
+            return
+        history = TimingHistory.from_config(self.config)
+        try:
+            loads, _ = predict_bins(paths, history.ewma(phase=None))
+        finally:
+            history.connection.close()
+        num = min(len(paths), len(self.specs))
+        longest_bins = sorted(
+            range(num),
+            key=lambda i: (loads[i][1], len(paths[i])),
+            reverse=True,
+        )
+        heaviest_specs = sorted(range(num), key=lambda i: weights[i], reverse=True)
+        specs = list(self.specs)
+        for bin_index, spec_index in zip(longest_bins, heaviest_specs):
+            specs[bin_index] = self.specs[spec_index]
+        self.specs = specs
+        self.log.info("specs by bin", [spec.id for spec in specs])
+
     def rsync_roots(self, gateway):
         """Rsync the set of roots to the node's gateway cwd."""
         if self.roots:
@@ -124,21 +190,38 @@ class NodeManager:
             for i, spec in enumerate(self.specs)
         ]
         end_time = time.time()
-        self.log("setup_nodes", end_time - start_time)
+        self.log.info("setup_nodes", end_time - start_time)
         return to_return
 
     def setup_node(self, spec, putevent, path):
-        gw = self.group.makegateway(spec)
-        self.config.hook.pytest_xdist_newgateway(gateway=gw)
+        start = time.time()
+        gw = None
+        if self.warm_gateways is not None:
+            gw = self.warm_gateways.take(spec)
+        if gw is None:
+            gw = self.group.makegateway(spec)
+            self.config.hook.pytest_xdist_newgateway(gateway=gw)
+        rsync_start = time.time()
         self.rsync_roots(gw)
         node = WorkerController(self, gw, self.config, putevent, path)
+        node.record_startup_timings(
+            {"makegateway": rsync_start - start, "rsync": time.time() - rsync_start}
+        )
         gw.node = node  # keep the node alive
+        self.nodes.append(node)
         node.setup()
         self.trace("started node %r" % node)
         return node
 
-    def teardown_nodes(self):
-        self.group.terminate(self.EXIT_TIMEOUT)
+    def teardown_nodes(self, retired=()):
+        """Exit the gateways, or keep them for the next --looponfail run.
+
+        The ``retired`` nodes are never kept.
+        """
+        if self.warm_gateways is not None:
+            self.warm_gateways.release(self.nodes, retired)
+        else:
+            self.group.terminate(self.EXIT_TIMEOUT)
 
     def _getxspecs(self):
         return [execnet.XSpec(x) for x in parse_spec_config(self.config)]
@@ -284,9 +367,26 @@ def make_reltoroot(roots: Sequence[Path], args: List[str]) -> List[str]:
     return result
 
 
+# Last heartbeat of a worker: its running test and when it started, on the
+# controller's monotonic clock.
+Heartbeat = namedtuple("Heartbeat", ["item_index", "nodeid", "started", "timeout"])
+
+
 class WorkerController:
     ENDMARK = -1
 
+    # Phases of ``startup_timings``, in the order they happen
+    STARTUP_PHASES = (
+        "makegateway",
+        "rsync",
+        "bootstrap",
+        "prepareconfig",
+        "conftests",
+        "collection",
+        "wait",
+        "first_test",
+    )
+
     class RemoteHook:
         @pytest.hookimpl(trylast=True)
         def pytest_xdist_getremotemodule(self):
@@ -300,18 +400,28 @@ class WorkerController:
         self.config = config
         self.path = path
         argv = [i for i in sys.argv]
-        del argv[1]
-        for path in self.path.split(","):
+        # sys.argv has no test paths in a looponfail subprocess
+        if len(argv) > 1:
+            del argv[1]
+        for path in self.path.split(",") if self.path is not None else ():
             argv.insert(1, path)
         self.workerinput = {
             "workerid": gateway.id,
             "workercount": len(nodemanager.specs),
             "testrunuid": nodemanager.testrunuid,
             "mainargv": argv,
+            "affected_record": bool(config.getoption("affectedrecord", False)),
+            "priority": nodemanager.priority,
+            # without a bin, the worker only runs the tests it takes from others
+            "empty_collection": self.path is None,
         }
         self._down = False
         self._shutdown_sent = False
-        self.log = Producer(f"workerctl-{gateway.id}", enabled=config.option.debug)
+        # set by the receiver thread, None while no test runs
+        self.heartbeat = None
+        self.startup_timings = {}
+        self._startup_mark = None
+        self.log = Producer(f"workerctl-{gateway.id}", enabled=log_enabled(config))
 
     def __repr__(self):
         return f"<{self.__class__.__name__} {self.gateway.id}>"
@@ -322,6 +432,7 @@ class WorkerController:
 
     def setup(self):
         self.log("setting up worker session")
+        self._startup_mark = time.time()
         spec = self.gateway.spec
         if hasattr(self.config, "invocation_params"):
             args = [str(x) for x in self.config.invocation_params.args or ()]
@@ -344,7 +455,7 @@ class WorkerController:
         # restore sys.path from a frozen copy for local workers
         change_sys_path = _sys_path if self.gateway.spec.popen else None
         del args[0]
-        for path in self.path.split(","):
+        for path in self.path.split(",") if self.path is not None else ():
             args.insert(0, path)
 
         self.channel.send((self.workerinput, args, option_dict, change_sys_path))
@@ -352,6 +463,24 @@ class WorkerController:
         if self.putevent:
             self.channel.setcallback(self.process_from_remote, endmarker=self.ENDMARK)
 
+    def mark_startup_phase(self, phase, worker_timings=None):
+        """Record the time since the previous startup phase as ``phase``.
+
+        ``worker_timings`` are phases timed by the worker itself within
+        that time, which are recorded as such and taken out of ``phase``.
+        """
+        now = time.time()
+        elapsed = now - self._startup_mark
+        for name, duration in (worker_timings or {}).items():
+            self.startup_timings[name] = duration
+            elapsed -= duration
+        self.startup_timings[phase] = max(elapsed, 0.0)
+        self._startup_mark = now
+
+    def record_startup_timings(self, timings):
+        """Record startup phases timed by the node manager itself."""
+        self.startup_timings.update(timings)
+
     def ensure_teardown(self):
         if hasattr(self, "channel"):
             if not self.channel.isclosed():
@@ -372,6 +501,27 @@ class WorkerController:
     def send_steal(self, indices):
         self.sendcommand("steal", indices=indices)
 
+    def send_collect_and_run(self, paths):
+        self.sendcommand("collect_and_run", paths=paths)
+
+    def send_retry_budgets(self, budgets):
+        self.sendcommand("retry_budgets", budgets=budgets)
+
+    def send_dump_stacks(self):
+        self.sendcommand("dump_stacks")
+
+    def kill(self):
+        """Kill the worker process, e.g. when it hangs.
+
+        The channel closes and 'errordown' is emitted.
+        """
+        # execnet has no public API to kill a gateway, Group.terminate does the same
+        try:
+            self.gateway._io.kill()
+        except AttributeError:
+            # socket gateways have no process to kill
+            self.gateway.exit()
+
     def shutdown(self):
         if not self._down:
             try:
@@ -380,6 +530,18 @@ class WorkerController:
                 pass
             self._shutdown_sent = True
 
+    def cancel(self):
+        """Shut the worker down once its current test is finished.
+
+        Unlike ``shutdown``, the tests queued on the worker are dropped.
+        """
+        if not self._down:
+            try:
+                self.sendcommand("cancel")
+            except OSError:
+                pass
+            self._shutdown_sent = True
+
     def sendcommand(self, name, **kwargs):
         """send a named parametrized command to the other side."""
         self.channel.send((name, kwargs))
@@ -425,9 +587,23 @@ class WorkerController:
                 if item_index is not None:
                     rep.item_index = item_index
                 self.notify_inproc(eventname, node=self, rep=rep)
+            elif eventname == "retried":
+                rep = self.config.hook.pytest_report_from_serializable(
+                    config=self.config, data=kwargs.pop("data")
+                )
+                self.notify_inproc(eventname, node=self, rep=rep, **kwargs)
             elif eventname == "collectionfinish":
                 self.notify_inproc(eventname, node=self, ids=kwargs["ids"])
+            elif eventname == "collectionextended":
+                self.notify_inproc(eventname, node=self, **kwargs)
             elif eventname == "runtest_protocol_complete":
+                self.heartbeat = None
+                self.notify_inproc(eventname, node=self, **kwargs)
+            elif eventname == "heartbeat":
+                # not queued, only the last one matters, see xdist.watchdog
+                started = time.monotonic() - kwargs.pop("elapsed")
+                self.heartbeat = Heartbeat(started=started, **kwargs)
+            elif eventname == "stacks":
                 self.notify_inproc(eventname, node=self, **kwargs)
             elif eventname == "unscheduled":
                 self.notify_inproc(eventname, node=self, **kwargs)
@@ -1154,6 +1154,61 @@ def test_internal_error_with_maxfail(pytester: pytest.Pytester) -> None:
     assert "INTERNALERROR" not in result.stderr.str()
 
 
+def test_maxfail_cancels_queued_tests(pytester: pytest.Pytester, run_bins) -> None:
+    pytester.makepyfile(
+        **{
+            "tests/test_maxfail": """
+                import time
+
+                def test_fail():
+                    assert 0
+
+                def run(name):
+                    with open("ran.txt", "a") as f:
+                        f.write(name + "\\n")
+                    time.sleep(1)
+
+                def test_1(): run("test_1")
+                def test_2(): run("test_2")
+                def test_3(): run("test_3")
+                def test_4(): run("test_4")
+            """
+        }
+    )
+    result = run_bins(
+        [["tests/test_maxfail.py"]], "-n1", "--dist=loadscope", "--maxfail=1"
+    )
+    result.stdout.fnmatch_lines(["*stopping after 1 failures*"])
+    # the tests run while the failure was retried, not the ones queued after
+    ran = pytester.path.joinpath("ran.txt")
+    assert not ran.exists() or len(ran.read_text().splitlines()) < 4
+
+
+def test_retry_teardown_failure(pytester: pytest.Pytester, run_bins) -> None:
+    pytester.makepyfile(
+        **{
+            "tests/test_teardown": """
+                import os
+                import pytest
+
+                @pytest.fixture
+                def resource():
+                    yield
+                    marker = os.path.join(os.path.dirname(__file__), "torn_down")
+                    if not os.path.exists(marker):
+                        open(marker, "w").close()
+                        raise RuntimeError("teardown failed once")
+
+                def test_ok(resource):
+                    pass
+            """
+        }
+    )
+    result = run_bins([["tests/test_teardown.py"]], "-n1", "--dist=loadscope")
+    # the call of the retry is not reported again
+    result.assert_outcomes(passed=1)
+
+
 def test_internal_errors_propagate_to_controller(pytester: pytest.Pytester) -> None:
     pytester.makeconftest(
         """
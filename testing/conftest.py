@@ -1,7 +1,9 @@
 import execnet
+import json
 import pytest
 import shutil
-from typing import List
+import sys
+from typing import Callable, List
 
 pytest_plugins = "pytester"
 
@@ -33,6 +35,27 @@ def pytest_addoption(parser) -> None:
     )
 
 
+@pytest.fixture
+def run_bins(
+    pytester: pytest.Pytester, monkeypatch: pytest.MonkeyPatch
+) -> Callable[..., pytest.RunResult]:
+    """Return a function running pytest on ``tests`` in a subprocess.
+
+    It takes the bins, written to the ``bins.json`` read by the node
+    manager, and the other command line arguments.  The workers replace
+    the first argument, the tests directory, with their bin.
+    """
+    monkeypatch.setenv("TEST_DIR", str(pytester.path))
+
+    def run(bins: List[List[str]], *args: str) -> pytest.RunResult:
+        pytester.makefile(".json", bins=json.dumps(bins))
+        return pytester.run(
+            sys.executable, "-m", "pytest", "tests", "-p", "no:randomly", *args
+        )
+
+    return run
+
+
 @pytest.fixture
 def specssh(request) -> str:
     return getspecssh(request.config)
@@ -0,0 +1,153 @@
+import shutil
+
+import pytest
+
+from xdist.affected import changed_files
+from xdist.affected import DependencyMap
+from xdist.affected import is_global_change
+from xdist.affected import select_bins
+
+needs_git = pytest.mark.skipif(shutil.which("git") is None, reason="needs git")
+
+
+def git(pytester: pytest.Pytester, *args: str) -> None:
+    result = pytester.run("git", "-c", "user.name=t", "-c", "user.email=t@t", *args)
+    assert result.ret == 0, result.stderr.str()
+
+
+class TestSelectBins:
+    tests = ["a.py::t1", "a.py::t2", "b.py::t1", "c.py::t1"]
+
+    def test_whole_and_split_entries(self) -> None:
+        bins = [["a.py", "b.py"], ["c.py"]]
+        affected = {"a.py::t2", "b.py::t1"}
+        assert select_bins(bins, self.tests, affected, {}) == [["a.py::t2"], ["b.py"]]
+
+    def test_new_entries_are_kept(self) -> None:
+        bins = [["a.py"], ["new.py"]]
+        assert select_bins(bins, self.tests, set(), {}) == [["new.py"]]
+        assert select_bins([["a.py"], ["c.py"]], self.tests, set(), {}) == []
+
+    def test_new_files_below_split_entries(self) -> None:
+        tests = ["pkg/test_a.py::t", "pkg/test_b.py::t", "c.py::t1"]
+        changed = ["pkg/test_a.py", "pkg/test_new.py", "other/test_new.py"]
+        assert select_bins(
+            [["pkg"], ["c.py"]], tests, {"pkg/test_a.py::t"}, {}, changed
+        ) == [["pkg/test_a.py::t"], ["pkg/test_new.py"]]
+        # with no affected test, the new files are still run
+        assert select_bins([["pkg"]], tests, set(), {}, changed) == [
+            ["pkg/test_new.py"]
+        ]
+
+    def test_packed_by_expected_duration(self) -> None:
+        bins = [["a.py"], ["b.py"], ["c.py"]]
+        affected = set(self.tests)
+        expected = {"a.py::t1": 5.0, "a.py::t2": 5.0, "b.py::t1": 4.0, "c.py::t1": 4.0}
+        assert select_bins(bins, self.tests, affected, expected) == [
+            ["a.py"],
+            ["b.py"],
+            ["c.py"],
+        ]
+        bins = [["a.py", "c.py"], ["b.py"]]
+        assert select_bins(bins, self.tests, affected, expected) == [
+            ["a.py"],
+            ["c.py", "b.py"],
+        ]
+
+
+def test_dependency_map_roundtrip(tmp_path) -> None:
+    path = str(tmp_path / DependencyMap.FILENAME)
+    dependencies = DependencyMap(path)
+    assert dependencies.revision is None
+    dependencies.update(
+        {
+            "files": ["pkg/a.py", "pkg/b.py", "tests/test_a.py"],
+            "tests": {"tests/test_a.py::t": [0, 2], "tests/test_a.py::u": [1]},
+        }
+    )
+    dependencies.save("abc")
+
+    loaded = DependencyMap(path)
+    assert loaded.revision == "abc"
+    assert loaded.tests == {
+        "tests/test_a.py::t": {"pkg/a.py", "tests/test_a.py"},
+        "tests/test_a.py::u": {"pkg/b.py"},
+    }
+    assert loaded.affected({"pkg/a.py"}) == {"tests/test_a.py::t"}
+    assert list(tmp_path.iterdir()) == [tmp_path / DependencyMap.FILENAME]
+
+
+def test_is_global_change() -> None:
+    assert is_global_change({"pkg/a.py", "tests/conftest.py"})
+    assert is_global_change({"tox.ini"}, inifile="tox.ini")
+    assert not is_global_change({"pkg/a.py", "setup.cfg"}, inifile="tox.ini")
+
+
+@needs_git
+def test_changed_files(pytester: pytest.Pytester) -> None:
+    pytester.makepyfile(a="", b="")
+    # written by pytester.run
+    pytester.path.joinpath(".gitignore").write_text("stdout\nstderr\n")
+    git(pytester, "init", "-q")
+    git(pytester, "add", ".")
+    git(pytester, "commit", "-q", "-m", "init")
+    revision = pytester.run("git", "rev-parse", "HEAD").outlines[0]
+    pytester.makepyfile(a="x = 1", c="")
+    assert changed_files(pytester.path, revision) == {"a.py", "c.py"}
+    assert changed_files(pytester.path, "0" * 40) is None
+
+
+@needs_git
+def test_affected_option(pytester: pytest.Pytester, run_bins) -> None:
+    pytester.makepyfile(
+        **{
+            "pkg/__init__": "",
+            "pkg/alpha": "VALUE = 1",
+            "pkg/beta": "VALUE = 2",
+            "tests/test_both": """
+                from pkg import alpha, beta
+
+                def test_both():
+                    assert alpha.VALUE + beta.VALUE == 3
+            """,
+            "tests/test_alpha": """
+                from pkg.alpha import VALUE
+
+                def test_alpha():
+                    assert VALUE == 1
+            """,
+            "tests/test_beta": """
+                from pkg.beta import VALUE
+
+                def test_beta():
+                    assert VALUE == 2
+            """,
+        }
+    )
+    ignored = ".pytest_cache\nstdout\nstderr\nbins.json\n"
+    pytester.path.joinpath(".gitignore").write_text(ignored)
+    git(pytester, "init", "-q")
+    git(pytester, "add", ".")
+    git(pytester, "commit", "-q", "-m", "init")
+    bins = [["tests/test_both.py", "tests/test_alpha.py"], ["tests/test_beta.py"]]
+    args = ["-n2", "--dist=loadscope", "-v"]
+
+    result = run_bins(bins, *args, "--affected")
+    result.stdout.fnmatch_lines(["affected tests: no dependency map recorded*"])
+    result.assert_outcomes(passed=3)
+    result = run_bins(bins, *args, "--affected-record")
+    result.assert_outcomes(passed=3)
+
+    # test_alpha imports pkg.alpha after test_both
+    pytester.path.joinpath("pkg", "alpha.py").write_text("VALUE = 1  # changed\n")
+    result = run_bins(bins, *args, "--affected")
+    result.stdout.fnmatch_lines(["affected tests: 2 recorded tests affected by *"])
+    result.assert_outcomes(passed=2)
+    result.stdout.fnmatch_lines_random(
+        ["*PASSED tests/test_both.py::test_both*", "*PASSED tests/test_alpha.py::*"]
+    )
+
+    pytester.path.joinpath("tests", "conftest.py").write_text("")
+    result = run_bins(bins, *args, "--affected")
+    result.stdout.fnmatch_lines(["affected tests: a conftest.py or the ini file*"])
+    result.assert_outcomes(passed=3)
@@ -1,30 +1,47 @@
 from __future__ import annotations
+import json
 from xdist.dsession import (
     DSession,
     get_default_max_worker_restart,
     get_workers_status_line,
     WorkerStatus,
+    WorkerUtilization,
 )
+from xdist.flakes import FlakeHistory
 from xdist.report import report_collection_diff
-from xdist.scheduler import EachScheduling, LoadScheduling, WorkStealingScheduling
-from typing import Sequence
+from xdist.scheduler import (
+    EachScheduling,
+    LoadScheduling,
+    LoadScopeScheduling,
+    WorkStealingScheduling,
+)
+from typing import Optional, Sequence, TYPE_CHECKING
 
 import pytest
 import execnet
+from _pytest.reports import TestReport
+
+if TYPE_CHECKING:
+    from typing import Literal
 
 
 class MockGateway:
     def __init__(self) -> None:
+        self.spec: Optional[execnet.XSpec] = None
         self._count = 0
         self.id = str(self._count)
         self._count += 1
 
 
 class MockNode:
-    def __init__(self) -> None:
+    def __init__(self, weight=None) -> None:
         self.sent = []  # type: ignore[var-annotated]
         self.stolen = []  # type: ignore[var-annotated]
+        self.collect_requests = []  # type: ignore[var-annotated]
+        self.retry_budgets = {}  # type: ignore[var-annotated]
         self.gateway = MockGateway()
+        if weight is not None:
+            self.gateway.spec = execnet.XSpec(f"popen//weight={weight}")
         self._shutdown = False
 
     def send_runtest_some(self, indices) -> None:
@@ -36,6 +53,12 @@ class MockNode:
     def send_steal(self, indices) -> None:
         self.stolen.extend(indices)
 
+    def send_collect_and_run(self, paths) -> None:
+        self.collect_requests.append(paths)
+
+    def send_retry_budgets(self, budgets) -> None:
+        self.retry_budgets.update(budgets)
+
     def shutdown(self) -> None:
         self._shutdown = True
 
@@ -139,6 +162,19 @@ class TestLoadScheduling:
         assert node1.sent == [0, 1, 4, 5]
         assert not sched.pending
 
+    def test_schedule_weighted(self, pytester: pytest.Pytester) -> None:
+        config = pytester.parseconfig("--tx=2*popen")
+        sched = LoadScheduling(config)
+        sched.add_node(MockNode(weight=3))
+        sched.add_node(MockNode())
+        node1, node2 = sched.nodes
+        col = ["xyz"] * 32
+        sched.add_node_collection(node1, col)
+        sched.add_node_collection(node2, col)
+        sched.schedule()
+        assert node1.sent == list(range(6))
+        assert node2.sent == [6, 7]
+
     def test_schedule_maxchunk_none(self, pytester: pytest.Pytester) -> None:
         config = pytester.parseconfig("--tx=2*popen")
         sched = LoadScheduling(config)
@@ -329,6 +365,25 @@ class TestWorkStealingScheduling:
         assert node1.stolen == [14, 15]
         assert sched.tests_finished
 
+    def test_stealing_weighted(self, pytester: pytest.Pytester) -> None:
+        config = pytester.parseconfig("--tx=2*popen")
+        sched = WorkStealingScheduling(config)
+        sched.add_node(MockNode(weight=3))
+        sched.add_node(MockNode())
+        node1, node2 = sched.nodes
+        collection = [f"test_workstealing.py::test_{i}" for i in range(16)]
+        sched.add_node_collection(node1, collection)
+        sched.add_node_collection(node2, collection)
+        sched.schedule()
+        assert node1.sent == list(range(0, 12))
+        assert node2.sent == list(range(12, 16))
+        for i in range(3):
+            sched.mark_test_complete(node2, node2.sent[i])
+        # the light node gets a quarter of the heavy node's queue
+        assert node1.stolen == [9, 10, 11]
+        sched.remove_pending_tests_from_node(node1, node1.stolen)
+        assert node2.sent == [12, 13, 14, 15, 9, 10, 11]
+
     def test_steal_on_add_node(self, pytester: pytest.Pytester) -> None:
         node = MockNode()
         config = pytester.parseconfig("--tx=popen")
@@ -438,6 +493,416 @@ class TestWorkStealingScheduling:
         assert "Different tests were collected between" in rep.longrepr
 
 
+class TestLoadScopeScheduling:
+    def make_sched(self, pytester: pytest.Pytester, *collections):
+        config = pytester.parseconfig(f"--tx={len(collections)}*popen")
+        sched = LoadScopeScheduling(config)
+        for _ in collections:
+            sched.add_node(MockNode())
+        for node, collection in zip(sched.nodes, collections):
+            sched.add_node_collection(node, collection)
+        sched.schedule()
+        return sched
+
+    def test_schedule_own_collection(self, pytester: pytest.Pytester) -> None:
+        sched = self.make_sched(pytester, ["a.py::t1", "a.py::t2"], ["b.py::t1"])
+        node1, node2 = sched.nodes
+        assert node1.sent == [0, 1]
+        assert node2.sent == [0]
+        # nothing to take from node1, shut down so the single test runs
+        assert node2.shutting_down
+        sched.mark_test_complete(node1, 0)
+        sched.mark_test_complete(node1, 1)
+        assert not sched.tests_finished
+        sched.mark_test_complete(node2, 0)
+        assert sched.tests_finished
+
+    def test_schedule_empty_collections(self, pytester: pytest.Pytester) -> None:
+        # the first bin was deselected entirely
+        sched = self.make_sched(pytester, [], ["b.py::t1"])
+        node1, node2 = sched.nodes
+        assert node1.shutting_down
+        assert node2.sent == [0]
+
+        sched = self.make_sched(pytester, [], [])
+        assert all(node.shutting_down for node in sched.nodes)
+
+    def test_rebalance_idle_node(self, pytester: pytest.Pytester) -> None:
+        col2 = [f"b.py::t{i}" for i in range(3)] + [f"c.py::t{i}" for i in range(3)]
+        sched = self.make_sched(pytester, ["a.py::t1", "a.py::t2"], col2)
+        node1, node2 = sched.nodes
+
+        sched.mark_test_complete(node1, 0)
+        # the whole of c.py is taken from the busy node
+        assert node2.stolen == [3, 4, 5]
+        assert not node1.shutting_down
+        assert sched.steal_requests == {node2: node1}
+
+        sched.remove_pending_tests_from_node(node2, [3, 4, 5])
+        assert node1.collect_requests == [["c.py"]]
+        assert list(sched.assigned_work[node2]) == col2[:3]
+        assert not sched.tests_finished
+
+        assert sched.extend_node_collection(node1, col2[3:]) == []
+        assert sched.registered_collections[node1][2:] == col2[3:]
+        assert sched._pending_of(sched.assigned_work[node1]) == 4
+        assert not sched.pending_collections
+
+    def test_rebalance_not_collected(self, pytester: pytest.Pytester) -> None:
+        col2 = [f"b.py::t{i}" for i in range(6)]
+        sched = self.make_sched(pytester, ["a.py::t1", "a.py::t2"], col2)
+        node1, node2 = sched.nodes
+
+        sched.mark_test_complete(node1, 0)
+        sched.remove_pending_tests_from_node(node2, [4, 5])
+        # b.py::t5 was removed in the meantime
+        assert sched.extend_node_collection(node1, ["b.py::t4"]) == ["b.py::t5"]
+        assert "b.py::t5" not in sched.assigned_work[node1]
+        assert "b.py::t5" not in sched.assigned_work[node2]
+
+    def test_rebalance_partial_file(self, pytester: pytest.Pytester) -> None:
+        col2 = [f"b.py::t{i}" for i in range(6)]
+        sched = self.make_sched(pytester, ["a.py::t1", "a.py::t2"], col2)
+        node1, node2 = sched.nodes
+
+        sched.mark_test_complete(node1, 0)
+        assert node2.stolen == [4, 5]
+        # the worker already ran one of them
+        sched.remove_pending_tests_from_node(node2, [5])
+        assert node1.collect_requests == [["b.py::t5"]]
+
+    def test_rebalance_weighted(self, pytester: pytest.Pytester) -> None:
+        col2 = [f"b.py::t{i}" for i in range(12)]
+        sched = self.make_sched(pytester, ["a.py::t1", "a.py::t2"], col2)
+        node1, node2 = sched.nodes
+        node1.gateway.spec = execnet.XSpec("popen//weight=3")
+
+        sched.mark_test_complete(node1, 0)
+        # three quarters of the unstarted tests go to the heavier node
+        assert node2.stolen == list(range(4, 12))
+
+    def test_retire_node(self, pytester: pytest.Pytester) -> None:
+        col1 = [f"a.py::t{i}" for i in range(6)]
+        sched = self.make_sched(pytester, col1, ["b.py::t1", "b.py::t2"])
+        node1, node2 = sched.nodes
+        replacement = MockNode()
+        sched.add_replacement(node1, replacement)
+        sched.add_node(replacement)
+        sched.add_node_collection(replacement, [])
+        sched.schedule()
+        # reserved for node1, nothing is taken from node2 for it
+        assert not replacement.shutting_down
+        assert not node2.stolen
+
+        sched.mark_test_complete(node1, 0)
+        sched.retire_node(node1)
+        assert node1.stolen == [3, 4, 5]
+        assert node1.shutting_down
+        sched.remove_pending_tests_from_node(node1, [3, 4, 5])
+        assert replacement.collect_requests == [col1[3:]]
+
+    def test_retire_node_before_replacement_joined(
+        self, pytester: pytest.Pytester
+    ) -> None:
+        col1 = [f"a.py::t{i}" for i in range(6)]
+        sched = self.make_sched(pytester, col1)
+        (node1,) = sched.nodes
+        replacement = MockNode()
+        sched.add_replacement(node1, replacement)
+        sched.retire_node(node1)
+        assert not node1.stolen
+        assert not node1.shutting_down
+
+        sched.add_node(replacement)
+        sched.add_node_collection(replacement, [])
+        sched.schedule()
+        assert node1.stolen == [2, 3, 4, 5]
+        assert sched.steal_requests == {node1: replacement}
+
+    def test_replacement_released(self, pytester: pytest.Pytester) -> None:
+        sched = self.make_sched(pytester, ["a.py::t1", "a.py::t2"])
+        (node1,) = sched.nodes
+        replacement = MockNode()
+        sched.add_replacement(node1, replacement)
+        sched.add_node(replacement)
+        sched.add_node_collection(replacement, [])
+        sched.schedule()
+        assert not replacement.shutting_down
+        sched.mark_test_complete(node1, 0)
+        sched.mark_test_complete(node1, 1)
+        sched.remove_node(node1)
+        # not shutting_down: mypy keeps it narrowed by the assert above
+        assert replacement._shutdown
+        assert not sched.replacements
+
+    def test_nothing_to_steal(self, pytester: pytest.Pytester) -> None:
+        sched = self.make_sched(
+            pytester, ["a.py::t1", "a.py::t2"], ["b.py::t1", "b.py::t2"]
+        )
+        node1, node2 = sched.nodes
+        sched.mark_test_complete(node1, 0)
+        assert not node2.stolen
+        assert node1.shutting_down
+
+    def test_steal_came_back_empty(self, pytester: pytest.Pytester) -> None:
+        col2 = [f"b.py::t{i}" for i in range(4)]
+        sched = self.make_sched(pytester, ["a.py::t1", "a.py::t2"], col2)
+        node1, node2 = sched.nodes
+        sched.mark_test_complete(node1, 0)
+        assert node2.stolen == [3]
+        sched.remove_pending_tests_from_node(node2, [])
+        assert node1.shutting_down
+        assert not node1.collect_requests
+        assert list(sched.assigned_work[node2]) == col2
+
+    def test_add_node_during_run(self, pytester: pytest.Pytester) -> None:
+        col1 = [f"a.py::t{i}" for i in range(3)] + [f"b.py::t{i}" for i in range(3)]
+        sched = self.make_sched(pytester, col1)
+        (node1,) = sched.nodes
+        assert sched.backlog() == 3
+
+        node2 = MockNode()
+        sched.add_node(node2)
+        # not collected yet, nothing to take from it
+        assert sched.backlog() == 3
+        sched.add_node_collection(node2, [])
+        sched.schedule()
+        assert node1.sent == [0, 1, 2, 3, 4, 5]
+        assert node2.sent == []
+        assert node1.stolen == [3, 4, 5]
+        assert sched.steal_requests == {node1: node2}
+        assert sched.backlog() == 0
+
+    def test_reschedule_crashed_node(self, pytester: pytest.Pytester) -> None:
+        col1 = [f"a.py::t{i}" for i in range(4)]
+        sched = self.make_sched(pytester, col1, ["b.py::t1", "b.py::t2"])
+        node1, node2 = sched.nodes
+        sched.mark_test_complete(node1, 0)
+        assert sched.remove_node(node1) == "a.py::t1"
+        assert sched.orphaned == col1[2:]
+        assert not sched.tests_finished
+
+        # the next node running out of tests collects the unfinished ones
+        sched.mark_test_complete(node2, 0)
+        assert node2.collect_requests == [col1[2:]]
+        assert not sched.orphaned
+        sched.extend_node_collection(node2, col1[2:])
+        sched.mark_test_complete(node2, 1)
+        sched.mark_test_complete(node2, 2)
+        sched.mark_test_complete(node2, 3)
+        assert sched.tests_finished
+
+
+def make_report(
+    nodeid: str,
+    outcome: Literal["passed", "failed", "skipped"],
+    when: Literal["setup", "call", "teardown"] = "call",
+    error: str = "boom",
+) -> TestReport:
+    longrepr = error if outcome == "failed" else None
+    return TestReport(nodeid, (nodeid, 0, nodeid), {}, outcome, longrepr, when)
+
+
+class TestLoadScopeRetries:
+    def make_sched(self, pytester: pytest.Pytester, num_tests: int, *args: str):
+        config = pytester.parseconfig("--tx=popen", *args)
+        sched = LoadScopeScheduling(config)
+        sched.add_node(MockNode())
+        (node,) = sched.nodes
+        sched.add_node_collection(node, [f"a.py::t{i}" for i in range(num_tests)])
+        sched.schedule()
+        return sched, node
+
+    def test_retry_until_pass(self, pytester: pytest.Pytester) -> None:
+        sched, node = self.make_sched(pytester, 4)
+        assert not sched.handle_failed_test(node, make_report("a.py::t0", "failed"))
+        sched.mark_test_complete(node, 0)
+        assert node.sent == [0, 1, 2, 3, 0]
+
+        assert not sched.handle_failed_test(node, make_report("a.py::t0", "failed"))
+        sched.mark_test_complete(node, 0)
+        assert node.sent == [0, 1, 2, 3, 0, 0]
+
+        assert sched.handle_passed_test(node, make_report("a.py::t0", "passed"))
+        sched.mark_test_complete(node, 0)
+        # no more retries once a pass has been observed
+        assert node.sent == [0, 1, 2, 3, 0, 0]
+        retry_info = sched.retries["a.py::t0"]
+        assert retry_info.passed_on_retry == 2
+        assert sched._retry_outcome(retry_info) == "passed on retry 2"
+
+        for i in range(1, 4):
+            assert not sched.tests_finished
+            sched.mark_test_complete(node, i)
+        assert node.shutting_down
+        assert sched.tests_finished
+
+    def test_retry_teardown_failure(self, pytester: pytest.Pytester) -> None:
+        sched, node = self.make_sched(pytester, 2)
+        assert sched.handle_passed_test(node, make_report("a.py::t0", "passed"))
+        rep = make_report("a.py::t0", "failed", "teardown")
+        assert not sched.handle_failed_test(node, rep)
+        sched.mark_test_complete(node, 0)
+        assert node.sent == [0, 1, 0]
+
+        # the call passed and was reported before the teardown failed
+        setup = make_report("a.py::t0", "passed", "setup")
+        assert not sched.handle_passed_test(node, setup)
+        assert not sched.handle_passed_test(node, make_report("a.py::t0", "passed"))
+        assert sched.handle_passed_test(
+            node, make_report("a.py::t0", "passed", "teardown")
+        )
+        retry_info = sched.retries["a.py::t0"]
+        assert retry_info.when == "teardown"
+        assert retry_info.passed_on_retry == 1
+
+    def test_speculative_retry_when_idle(self, pytester: pytest.Pytester) -> None:
+        sched, node = self.make_sched(pytester, 2)
+        sched.handle_failed_test(node, make_report("a.py::t0", "failed"))
+        sched.mark_test_complete(node, 0)
+        assert node.sent == [0, 1, 0]
+        sched.mark_test_complete(node, 1)
+        # the retry is all the node has left, queue a second attempt with it
+        assert node.sent == [0, 1, 0, 0]
+        assert not node.shutting_down
+
+        assert sched.handle_passed_test(node, make_report("a.py::t0", "passed"))
+        sched.mark_test_complete(node, 0)
+        assert node.shutting_down
+        assert not sched.tests_finished
+
+        # the speculative attempt is not reported again
+        assert not sched.handle_passed_test(node, make_report("a.py::t0", "passed"))
+        assert not sched.handle_failed_test(node, make_report("a.py::t0", "failed"))
+        sched.mark_test_complete(node, 0)
+        assert node.sent == [0, 1, 0, 0]
+        assert sched.tests_finished
+
+    def test_retries_exhausted(self, pytester: pytest.Pytester) -> None:
+        sched, node = self.make_sched(pytester, 10)
+        reps = [
+            make_report("a.py::t0", "failed", error=f"boom {i}")
+            for i in range(1 + sched.MAX_RETRIES)
+        ]
+        for rep in reps[:-1]:
+            assert not sched.handle_failed_test(node, rep)
+            sched.mark_test_complete(node, 0)
+        # the last attempt failed too, the failure is reported just once
+        assert sched.handle_failed_test(node, reps[-1])
+        assert not sched.handle_failed_test(
+            node, make_report("a.py::t0", "failed", "teardown")
+        )
+        sched.mark_test_complete(node, 0)
+        assert node.sent.count(0) == 1 + sched.MAX_RETRIES
+        assert sched._retry_outcome(sched.retries["a.py::t0"]) == "failed 5 retries"
+        assert sched.retry_summary() == []
+
+    def test_deterministic_failure(self, pytester: pytest.Pytester) -> None:
+        sched, node = self.make_sched(pytester, 10)
+        rep = make_report("a.py::t0", "failed")
+        for _ in range(sched.DETERMINISTIC_FAILURE_ATTEMPTS - 1):
+            assert not sched.handle_failed_test(node, rep)
+            sched.mark_test_complete(node, 0)
+        # failed the same way every time, give up before MAX_RETRIES
+        assert sched.handle_failed_test(node, rep)
+        sched.mark_test_complete(node, 0)
+        retry_info = sched.retries["a.py::t0"]
+        assert retry_info.deterministic
+        assert node.sent.count(0) == sched.DETERMINISTIC_FAILURE_ATTEMPTS
+        assert sched.retry_summary() == [
+            "1 tests failed the same way 3 times in a row, not retried further"
+        ]
+
+    def test_retry_budget(self, pytester: pytest.Pytester) -> None:
+        sched, node = self.make_sched(pytester, 10, "--retry-budget=1")
+        assert not sched.handle_failed_test(node, make_report("a.py::t0", "failed"))
+        sched.mark_test_complete(node, 0)
+        assert sched.retries_sent == 1
+
+        # the budget is used up: neither retries in flight nor new failures
+        # are retried any further
+        assert sched.handle_failed_test(node, make_report("a.py::t0", "failed"))
+        sched.mark_test_complete(node, 0)
+        assert sched.handle_failed_test(node, make_report("a.py::t1", "failed"))
+        sched.mark_test_complete(node, 1)
+        assert node.sent.count(0) == 2
+        assert node.sent.count(1) == 1
+        assert sched.retry_summary() == [
+            "retry budget exhausted, %d retries skipped" % (2 * sched.MAX_RETRIES - 1)
+        ]
+
+    def test_retry_time_budget(self, pytester: pytest.Pytester) -> None:
+        sched, node = self.make_sched(pytester, 10, "--retry-time-budget=1.5")
+        assert not sched.handle_failed_test(node, make_report("a.py::t0", "failed"))
+        sched.mark_test_complete(node, 0, duration=1)
+        assert sched.retry_time == 0
+        assert not sched.handle_failed_test(
+            node, make_report("a.py::t0", "failed", error="boom 1")
+        )
+        sched.mark_test_complete(node, 0, duration=2)
+        assert sched.retry_time == 2
+        assert sched.handle_failed_test(
+            node, make_report("a.py::t0", "failed", error="boom 2")
+        )
+        sched.mark_test_complete(node, 0)
+        assert node.sent.count(0) == 3
+
+    def test_retry_in_place(self, pytester: pytest.Pytester) -> None:
+        sched, node = self.make_sched(pytester, 4, "--retry-in-place")
+        assert node.retry_budgets == {i: sched.MAX_RETRIES for i in range(4)}
+
+        first_failure = make_report("a.py::t0", "failed")
+        sched.handle_retried_test(node, first_failure, 0, 2, True, 0.5)
+        assert sched.handle_passed_test(node, make_report("a.py::t0", "passed"))
+        sched.mark_test_complete(node, 0)
+        retry_info = sched.retries["a.py::t0"]
+        assert retry_info.original_test_report is first_failure
+        assert sched._retry_outcome(retry_info) == "passed on retry 2"
+
+        # the final failure of a test retried in place is reported as is
+        sched.handle_retried_test(node, first_failure, 1, 5, False, 0.5)
+        assert sched.handle_failed_test(node, make_report("a.py::t1", "failed"))
+        sched.mark_test_complete(node, 1)
+        assert node.sent == [0, 1, 2, 3]
+        assert (sched.retries_sent, sched.retry_time) == (7, 1)
+
+    def test_retry_in_place_budget(self, pytester: pytest.Pytester) -> None:
+        sched, node = self.make_sched(
+            pytester, 4, "--retry-in-place", "--retry-budget=2"
+        )
+        assert node.retry_budgets == {i: sched.MAX_RETRIES for i in range(4)}
+        sched.handle_retried_test(
+            node, make_report("a.py::t0", "failed"), 0, 2, True, 0.5
+        )
+        assert node.retry_budgets == {i: 0 for i in range(4)}
+
+    def test_no_retry_on_shutting_down_node(self, pytester: pytest.Pytester) -> None:
+        sched, node = self.make_sched(pytester, 2)
+        sched.mark_test_complete(node, 0)
+        assert node.shutting_down
+        assert sched.handle_failed_test(node, make_report("a.py::t1", "failed"))
+        assert sched.retries["a.py::t1"].max_retries == 0
+
+    def test_retries_from_flake_history(self, pytester: pytest.Pytester) -> None:
+        sched, node = self.make_sched(pytester, 4)
+        cache = pytester.parseconfigure().cache
+        history = FlakeHistory(cache)
+        for _ in range(FlakeHistory.DETERMINISTIC_FAILURES):
+            history.record("a.py::t0", failed=True, retries=1, retry_failures=1)
+        history.record("a.py::t1", failed=True, retries=2, retry_failures=1)
+        sched.flake_history = history
+
+        # failed all of its retries: the failure is reported right away
+        assert sched.handle_failed_test(node, make_report("a.py::t0", "failed"))
+        sched.mark_test_complete(node, 0)
+        assert node.sent == [0, 1, 2, 3]
+
+        assert not sched.handle_failed_test(node, make_report("a.py::t1", "failed"))
+        assert sched.retries["a.py::t1"].max_retries == 5
+        sched.mark_test_complete(node, 1)
+        assert node.sent == [0, 1, 2, 3, 1]
+
+
 class TestDistReporter:
     @pytest.mark.xfail
     def test_rsync_printing(self, pytester: pytest.Pytester, linecomp) -> None:
@@ -519,6 +984,96 @@ def test_report_collection_diff_different() -> None:
     assert msg == error_message
 
 
+def test_worker_utilization() -> None:
+    utilization = WorkerUtilization()
+    assert utilization.summary() == []
+    utilization.start("gw0", now=0.0)
+    utilization.start("gw1", now=0.0)
+    utilization.test_started("gw0", now=1.0)
+    utilization.test_finished("gw0", now=5.0)
+    utilization.test_started("gw0", now=6.0)
+    utilization.test_finished("gw0", now=10.0)
+    utilization.test_started("gw1", now=0.0)
+    utilization.test_finished("gw1", now=6.0)
+    assert utilization.summary(verbose=True) == [
+        "worker utilization 70.0%, 6.00 idle core-seconds, "
+        "4.00s between the first and last worker to finish",
+        "gw0: busy 8.00s, idle 2.00s (80.0%)",
+        "gw1: busy 6.00s, idle 4.00s (60.0%)",
+    ]
+
+
+def test_startup_timings(
+    pytester: pytest.Pytester, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    pytester.makeconftest(
+        """
+        import json
+
+        def pytest_xdist_node_started(node, timings, time_to_first_test):
+            with open("started.json", "w") as f:
+                json.dump([node.gateway.id, timings, time_to_first_test], f)
+        """
+    )
+    p = pytester.makepyfile(
+        """
+        def test_ok():
+            pass
+        """
+    )
+    pytester.makefile(".json", bins=f'[["{p}"]]')
+    monkeypatch.setenv("TEST_DIR", str(pytester.path))
+    result = pytester.runpytest_subprocess(p, "-n1", "--dist=loadscope", "-v")
+    result.assert_outcomes(passed=1)
+    result.stdout.fnmatch_lines(
+        [
+            "*xdist: worker startup phases (seconds)*",
+            "worker*makegateway*rsync*bootstrap*prepareconfig*time_to_first",
+            "gw0 *[0-9].[0-9][0-9][0-9]",
+        ]
+    )
+    worker, timings, time_to_first_test = json.loads(
+        (pytester.path / "started.json").read_text()
+    )
+    assert worker == "gw0"
+    assert list(timings) == [
+        "makegateway",
+        "rsync",
+        "bootstrap",
+        "prepareconfig",
+        "conftests",
+        "collection",
+        "wait",
+        "first_test",
+    ]
+    assert time_to_first_test >= sum(timings.values())
+
+
+def test_suggest_bins(pytester: pytest.Pytester, run_bins) -> None:
+    pytester.mkdir("tests")
+    for name in ("a", "c"):
+        pytester.path.joinpath("tests", f"test_{name}.py").write_text(
+            f"def test_{name}(): pass\n"
+        )
+    pytester.path.joinpath("tests", "test_b.py").write_text(
+        "import time\n\ndef test_b(): time.sleep(0.2)\n"
+    )
+    result = run_bins(
+        [["tests/test_a.py", "tests/test_b.py"], ["tests/test_c.py"]],
+        *["-n2", "--dist=loadscope", "--suggest-bins=suggested.json"],
+    )
+    result.assert_outcomes(passed=3)
+    result.stdout.fnmatch_lines(
+        ["*xdist: * finished last, critical bin 0 takes *", "*tests/test_b.py"]
+    )
+    suggestion = json.loads((pytester.path / "suggested.json").read_text())
+    assert suggestion["critical_bin"] == 0
+    assert suggestion["bins"] == [
+        ["tests/test_b.py"],
+        ["tests/test_c.py", "tests/test_a.py"],
+    ]
+
+
 @pytest.mark.xfail(reason="duplicate test ids not supported yet")
 def test_pytest_issue419(pytester: pytest.Pytester) -> None:
     pytester.makepyfile(
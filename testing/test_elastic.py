@@ -0,0 +1,107 @@
+from types import SimpleNamespace
+
+import pytest
+
+from xdist.elastic import ElasticScaler
+
+
+class MockNode:
+    shutting_down = False
+
+
+@pytest.fixture(autouse=True)
+def cpu_usage(monkeypatch: pytest.MonkeyPatch):
+    usage = SimpleNamespace(value=0.1)
+    monkeypatch.setattr("xdist.elastic.cpu_usage", lambda: usage.value)
+    return usage
+
+
+def make_scaler(backlog=10, num_nodes=1, max_workers=3):
+    nodes = [MockNode() for _ in range(num_nodes)]
+    sched = SimpleNamespace(
+        backlog=lambda: backlog,
+        collection_is_completed=True,
+        nodes=list(nodes),
+        registered_collections={node: [] for node in nodes},
+    )
+    dsession = SimpleNamespace(sched=sched, shuttingdown=False, _active_nodes=nodes)
+    scaler = ElasticScaler(dsession, max_workers)
+    return scaler, dsession
+
+
+def test_should_add(cpu_usage) -> None:
+    scaler, dsession = make_scaler()
+    assert scaler.should_add() is dsession.sched.nodes[0]
+
+    cpu_usage.value = 0.9
+    assert scaler.should_add() is None
+    cpu_usage.value = None
+    assert scaler.should_add() is None
+    cpu_usage.value = 0.1
+    assert make_scaler(backlog=ElasticScaler.MIN_BACKLOG - 1)[0].should_add() is None
+    assert make_scaler(num_nodes=3)[0].should_add() is None
+
+    scaler, dsession = make_scaler()
+    dsession.shuttingdown = True
+    assert scaler.should_add() is None
+
+
+def test_one_worker_at_a_time(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(ElasticScaler, "INTERVAL", 0)
+    scaler, dsession = make_scaler()
+    added = MockNode()
+    templates = []
+
+    def add_worker(template):
+        templates.append(template)
+        dsession._active_nodes.append(added)
+        return added
+
+    dsession.add_worker = add_worker
+    scaler.tick()
+    assert templates == dsession.sched.nodes
+    # the new worker has not collected yet
+    scaler.tick()
+    assert len(templates) == 1
+
+    dsession.sched.nodes.append(added)
+    dsession.sched.registered_collections[added] = []
+    scaler.tick()
+    assert len(templates) == 2
+
+
+def test_elastic_option(pytester: pytest.Pytester, run_bins) -> None:
+    pytester.makepyfile(
+        **{
+            "tests/test_io": """
+                import time
+                import pytest
+
+                @pytest.mark.parametrize("i", range(12))
+                def test_io(i):
+                    time.sleep(0.5)
+            """
+        }
+    )
+    pytester.makeconftest(
+        """
+        from xdist import elastic
+
+        elastic.ElasticScaler.INTERVAL = 0.2
+        elastic.cpu_usage = lambda: 0.0
+        """
+    )
+    result = run_bins(
+        [["tests/test_io.py"]],
+        *["-n1", "--dist=loadscope", "-v", "--elastic", "--maxprocesses=3"],
+    )
+    result.assert_outcomes(passed=12)
+    result.stdout.fnmatch_lines(["*[[]gw1[]]*PASSED*"])
+    assert "gw3" not in result.stdout.str()
+
+
+def test_not_supported_by_dist_mode(pytester: pytest.Pytester, run_bins) -> None:
+    pytester.makepyfile(**{"tests/test_a": "def test_a(): pass"})
+    result = run_bins([["tests/test_a.py"]], "-n1", "--elastic")
+    assert result.ret == pytest.ExitCode.USAGE_ERROR
+    result.stderr.fnmatch_lines(["ERROR: --elastic is only supported by*"])
@@ -0,0 +1,83 @@
+import pytest
+
+from xdist.flakes import FlakeHistory
+
+
+@pytest.fixture
+def cache(pytester: pytest.Pytester):
+    return pytester.parseconfigure().cache
+
+
+def test_no_cache() -> None:
+    history = FlakeHistory(None)
+    assert history.retries_for("a.py::test", 5) == 5
+    history.record("a.py::test", failed=True, retries=1, retry_failures=0)
+    history.save()
+
+
+def test_unknown_test_gets_one_retry(cache) -> None:
+    history = FlakeHistory(cache)
+    assert history.retries_for("a.py::test", 5) == 1
+    assert history.retries_for("a.py::test", 0) == 0
+
+
+def test_passed_then_flaky(cache) -> None:
+    history = FlakeHistory(cache)
+    history.record("a.py::test")
+    assert history.retries_for("a.py::test", 5) == 1
+    history.record("a.py::test", failed=True, retries=1, retry_failures=0)
+    assert history.tests["a.py::test"]["flaky"] == 1
+    assert history.retries_for("a.py::test", 5) == 1
+
+
+def test_never_flaky(cache) -> None:
+    history = FlakeHistory(cache)
+    history.record("a.py::test")
+    for _ in range(FlakeHistory.DETERMINISTIC_FAILURES - 1):
+        history.record("a.py::test", failed=True, retries=1, retry_failures=1)
+        assert history.retries_for("a.py::test", 5) == 1
+    history.record("a.py::test", failed=True, retries=1, retry_failures=1)
+    assert history.retries_for("a.py::test", 5) == 0
+
+
+@pytest.mark.parametrize(
+    "retries, retry_failures, expected",
+    [
+        (1, 0, 1),
+        (10, 1, 2),
+        (4, 2, 5),
+        (2, 1, 5),
+        (20, 19, 5),
+    ],
+)
+def test_known_flaky(cache, retries: int, retry_failures: int, expected: int) -> None:
+    history = FlakeHistory(cache)
+    history.record("a.py::test", failed=True, retries=retries, retry_failures=0)
+    history.tests["a.py::test"]["retry_failures"] = retry_failures
+    assert history.retries_for("a.py::test", 5) == expected
+
+
+def test_persisted(cache) -> None:
+    history = FlakeHistory(cache)
+    history.record("a.py::test")
+    history.record("a.py::flaky", failed=True, retries=2, retry_failures=1)
+    history.save()
+
+    history = FlakeHistory(cache)
+    history.record("a.py::flaky")
+    assert history.tests == {
+        "a.py::test": {
+            "runs": 1,
+            "failed": 0,
+            "flaky": 0,
+            "retries": 0,
+            "retry_failures": 0,
+        },
+        "a.py::flaky": {
+            "runs": 2,
+            "failed": 1,
+            "flaky": 1,
+            "retries": 2,
+            "retry_failures": 1,
+        },
+    }
@@ -0,0 +1,315 @@
+import json
+import sqlite3
+
+import pytest
+
+from xdist.history import (
+    TimingHistory,
+    in_bin_entry,
+    main,
+    predict_bins,
+    suggest_bins,
+)
+
+
+@pytest.fixture
+def history() -> TimingHistory:
+    history = TimingHistory()
+    for durations in ([1.0, 4.0], [2.0, 5.0], [3.0, 6.0]):
+        history.start_run()
+        history.record("a.py::t0", "setup", 0.5, "gw0", "passed")
+        for nodeid, duration in zip(["a.py::t0", "a.py::t1"], durations):
+            history.record(nodeid, "call", duration, "gw0", "passed")
+    return history
+
+
+def test_samples(history: TimingHistory) -> None:
+    assert history.samples() == {"a.py::t0": [1.0, 2.0, 3.0], "a.py::t1": [4, 5, 6]}
+    assert history.samples(["a.py::t1"], last=2) == {"a.py::t1": [5.0, 6.0]}
+    assert history.samples(phase="setup") == {"a.py::t0": [0.5, 0.5, 0.5]}
+    assert history.samples(["a.py::t0"], phase=None) == {"a.py::t0": [1.5, 2.5, 3.5]}
+
+
+def test_samples_without_window_functions(
+    history: TimingHistory, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(sqlite3, "sqlite_version_info", (3, 24, 0))
+    assert history.samples(last=2) == {"a.py::t0": [2.0, 3.0], "a.py::t1": [5, 6]}
+    assert history.samples(["a.py::t1"], last=0) == {"a.py::t1": []}
+    assert history.ewma(alpha=1) == {"a.py::t0": 3.0, "a.py::t1": 6.0}
+
+
+def test_ewma(history: TimingHistory) -> None:
+    ewma = history.ewma(alpha=0.5)
+    assert ewma == {"a.py::t0": 2.25, "a.py::t1": 5.25}
+
+
+@pytest.mark.parametrize("q, expected", [(0, 4.0), (50, 5.0), (95, 6.0), (100, 6.0)])
+def test_percentile(history: TimingHistory, q: float, expected: float) -> None:
+    assert history.percentile(q, ["a.py::t1"]) == {"a.py::t1": expected}
+
+
+def test_retried_attempts(history: TimingHistory) -> None:
+    history.start_run()
+    history.record("a.py::t0", "call", 9.0, "gw0", "failed")
+    history.record("a.py::t0", "setup", 0.5, "gw0", "passed")
+    history.record("a.py::t0", "call", 4.0, "gw0", "passed")
+    # only the last attempt of each phase in a run is a sample
+    assert history.samples(["a.py::t0"]) == {"a.py::t0": [1.0, 2.0, 3.0, 4.0]}
+    assert history.samples(["a.py::t0"], phase=None, last=2) == {"a.py::t0": [3.5, 4.5]}
+    assert history.flake_rates()["a.py::t0"] == (4, 1)
+
+
+def test_ewma_window(history: TimingHistory) -> None:
+    for _ in range(60):
+        history.start_run()
+        history.record("a.py::t0", "call", 1.0, "gw0", "passed")
+    # the first samples weigh less than EWMA_PRECISION and are not queried
+    assert history.ewma(["a.py::t0"]) == {"a.py::t0": 1.0}
+    assert history.ewma(["a.py::t0"], alpha=1) == {"a.py::t0": 1.0}
+
+
+def test_nodeid_index(history: TimingHistory) -> None:
+    plan = history.connection.execute(
+        "EXPLAIN QUERY PLAN SELECT duration FROM durations"
+        " WHERE nodeid = ? AND phase = ? AND run >= ?",
+        ("a.py::t0", "call", 0),
+    ).fetchall()
+    assert "durations_nodeid" in str(plan)
+
+
+def test_older_schema(tmp_path) -> None:
+    path = tmp_path / "history.sqlite"
+    connection = sqlite3.connect(path)
+    connection.executescript(
+        """
+        CREATE TABLE runs (id INTEGER PRIMARY KEY, started REAL, finished REAL);
+        CREATE TABLE durations (
+            run INTEGER, nodeid TEXT, phase TEXT, duration REAL,
+            worker TEXT, outcome TEXT
+        );
+        INSERT INTO runs VALUES (1, 0, 1);
+        INSERT INTO durations VALUES (1, 'a.py::t0', 'call', 1.0, 'gw0', 'passed');
+        """
+    )
+    connection.commit()
+    connection.close()
+
+    history = TimingHistory(path)
+    history.start_run()
+    history.record("a.py::t0", "call", 2.0)
+    history.record("a.py::t0", "call", 3.0)
+    assert history.samples() == {"a.py::t0": [1.0, 3.0]}
+
+
+def test_last(history: TimingHistory) -> None:
+    assert history.last(1) == {"a.py::t0": [3.0], "a.py::t1": [6.0]}
+    assert history.last_finished_run_start() is None
+
+
+def test_persistence(pytester: pytest.Pytester) -> None:
+    config = pytester.parseconfigure()
+    history = TimingHistory.from_config(config)
+    history.start_run()
+    history.record("a.py::t0", "call", 1.0, "gw0", "passed")
+    history.finish_run()
+
+    history = TimingHistory.from_config(config)
+    assert history.samples() == {"a.py::t0": [1.0]}
+    (started, finished) = history.connection.execute(
+        "SELECT started, finished FROM runs"
+    ).fetchone()
+    assert finished is not None
+    history.start_run()
+    assert history.last_finished_run_start() == started
+
+
+def test_recorded_by_dsession(
+    pytester: pytest.Pytester, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    p = pytester.makepyfile(
+        """
+        def test_ok(): pass
+        def test_fail(): assert 0
+        """
+    )
+    pytester.makefile(".json", bins=f'[["{p}"]]')
+    monkeypatch.setenv("TEST_DIR", str(pytester.path))
+    result = pytester.runpytest_subprocess(p, "-n1", "--dist=loadscope")
+    result.assert_outcomes(passed=1, failed=1)
+    history = TimingHistory.from_config(pytester.parseconfigure())
+    rows = history.connection.execute(
+        "SELECT nodeid, phase, worker, outcome FROM durations WHERE phase = 'call'"
+    ).fetchall()
+    assert sorted(rows) == [
+        ("test_recorded_by_dsession.py::test_fail", "call", "gw0", "failed"),
+        ("test_recorded_by_dsession.py::test_ok", "call", "gw0", "passed"),
+    ]
+
+
+def test_not_recorded_without_cache(
+    pytester: pytest.Pytester, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    p = pytester.makepyfile("def test_ok(): pass")
+    pytester.makefile(".json", bins=f'[["{p}"]]')
+    monkeypatch.setenv("TEST_DIR", str(pytester.path))
+    result = pytester.runpytest_subprocess(
+        p, "-n1", "--dist=loadscope", "-p", "no:cacheprovider"
+    )
+    result.assert_outcomes(passed=1)
+    assert not (pytester.path / ".pytest_cache").exists()
+
+
+def test_unwritable_history(
+    pytester: pytest.Pytester, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    p = pytester.makepyfile("def test_ok(): pass")
+    pytester.makefile(".json", bins=f'[["{p}"]]')
+    monkeypatch.setenv("TEST_DIR", str(pytester.path))
+    # a directory where the database should be can't be opened
+    (pytester.path / ".pytest_cache/d/xdist" / TimingHistory.FILENAME).mkdir(
+        parents=True
+    )
+    result = pytester.runpytest_subprocess(p, "-n1", "--dist=loadscope")
+    result.assert_outcomes(passed=1)
+    result.stdout.fnmatch_lines(["timing history not recorded: *"])
+
+
+def test_flake_rates() -> None:
+    history = TimingHistory()
+    for outcomes in (["failed", "passed"], ["passed"], ["failed", "failed"]):
+        history.start_run()
+        for outcome in outcomes:
+            history.record("a.py::t0", "call", 1.0, "gw0", outcome)
+    assert history.flake_rates() == {"a.py::t0": (3, 1)}
+    assert history.flake_rates(runs=2) == {"a.py::t0": (2, 0)}
+
+
+@pytest.mark.parametrize(
+    "nodeid, entry, expected",
+    [
+        ("tests/a.py::t0", "tests", True),
+        ("tests/a.py::t0", "tests/", True),
+        ("tests/a.py::t0", "tests/a.py", True),
+        ("tests/a.py::t0", "tests/a.py::t0", True),
+        ("tests/a.py::t0", "tests/a", False),
+        ("tests/a.py::t01", "tests/a.py::t0", False),
+    ],
+)
+def test_in_bin_entry(nodeid: str, entry: str, expected: bool) -> None:
+    assert in_bin_entry(nodeid, entry) == expected
+
+
+def test_predict_bins() -> None:
+    expected = {"a.py::t0": 1.0, "a.py::t1": 2.0, "b/c.py::t0": 4.0, "d.py::t0": 8.0}
+    loads, unassigned = predict_bins([["a.py"], ["b"]], expected)
+    assert loads == [(2, 3.0), (1, 4.0)]
+    assert unassigned == (1, 8.0)
+
+    # a test selected by several bins belongs to the first one
+    loads, unassigned = predict_bins([["a.py::t0"], ["a.py", "b/c.py"]], expected)
+    assert loads == [(1, 1.0), (2, 6.0)]
+    assert unassigned == (1, 8.0)
+
+
+def test_suggest_bins_moves_entries() -> None:
+    expected = {"a.py::t0": 4.0, "b.py::t0": 3.0, "c.py::t0": 1.0, "d.py::t0": 2.0}
+    suggestion = suggest_bins([["a.py", "b.py", "c.py"], ["d.py"]], expected)
+    assert suggestion["critical_bin"] == 0
+    assert suggestion["makespan"] == 8.0
+    assert suggestion["dominant"] == [
+        {"entry": "a.py", "duration": 4.0},
+        {"entry": "b.py", "duration": 3.0},
+        {"entry": "c.py", "duration": 1.0},
+    ]
+    assert [move["entries"] for move in suggestion["moves"]] == [["b.py"]]
+    assert suggestion["moves"][0]["saving"] == 3.0
+    assert suggestion["predicted_makespan"] == 5.0
+    assert suggestion["bins"] == [["a.py", "c.py"], ["d.py", "b.py"]]
+
+
+def test_suggest_bins_splits_entries() -> None:
+    expected = {f"a.py::t{i}": 1.0 for i in range(6)}
+    suggestion = suggest_bins([["a.py"], []], expected)
+    assert suggestion["moves"] == [
+        {
+            "entries": ["a.py::t3", "a.py::t4", "a.py::t5"],
+            "split_from": "a.py",
+            "from": 0,
+            "to": 1,
+            "duration": 3.0,
+            "saving": 3.0,
+        }
+    ]
+    assert suggestion["bins"] == [
+        ["a.py::t0", "a.py::t1", "a.py::t2"],
+        ["a.py::t3", "a.py::t4", "a.py::t5"],
+    ]
+    loads, unassigned = predict_bins(suggestion["bins"], expected)
+    assert loads == [(3, 3.0), (3, 3.0)]
+    assert unassigned == (0, 0.0)
+
+
+class TestMain:
+    @pytest.fixture
+    def db(self, tmp_path) -> str:
+        path = str(tmp_path / "history.sqlite")
+        history = TimingHistory(path)
+        for i, slow in enumerate([1.0, 1.0, 1.0, 3.0]):
+            history.start_run()
+            history.record("a.py::slow", "call", slow, "gw0", "passed")
+            history.record("a.py::fast", "call", 0.1, "gw0", "passed")
+            if i == 3:
+                history.record("b.py::flaky", "call", 0.1, "gw0", "failed")
+            history.record("b.py::flaky", "call", 0.1, "gw0", "passed")
+        history.finish_run()
+        return path
+
+    def test_slowest(self, db: str, capsys: pytest.CaptureFixture[str]) -> None:
+        assert main(["--db", db, "slowest", "-n", "1", "--stat", "p50"]) == 0
+        assert capsys.readouterr().out == "     1.000s  a.py::slow\n"
+
+        main(["--db", db, "slowest", "--files", "--stat", "p50"])
+        out = capsys.readouterr().out
+        assert out.splitlines() == ["     1.100s  a.py", "     0.100s  b.py"]
+
+    def test_regressions(self, db: str, capsys: pytest.CaptureFixture[str]) -> None:
+        main(["--db", db, "regressions", "--recent", "1"])
+        out = capsys.readouterr().out
+        # the failed attempt of b.py::flaky before its retry is not a sample
+        assert out.splitlines() == ["   +200%     1.000s ->    3.000s  a.py::slow"]
+
+    def test_flaky(self, db: str, capsys: pytest.CaptureFixture[str]) -> None:
+        main(["--db", db, "flaky"])
+        assert capsys.readouterr().out == " 25.0%     1/4     b.py::flaky\n"
+
+    def test_bins(self, db: str, tmp_path, capsys: pytest.CaptureFixture[str]) -> None:
+        bins = tmp_path / "bins.json"
+        bins.write_text('[["a.py"], ["b.py"]]')
+        main(["--db", db, "--runs", "3", "bins", str(bins), "--stat", "p95"])
+        assert capsys.readouterr().out.splitlines() == [
+            "bin 0:     2 tests       3.100s",
+            "bin 1:     1 tests       0.100s",
+            "predicted makespan: 3.100s (max/mean 1.94)",
+        ]
+
+    def test_bins_suggest(
+        self, db: str, tmp_path, capsys: pytest.CaptureFixture[str]
+    ) -> None:
+        bins = tmp_path / "bins.json"
+        bins.write_text('[["a.py"], ["b.py"]]')
+        suggested = tmp_path / "suggested.json"
+        main(
+            ["--db", db, "--runs", "3", "bins", str(bins), "--stat", "p95"]
+            + ["--suggest", str(suggested)]
+        )
+        lines = capsys.readouterr().out.splitlines()
+        assert lines[-1] == "suggested bins: 1 moves, predicted makespan 3.000s"
+        assert json.loads(suggested.read_text())["bins"] == [
+            ["a.py::slow"],
+            ["b.py", "a.py::fast"],
+        ]
+
+    def test_missing_db(self, tmp_path) -> None:
+        with pytest.raises(SystemExit):
+            main(["--db", str(tmp_path / "missing.sqlite"), "flaky"])
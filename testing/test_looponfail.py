@@ -1,3 +1,5 @@
+import os
+import sys
 import unittest.mock
 from typing import List
 
@@ -6,6 +8,10 @@ import shutil
 import textwrap
 from pathlib import Path
 
+from xdist import _inotify
+from xdist.looponfail import InotifyRecorder
+from xdist.looponfail import invalidate_modules
+from xdist.looponfail import make_recorder
 from xdist.looponfail import RemoteControl
 from xdist.looponfail import StatRecorder
 
@@ -110,6 +116,112 @@ class TestStatRecorder:
         sd.waitonchange(checkinterval=0.2)
         assert not ret_values
 
+    def test_dircache(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        sub = tmp_path / "sub"
+        sub.mkdir()
+        p = sub / "hello.py"
+        p.touch()
+        old = os.stat(sub).st_mtime - 10
+        os.utime(sub, (old, old))
+        os.utime(tmp_path, (old, old))
+        sd = StatRecorder([tmp_path])
+
+        listed: List[str] = []
+        scandir = os.scandir
+
+        def counting_scandir(path):
+            listed.append(path)
+            return scandir(path)
+
+        monkeypatch.setattr(os, "scandir", counting_scandir)
+        assert not sd.check()
+        assert listed == []
+
+        p.write_text("world")
+        assert sd.check()
+        assert listed == []
+
+        # a stale listing still notices the removed file
+        p.unlink()
+        os.utime(sub, (old, old))
+        assert sd.check()
+
+        sub.joinpath("new.py").touch()
+        assert sd.check()
+        assert listed == [sub]
+
+
+@pytest.mark.skipif(
+    _inotify._load_libc() is None, reason="inotify is only available on Linux"
+)
+class TestInotifyRecorder:
+    def test_filechange(self, tmp_path: Path) -> None:
+        tmp = tmp_path
+        hello = tmp / "hello.py"
+        hello.touch()
+        sd = InotifyRecorder([tmp])
+        assert not sd.check()
+
+        hello.write_text("world")
+        assert sd.check()
+
+        hello.with_suffix(".pyc").write_text("hello")
+        tmp.joinpath(".hidden").touch()
+        assert not sd.check()
+
+        tmp.joinpath("a", "b").mkdir(parents=True)
+        tmp.joinpath("a", "b", "c.py").touch()
+        assert sd.check()
+
+        tmp.joinpath("a", "b", "c.py").write_text("c")
+        assert sd.check()
+
+        tmp.joinpath("a", "d").mkdir()
+        assert not sd.check()
+
+        shutil.rmtree(str(tmp.joinpath("a")))
+        assert sd.check()
+        assert list(sd.watches.values()) == [tmp]
+        sd.close()
+
+    def test_waitonchange_coalesces(self, tmp_path: Path) -> None:
+        sd = InotifyRecorder([tmp_path])
+        for i in range(10):
+            tmp_path.joinpath(f"test_{i}.py").write_text("x")
+        sd.waitonchange()
+        assert not sd.check()
+        sd.close()
+
+    def test_fallback(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        assert isinstance(make_recorder([tmp_path]), InotifyRecorder)
+
+        def add_watch(self, path, mask):
+            raise OSError(28, "No space left on device")
+
+        monkeypatch.setattr(_inotify.Inotify, "add_watch", add_watch)
+        assert isinstance(make_recorder([tmp_path]), StatRecorder)
+
+    def test_fallback_while_settling(
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        sd = InotifyRecorder([tmp_path])
+        tmp_path.joinpath("test_a.py").write_text("x")
+        read = sd.inotify.read
+
+        def settling_read(timeout):
+            if timeout is not None:
+                # a directory is created while the burst settles
+                tmp_path.joinpath("sub").mkdir()
+                monkeypatch.setattr(_inotify.Inotify, "add_watch", add_watch)
+            return read(timeout)
+
+        def add_watch(self, path, mask):
+            raise OSError(28, "No space left on device")
+
+        monkeypatch.setattr(sd.inotify, "read", settling_read)
+        assert sd.waitonchange() is None
+        assert isinstance(sd.fallback, StatRecorder)
+
 
 class TestRemoteControl:
     def test_nofailures(self, pytester: pytest.Pytester) -> None:
@@ -191,6 +303,121 @@ class TestRemoteControl:
         control.loop_once()
         assert control.failures
 
+    def test_keepalive(self, pytester: pytest.Pytester) -> None:
+        pytester.makepyfile(
+            helper="VALUE = 0\n",
+            test_keepalive="import helper\ndef test_func():\n assert helper.VALUE\n",
+        )
+        control = RemoteControl(
+            pytester.parseconfig(pytester.path / "test_keepalive.py"), keepalive=True
+        )
+        control.loop_once()
+        assert control.failures
+        gateway = control.gateway
+
+        helper = pytester.path / "helper.py"
+        helper.write_text("VALUE = 1\n")
+        removepyc(helper)
+        control.loop_once({helper})
+        assert not control.failures
+        assert control.gateway is gateway
+
+        # unknown changes restart the worker
+        control.loop_once(None)
+        assert not control.failures
+        assert control.gateway is not gateway
+        control.ensure_teardown()
+
+    def test_distributed(
+        self,
+        pytester: pytest.Pytester,
+        monkeypatch: pytest.MonkeyPatch,
+        capfd: pytest.CaptureFixture[str],
+    ) -> None:
+        test_one = pytester.makepyfile(
+            **{
+                "tests/test_one": """
+                    import os
+
+                    def test_ok():
+                        pass
+
+                    def test_fail():
+                        with open("pids", "a") as f:
+                            f.write(f"{os.getpid()}\\n")
+                        assert 0
+                """,
+                "tests/test_two": "def test_other():\n pass\n",
+            }
+        )
+        pytester.makefile(
+            ".json", bins='[["tests/test_one.py"], ["tests/test_two.py"]]'
+        )
+        monkeypatch.setenv("TEST_DIR", str(pytester.path))
+        config = pytester.parseconfig("tests", "-n2", "--dist=loadscope")
+        control = RemoteControl(config, keepalive=True)
+        control.loop_once()
+        assert control.failures == ["tests/test_one.py::test_fail"]
+        assert "1 failed, 2 passed" in capfd.readouterr().out
+
+        # only the failure is rerun, by the same workers
+        control.loop_once(set())
+        assert control.failures == ["tests/test_one.py::test_fail"]
+        out = capfd.readouterr().out
+        assert "created: 2/2 workers" in out
+        assert "passed" not in out
+        first, second = pytester.path.joinpath("pids").read_text().split()
+        assert first == second
+
+        # the workers import the changed test module again
+        test_one.write_text(
+            test_one.read_text().replace("assert 0", "assert 1").lstrip()
+        )
+        control.loop_once({test_one})
+        assert control.failures == []
+        assert "1 passed" in capfd.readouterr().out
+        assert pytester.path.joinpath("pids").read_text().split() == [first] * 3
+        control.ensure_teardown()
+
+
+class TestInvalidateModules:
+    @pytest.fixture
+    def modules(self, pytester: pytest.Pytester):
+        pytester.makepyfile(
+            lo_base="VALUE = 1\n",
+            lo_user="from lo_base import VALUE\n",
+            lo_other="X = 1\n",
+        )
+        pytester.mkpydir("lo_pkg")
+        pytester.makepyfile(**{"lo_pkg/sub": "import lo_other\n"})
+        pytester.syspathinsert()
+        names = ["lo_base", "lo_user", "lo_other", "lo_pkg", "lo_pkg.sub"]
+        for name in names:
+            __import__(name)
+        yield
+        for name in names:
+            sys.modules.pop(name, None)
+
+    def test_importers(self, pytester: pytest.Pytester, modules) -> None:
+        roots = [str(pytester.path)]
+        assert invalidate_modules([str(pytester.path / "lo_base.py")], roots)
+        assert "lo_base" not in sys.modules
+        assert "lo_user" not in sys.modules
+        assert "lo_other" in sys.modules
+
+        init = pytester.path / "lo_pkg" / "__init__.py"
+        assert invalidate_modules([str(init)], roots)
+        assert "lo_pkg.sub" not in sys.modules
+        assert "lo_other" in sys.modules
+
+    def test_unsafe(self, pytester: pytest.Pytester, modules) -> None:
+        other = str(pytester.path / "lo_other.py")
+        assert not invalidate_modules([other], [str(pytester.path / "lo_pkg")])
+        assert "lo_other" in sys.modules
+        assert "lo_pkg.sub" in sys.modules
+
+        assert invalidate_modules([str(pytester.path / "unknown.py")], [])
+
 
 class TestLooponFailing:
     def test_looponfail_from_fail_to_ok(self, pytester: pytest.Pytester) -> None:
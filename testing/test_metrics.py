@@ -0,0 +1,86 @@
+from queue import Queue
+from types import SimpleNamespace
+
+import pytest
+
+from xdist.dsession import WorkerUtilization
+from xdist.metrics import MetricsExporter
+
+
+def make_dsession():
+    return SimpleNamespace(
+        utilization=WorkerUtilization(),
+        queue=Queue(),
+        sched=SimpleNamespace(retries_sent=3, skipped_retries=1),
+        startup_timings={"gw0": {"collection": 0.5, "makegateway": 0.25}},
+        _failed_nodes_count=1,
+    )
+
+
+def test_render(tmp_path) -> None:
+    dsession = make_dsession()
+    metrics = MetricsExporter(dsession, tmp_path / "xdist.prom")
+    dsession.utilization.start("gw0", now=metrics.start)
+    for _ in range(4):
+        metrics.test_finished("gw0")
+    metrics.report_received(SimpleNamespace(stop=metrics.start))
+    dsession.queue.put(("logstart", {}))
+    metrics.event_processed(queue_depth=5)
+    metrics.write()
+
+    lines = (tmp_path / "xdist.prom").read_text().splitlines()
+    assert lines[:3] == [
+        "# HELP xdist_worker_tests Tests run by each worker.",
+        "# TYPE xdist_worker_tests gauge",
+        'xdist_worker_tests{worker="gw0"} 4',
+    ]
+    assert lines[-1] == "# EOF"
+    assert "xdist_controller_queue_depth 1" in lines
+    assert "xdist_controller_queue_depth_max 5" in lines
+    assert "xdist_reports_received 1" in lines
+    assert "xdist_retries 3" in lines
+    assert "xdist_skipped_retries 1" in lines
+    assert "xdist_worker_restarts 1" in lines
+    startup = [line for line in lines if line.startswith("xdist_worker_startup")]
+    assert startup == [
+        'xdist_worker_startup_seconds{worker="gw0",phase="makegateway"} 0.25',
+        'xdist_worker_startup_seconds{worker="gw0",phase="collection"} 0.5',
+    ]
+    assert list(tmp_path.iterdir()) == [tmp_path / "xdist.prom"]
+
+
+def test_interval(tmp_path) -> None:
+    path = tmp_path / "xdist.prom"
+    metrics = MetricsExporter(make_dsession(), path, interval=0)
+    metrics.event_processed(queue_depth=0)
+    assert path.exists()
+
+    # written while no event comes in too
+    path.unlink()
+    metrics.tick()
+    assert path.exists()
+
+    path.unlink()
+    metrics = MetricsExporter(make_dsession(), path, interval=None)
+    metrics.event_processed(queue_depth=0)
+    assert not path.exists()
+
+
+def test_metrics_file_option(
+    pytester: pytest.Pytester, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    p = pytester.makepyfile(
+        """
+        def test_ok():
+            pass
+        """
+    )
+    pytester.makefile(".json", bins=f'[["{p}"]]')
+    monkeypatch.setenv("TEST_DIR", str(pytester.path))
+    result = pytester.runpytest_subprocess(
+        p, "-n1", "--dist=loadscope", "--metrics-file=xdist.prom"
+    )
+    result.assert_outcomes(passed=1)
+    lines = (pytester.path / "xdist.prom").read_text().splitlines()
+    assert 'xdist_worker_tests{worker="gw0"} 1' in lines
+    assert "xdist_worker_restarts 0" in lines
@@ -0,0 +1,98 @@
+import os
+import shutil
+from types import SimpleNamespace
+
+import pytest
+
+from xdist.priority import changed_file_ranks
+from xdist.priority import changed_mtimes
+from xdist.remote import prioritize
+
+
+def test_prioritize() -> None:
+    nodeids = ["a.py::t1", "a.py::t2", "b.py::t1", "c.py::t1", "c.py::t2", "d.py::t1"]
+    items = [SimpleNamespace(nodeid=nodeid) for nodeid in nodeids]
+    prioritize(items, failed=["c.py::t2"], changed={"d.py": 0, "b.py": 1})
+    assert [item.nodeid for item in items] == [
+        "c.py::t2",
+        "c.py::t1",
+        "d.py::t1",
+        "b.py::t1",
+        "a.py::t1",
+        "a.py::t2",
+    ]
+
+
+def test_changed_file_ranks() -> None:
+    mtimes = {"tests/test_a.py": 10.0, "pkg/b.py": 20.0, "pkg/c.py": 5.0}
+    dependencies = {
+        "tests/test_b.py::t": {"pkg/b.py"},
+        "tests/test_c.py::t": {"pkg/a.py"},
+    }
+    test_files = {"tests/test_a.py", "tests/test_b.py", "tests/test_c.py"}
+    assert changed_file_ranks(test_files, mtimes, dependencies) == {
+        "tests/test_b.py": 0,
+        "tests/test_a.py": 1,
+    }
+
+
+def test_changed_mtimes_without_git(tmp_path) -> None:
+    old = tmp_path / "old.py"
+    new = tmp_path / "new.py"
+    old.write_text("")
+    new.write_text("")
+    os.utime(old, (100.0, 100.0))
+    os.utime(new, (300.0, 300.0))
+    candidates = {"old.py", "new.py", "gone.py"}
+    assert changed_mtimes(tmp_path, candidates, since=200.0) == {"new.py": 300.0}
+    assert changed_mtimes(tmp_path, candidates) == {}
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="needs git")
+def test_prioritize_option(
+    pytester: pytest.Pytester, monkeypatch: pytest.MonkeyPatch, run_bins
+) -> None:
+    pytester.makepyfile(
+        **{
+            "tests/test_a": """
+                import os
+
+                def test_1():
+                    pass
+
+                def test_2():
+                    assert not os.environ.get("FAIL")
+            """,
+            "tests/test_b": "def test_1(): pass",
+            "tests/test_c": "def test_1(): pass",
+            # reorders the items as pytest-randomly does, before xdist
+            "reorder": """
+                def pytest_collection_modifyitems(items):
+                    items.sort(key=lambda item: item.nodeid)
+            """,
+        }
+    )
+    ignored = ".pytest_cache\nstdout\nstderr\nbins.json\n"
+    pytester.path.joinpath(".gitignore").write_text(ignored)
+    for args in (["init", "-q"], ["add", "."], ["commit", "-q", "-m", "init"]):
+        pytester.run("git", "-c", "user.name=t", "-c", "user.email=t@t", *args)
+    bins = [["tests/test_b.py", "tests/test_c.py", "tests/test_a.py"]]
+    args = ["-n1", "--dist=loadscope", "-p", "reorder", "-v", "--prioritize"]
+
+    monkeypatch.setenv("FAIL", "1")
+    result = run_bins(bins, *args)
+    result.stdout.fnmatch_lines(["prioritized: 0 failed tests, 0 changed files"])
+    result.assert_outcomes(passed=3, failed=1)
+
+    monkeypatch.delenv("FAIL")
+    pytester.path.joinpath("tests", "test_c.py").write_text("def test_1(): pass\n")
+    result = run_bins(bins, *args)
+    result.stdout.fnmatch_lines(
+        [
+            "prioritized: 1 failed tests, 1 changed files",
+            "*PASSED tests/test_a.py::test_2*",
+            "*PASSED tests/test_a.py::test_1*",
+            "*PASSED tests/test_c.py::test_1*",
+            "*PASSED tests/test_b.py::test_1*",
+        ]
+    )
@@ -0,0 +1,106 @@
+from types import SimpleNamespace
+
+import pytest
+
+from xdist.recycle import WorkerRecycler
+
+
+class MockNode:
+    shutting_down = False
+
+    def __init__(self):
+        self.gateway = SimpleNamespace(id="gw0")
+
+
+class MockSched:
+    def __init__(self):
+        self.replacements = {}
+        self.retired = []
+
+    def add_replacement(self, node, replacement):
+        self.replacements[node] = replacement
+
+    def retire_node(self, node):
+        self.retired.append(node)
+
+
+def make_recycler(**limits):
+    lines = []
+    dsession = SimpleNamespace(
+        sched=MockSched(),
+        shuttingdown=False,
+        add_worker=lambda template: MockNode(),
+        report_line=lines.append,
+    )
+    return WorkerRecycler(dsession, **limits), dsession, lines
+
+
+def test_max_tests() -> None:
+    recycler, dsession, lines = make_recycler(max_tests=5)
+    node = MockNode()
+    for _ in range(3):
+        recycler.test_finished(node)
+    assert not dsession.sched.replacements
+    # the replacement is started ahead of time
+    recycler.test_finished(node)
+    assert node in dsession.sched.replacements
+    assert not dsession.sched.retired
+    recycler.test_finished(node)
+    assert dsession.sched.retired == [node]
+    assert lines == ["\nrecycling worker gw0 after 5 tests"]
+    recycler.test_finished(node)
+    assert dsession.sched.retired == [node]
+
+
+def test_max_rss() -> None:
+    mb = 1024 * 1024
+    recycler, dsession, lines = make_recycler(max_rss=100 * mb)
+    node = MockNode()
+    recycler.test_finished(node, rss=50 * mb)
+    assert not dsession.sched.replacements
+    recycler.test_finished(node, rss=120 * mb)
+    assert node in dsession.sched.replacements
+    assert dsession.sched.retired == [node]
+    assert lines == ["\nrecycling worker gw0 at 120 MB"]
+
+
+def test_not_supported_by_scheduler() -> None:
+    recycler, dsession, _ = make_recycler(max_tests=1)
+    dsession.sched = object()
+    recycler.test_finished(MockNode())
+
+
+def test_not_supported_by_dist_mode(pytester: pytest.Pytester, run_bins) -> None:
+    pytester.makepyfile(**{"tests/test_a": "def test_a(): pass"})
+    result = run_bins([["tests/test_a.py"]], "-n1", "--max-tests-per-worker=3")
+    assert result.ret == pytest.ExitCode.USAGE_ERROR
+    result.stderr.fnmatch_lines(
+        ["ERROR: --max-worker-rss and --max-tests-per-worker are only supported*"]
+    )
+
+
+def test_max_tests_per_worker_option(pytester: pytest.Pytester, run_bins) -> None:
+    pytester.makepyfile(
+        **{
+            "tests/test_a": """
+                import time
+                import pytest
+
+                @pytest.mark.parametrize("i", range(8))
+                def test_a(i):
+                    time.sleep(0.3)
+            """
+        }
+    )
+    result = run_bins(
+        [["tests/test_a.py"]],
+        *["-n1", "--dist=loadscope", "-v", "--max-tests-per-worker=3"],
+    )
+    result.assert_outcomes(passed=8)
+    result.stdout.fnmatch_lines(
+        [
+            "recycling worker gw0 after 3 tests",
+            "*[[]gw1[]]*PASSED tests/test_a.py::test_a[[]*",
+        ]
+    )
+    assert "crashed" not in result.stdout.str()
@@ -1,8 +1,12 @@
+import json
+import os
 import pprint
 import pytest
 import sys
+import time
 import uuid
 
+from xdist.remote import LogSink, Producer, start_logging, stop_logging
 from xdist.workermanage import WorkerController
 import execnet
 import marshal
@@ -35,18 +39,21 @@ class WorkerSetup:
         self.use_callback = False
         self.events = Queue()  # type: ignore[var-annotated]
 
-    def setup(self) -> None:
+    def setup(self, chdir: str = ".") -> None:
         self.pytester.chdir()
+        os.chdir(chdir)
         # import os ; os.environ['EXECNET_DEBUG'] = "2"
         self.gateway = execnet.makegateway()
-        self.config = config = self.pytester.parseconfigure()
+        # the test paths of the worker replace the first argument
+        self.config = config = self.pytester.parseconfigure(".")
         putevent = self.events.put if self.use_callback else None
 
         class DummyMananger:
             testrunuid = uuid.uuid4().hex
             specs = [0, 1]
+            priority = None
 
-        self.slp = WorkerController(DummyMananger, self.gateway, config, putevent)
+        self.slp = WorkerController(DummyMananger, self.gateway, config, putevent, ".")
         self.request.addfinalizer(self.slp.ensure_teardown)
         self.slp.setup()
 
@@ -271,6 +278,215 @@ class TestWorkerInteractor:
         ev = worker.popevent("workerfinished")
         assert "workeroutput" in ev.kwargs
 
+    def test_no_heartbeat_without_timeout(self, worker: WorkerSetup) -> None:
+        worker.pytester.makepyfile(
+            """
+            import time
+
+            def test_slow():
+                time.sleep(1.5)
+        """
+        )
+        worker.setup()
+        worker.popevent("collectionfinish")
+        worker.sendcommand("runtests", indices=[0])
+        worker.sendcommand("shutdown")
+        ev = worker.popevent()
+        while ev.name != "workerfinished":
+            assert ev.name != "heartbeat"
+            ev = worker.popevent()
+
+    def test_retry_in_place(self, worker: WorkerSetup, unserialize_report) -> None:
+        worker.pytester.makeconftest(
+            """
+            import pytest
+
+            protocols = []
+
+            @pytest.hookimpl(hookwrapper=True)
+            def pytest_runtest_protocol(item):
+                protocols.append(item.name)
+                yield
+        """
+        )
+        worker.pytester.makepyfile(
+            """
+            import pytest
+            from conftest import protocols
+
+            setups = []
+            attempts = []
+
+            @pytest.fixture(scope="module")
+            def resource():
+                setups.append(1)
+
+            @pytest.mark.xdist_timeout(60)
+            def test_flaky(resource):
+                attempts.append(1)
+                assert len(attempts) == 3
+
+            def test_after(resource):
+                assert setups == [1]
+                # the hookwrappers ran around each attempt
+                assert protocols == ["test_flaky"] * 3 + ["test_after"]
+        """
+        )
+        worker.setup()
+        ev = worker.popevent("collectionfinish")
+        assert len(ev.kwargs["ids"]) == 2
+        worker.sendcommand("retry_budgets", budgets={0: 5})
+        worker.sendcommand("runtests", indices=[0, 1])
+        worker.sendcommand("shutdown")
+
+        ev = worker.popevent("logstart")
+        assert ev.kwargs["nodeid"].endswith("::test_flaky")
+        # each retried attempt starts its own heartbeat
+        heartbeats = []
+        ev = worker.popevent()
+        while ev.name == "heartbeat":
+            heartbeats.append(ev)
+            ev = worker.popevent()
+        assert len(heartbeats) >= 2
+        assert heartbeats[0].kwargs["nodeid"].endswith("::test_flaky")
+        assert ev.name == "retried"
+        assert ev.kwargs["retries"] == 2
+        assert ev.kwargs["passed"]
+        rep = unserialize_report(ev.kwargs["data"])
+        assert rep.failed
+        assert rep.when == "call"
+
+        # only the reports of the last attempt are sent
+        for when in ["setup", "call", "teardown"]:
+            ev = worker.popevent()
+            assert ev.name == "testreport"
+            rep = unserialize_report(ev.kwargs["data"])
+            assert rep.nodeid.endswith("::test_flaky")
+            assert rep.when == when
+            assert rep.passed
+        ev = worker.popevent()
+        assert ev.name == "logfinish"
+
+        # the module fixture was set up once for all attempts
+        for when in ["setup", "call", "teardown"]:
+            ev = worker.popevent("testreport")
+            rep = unserialize_report(ev.kwargs["data"])
+            assert rep.nodeid.endswith("::test_after")
+            assert rep.passed
+        ev = worker.popevent("workerfinished")
+        assert "workeroutput" in ev.kwargs
+
+    def test_steal_during_retry(self, worker: WorkerSetup, unserialize_report) -> None:
+        worker.pytester.makepyfile(
+            """
+            import os
+            import time
+
+            attempts = []
+
+            def test_flaky():
+                attempts.append(1)
+                open("running", "w").close()
+                # the first attempt runs until the steal request is answered
+                deadline = time.time() + 10
+                while not os.path.exists("stolen") and time.time() < deadline:
+                    time.sleep(0.01)
+                assert len(attempts) == 3
+
+            def test_func2(): pass
+            def test_func3(): pass
+        """
+        )
+        worker.setup()
+        ev = worker.popevent("collectionfinish")
+        assert len(ev.kwargs["ids"]) == 3
+        worker.sendcommand("retry_budgets", budgets={0: 5})
+        worker.sendcommand("runtests_all")
+        worker.popevent("logstart")
+        running = worker.pytester.path / "running"
+        deadline = time.time() + WAIT_TIMEOUT
+        while not running.exists() and time.time() < deadline:
+            time.sleep(0.01)
+
+        # answered while the test is being retried
+        worker.sendcommand("steal", indices=[2])
+        ev = worker.popevent("unscheduled")
+        assert ev.kwargs["indices"] == [2]
+        worker.pytester.path.joinpath("stolen").touch()
+        ev = worker.popevent("retried")
+        assert ev.kwargs["retries"] == 2
+
+        worker.sendcommand("shutdown")
+        for when in ["setup", "call", "teardown"]:
+            ev = worker.popevent("testreport")
+            rep = unserialize_report(ev.kwargs["data"])
+            assert rep.nodeid.endswith("::test_flaky")
+        for when in ["setup", "call", "teardown"]:
+            ev = worker.popevent("testreport")
+            rep = unserialize_report(ev.kwargs["data"])
+            assert rep.nodeid.endswith("::test_func2")
+        ev = worker.popevent("workerfinished")
+        assert "workeroutput" in ev.kwargs
+
+    def test_collect_and_run(self, worker: WorkerSetup, unserialize_report) -> None:
+        worker.pytester.makeini("[pytest]")
+        worker.pytester.makepyfile(
+            **{
+                "sub/test_a": "def test_a(): pass",
+                "sub/test_b": "def test_b(): pass\ndef test_c(): pass",
+            }
+        )
+        # the paths are relative to the rootdir, not to the invocation dir
+        worker.setup(chdir="sub")
+        ev = worker.popevent("collectionfinish")
+        assert len(ev.kwargs["ids"]) == 3
+        worker.sendcommand(
+            "collect_and_run", paths=["sub/test_b.py::test_c", "sub/test_gone.py"]
+        )
+        ev = worker.popevent("collectionextended")
+        assert ev.kwargs["ids"] == ["sub/test_b.py::test_c"]
+        assert "test_gone.py" in ev.kwargs["error"]
+
+        worker.sendcommand("shutdown")
+        for when in ["setup", "call", "teardown"]:
+            ev = worker.popevent("testreport")
+            rep = unserialize_report(ev.kwargs["data"])
+            assert rep.nodeid == "sub/test_b.py::test_c"
+            assert rep.when == when
+        ev = worker.popevent("workerfinished")
+        assert "workeroutput" in ev.kwargs
+
+    def test_collect_and_run_group(
+        self, worker: WorkerSetup, unserialize_report
+    ) -> None:
+        worker.pytester.makeini("[pytest]\naddopts = --dist=loadgroup")
+        worker.pytester.makepyfile(
+            """
+            import pytest
+
+            @pytest.mark.xdist_group("group")
+            def test_a(): pass
+
+            @pytest.mark.xdist_group("group")
+            @pytest.mark.parametrize("arg", ["a@b"])
+            def test_b(arg): pass
+        """
+        )
+        worker.setup()
+        ev = worker.popevent("collectionfinish")
+        ids = ev.kwargs["ids"]
+        assert ids == [
+            "test_collect_and_run_group.py::test_a@group",
+            "test_collect_and_run_group.py::test_b[a@b]@group",
+        ]
+        worker.sendcommand("collect_and_run", paths=ids)
+        ev = worker.popevent("collectionextended")
+        assert ev.kwargs["ids"] == ids
+        assert ev.kwargs["error"] is None
+        worker.sendcommand("shutdown")
+        ev = worker.popevent("workerfinished")
+        assert "workeroutput" in ev.kwargs
+
     def test_steal_empty_queue(self, worker: WorkerSetup, unserialize_report) -> None:
         worker.pytester.makepyfile(
             """
@@ -393,3 +609,74 @@ def test_remote_sys_path(pytester: pytest.Pytester) -> None:
     )
     result = pytester.runpytest("-n1")
     assert result.ret == 0
+
+
+class TestProducer:
+    @pytest.fixture
+    def log_path(self, tmp_path):
+        path = tmp_path / "log.jsonl"
+        yield path
+        stop_logging()
+
+    def read_records(self, path):
+        return [json.loads(line) for line in path.read_text().splitlines()]
+
+    def test_stderr_without_sink(self, capsys: pytest.CaptureFixture[str]) -> None:
+        log = Producer("dsession")
+        log("started", 2)
+        log.loadsched.info("scheduled")
+        Producer("disabled", enabled=False).error("not logged")
+        assert capsys.readouterr().err.splitlines() == [
+            "[dsession] started 2",
+            "[loadsched] scheduled",
+        ]
+
+    def test_sink(self, log_path, capsys: pytest.CaptureFixture[str]) -> None:
+        start_logging(str(log_path), level="info")
+        log = Producer("dsession")
+        log("debug records are filtered out")
+        log.info("collected", 3, "tests")
+        log.loadsched.error("crashed")
+        Producer("disabled", enabled=False).error("not logged")
+        stop_logging()
+
+        records = self.read_records(log_path)
+        assert [(r["level"], r["logger"], r["msg"]) for r in records] == [
+            ("info", "dsession", "collected 3 tests"),
+            ("error", "loadsched", "crashed"),
+        ]
+        assert records[0]["ts"] <= records[1]["ts"]
+        assert capsys.readouterr().err == ""
+
+    def test_sink_full(self, log_path, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr(LogSink, "CAPACITY", 2)
+        sink = LogSink(str(log_path), interval=60)
+        for i in range(5):
+            sink.emit(10, "dsession", (i,))
+        sink.close()
+        records = self.read_records(log_path)
+        assert [r["msg"] for r in records] == [
+            "3",
+            "4",
+            "dropped 3 records, the buffer was full",
+        ]
+
+
+def test_log_dir(pytester: pytest.Pytester, monkeypatch: pytest.MonkeyPatch) -> None:
+    p = pytester.makepyfile(
+        """
+        def test_ok():
+            pass
+        """
+    )
+    pytester.makefile(".json", bins=f'[["{p}"]]')
+    monkeypatch.setenv("TEST_DIR", str(pytester.path))
+    result = pytester.runpytest_subprocess(
+        p, "-n1", "--dist=loadscope", "--xdist-log-dir=logs"
+    )
+    result.assert_outcomes(passed=1)
+    assert "[dsession]" not in result.stderr.str()
+    for name in ("controller", "gw0"):
+        lines = (pytester.path / "logs" / f"{name}.jsonl").read_text().splitlines()
+        assert lines
+        assert {"ts", "level", "logger", "msg"} == set(json.loads(lines[0]))
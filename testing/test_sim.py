@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+from xdist.sim import SCHEDULERS, Simulator, main
+
+
+DURATIONS = {
+    "a.py::t0": 1.0,
+    "a.py::t1": 2.0,
+    "a.py::t2": 0.5,
+    "b.py::t0": 3.0,
+    "b.py::t1": 0.2,
+    "c.py::t0": 0.1,
+    "c.py::t1": 0.1,
+    "d.py::t0": 4.0,
+}
+
+
+@pytest.mark.parametrize("dist", sorted(SCHEDULERS))
+def test_runs_every_test_once(dist: str) -> None:
+    result = Simulator(DURATIONS, 3, dist=dist, latency=0).run()
+    busy = sum(result.makespan - idle for idle in result.idle.values())
+    assert busy == pytest.approx(sum(DURATIONS.values()))
+    assert result.makespan >= max(DURATIONS.values())
+
+
+def test_single_worker() -> None:
+    result = Simulator(DURATIONS, 1, dist="load", latency=0).run()
+    assert result.makespan == pytest.approx(sum(DURATIONS.values()))
+    assert result.idle == {"gw0": pytest.approx(0)}
+
+    # messages between the controller and the worker take time
+    result = Simulator(DURATIONS, 1, dist="load", latency=0.5).run()
+    assert result.makespan > 1.0 + sum(DURATIONS.values())
+    assert result.idle["gw0"] > 1.0
+
+
+def test_setup_costs() -> None:
+    durations = {"a.py::t0": 1.0, "a.py::t1": 1.0}
+    result = Simulator(
+        durations, 1, dist="load", latency=0, setup_costs={"a.py": 5.0}
+    ).run()
+    assert result.makespan == pytest.approx(7.0)
+
+
+def test_loadscope_rebalances_bins() -> None:
+    bins = [list(DURATIONS)[:-1], list(DURATIONS)[-1:]]
+    result = Simulator(DURATIONS, 2, dist="loadscope", bins=bins, latency=0).run()
+    # the worker given a single test takes over some of the other bin
+    assert result.makespan < sum(DURATIONS.values())
+    assert result.idle["gw1"] == pytest.approx(0)
+
+
+def test_main(tmp_path, capsys: pytest.CaptureFixture[str]) -> None:
+    durations = tmp_path / "durations.json"
+    durations.write_text(json.dumps(DURATIONS))
+    bins = tmp_path / "bins.json"
+    bins.write_text(json.dumps([["a.py", "b.py"], ["c.py", "d.py"]]))
+    args = ["--durations", str(durations), "-n", "2", "--bins", str(bins)]
+    assert main([*args, "--dist", "load", "--dist", "loadscope"]) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].split() == ["scheduler", "makespan", "max", "idle", "messages"]
+    assert [line.split()[0] for line in lines[1:]] == ["load", "loadscope"]
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from xdist.trace import TraceRecorder
+
+
+class MockGateway:
+    def __init__(self, id):
+        self.id = id
+
+
+class MockNode:
+    def __init__(self, id):
+        self.gateway = MockGateway(id)
+
+
+class MockReport:
+    def __init__(self, nodeid, when, start, duration, outcome="passed"):
+        self.nodeid = nodeid
+        self.when = when
+        self.start = start
+        self.duration = duration
+        self.outcome = outcome
+
+
+def test_lanes_and_idle_gaps(tmp_path) -> None:
+    trace = TraceRecorder(tmp_path / "trace.json")
+    node = MockNode("gw0")
+    start = trace.start
+    trace.test_report(node, MockReport("a.py::t0", "setup", start, 1.0))
+    trace.test_report(node, MockReport("a.py::t0", "call", start + 1.0, 1.0))
+    trace.test_report(node, MockReport("a.py::t1", "call", start + 3.0, 0.5))
+    trace.retried(
+        node, MockReport("a.py::t2", "call", start + 4.0, 1.0, "failed"), 1, True
+    )
+    trace.controller_event("collectionfinish", start, node)
+    trace.write()
+
+    events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    lanes = {e["args"]["name"]: e["tid"] for e in events if e["name"] == "thread_name"}
+    assert lanes == {"controller": 0, "gw0": 1}
+    spans = [
+        (e["tid"], e["cat"], e["name"], e["ts"], e["dur"])
+        for e in events
+        if e["ph"] == "X"
+    ]
+    assert (1, "setup", "a.py::t0", 0, 1_000_000) in spans
+    assert (1, "retry", "a.py::t2", 4_000_000, 1_000_000) in spans
+    assert [span for span in spans if span[1] == "idle"] == [
+        (1, "idle", "idle", 2_000_000, 1_000_000),
+        (1, "idle", "idle", 3_500_000, 500_000),
+    ]
+    assert [span[:3] for span in spans if span[0] == 0] == [
+        (0, "controller", "collectionfinish")
+    ]
+
+
+def test_trace_option(
+    pytester: pytest.Pytester, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    p = pytester.makepyfile(
+        """
+        def test_ok():
+            pass
+        """
+    )
+    pytester.makefile(".json", bins=f'[["{p}"]]')
+    monkeypatch.setenv("TEST_DIR", str(pytester.path))
+    result = pytester.runpytest_subprocess(
+        p, "-n1", "--dist=loadscope", "--xdist-trace=trace.json"
+    )
+    result.assert_outcomes(passed=1)
+    events = json.loads((pytester.path / "trace.json").read_text())["traceEvents"]
+    names = {(e["tid"], e["name"]) for e in events}
+    assert {
+        (1, "gateway"),
+        (1, "startup"),
+        (1, "collection"),
+        (1, "test_trace_option.py::test_ok"),
+        (0, "collectionfinish"),
+    } <= names
@@ -0,0 +1,113 @@
+from types import SimpleNamespace
+
+import pytest
+
+from xdist.watchdog import Watchdog
+from xdist.workermanage import Heartbeat
+
+
+class MockNode:
+    def __init__(self):
+        self.gateway = SimpleNamespace(id="gw0")
+        self.heartbeat = None
+        self.dumps_requested = 0
+        self.killed = 0
+
+    def send_dump_stacks(self):
+        self.dumps_requested += 1
+
+    def kill(self):
+        self.killed += 1
+
+
+def make_watchdog():
+    node = MockNode()
+    lines = []
+    dsession = SimpleNamespace(_active_nodes={node}, report_line=lines.append)
+    return Watchdog(dsession), node, lines
+
+
+def test_timeout() -> None:
+    watchdog, node, lines = make_watchdog()
+    watchdog.tick(now=100.0)
+    node.heartbeat = Heartbeat(0, "a.py::t1", started=100.0, timeout=None)
+    watchdog.tick(now=200.0)
+    assert not watchdog.hangs
+
+    node.heartbeat = Heartbeat(0, "a.py::t1", started=100.0, timeout=10.0)
+    watchdog.tick(now=105.0)
+    assert not watchdog.hangs
+    watchdog.tick(now=111.0)
+    assert node.dumps_requested == 1
+    assert lines == ["\nworker gw0 timed out after 10s running a.py::t1"]
+    assert not node.killed
+
+    watchdog.stacks_received(node, "Thread 0x1 (most recent call first):")
+    assert node.killed == 1
+    watchdog.tick(now=200.0)
+    assert node.killed == 1
+    assert node.dumps_requested == 1
+    assert watchdog.hangs[node].report("gw0") == (
+        "worker 'gw0' timed out after 10s while running 'a.py::t1'\n\n"
+        "Thread 0x1 (most recent call first):"
+    )
+
+
+def test_no_stacks_received() -> None:
+    watchdog, node, _ = make_watchdog()
+    node.heartbeat = Heartbeat(0, "a.py::t1", started=100.0, timeout=1.0)
+    watchdog.tick(now=102.0)
+    watchdog.tick(now=102.0 + Watchdog.STACKS_GRACE - 0.1)
+    assert not node.killed
+    watchdog.tick(now=102.0 + Watchdog.STACKS_GRACE)
+    assert node.killed == 1
+    assert (
+        watchdog.hangs[node]
+        .report("gw0")
+        .endswith("no stack dump received from the worker")
+    )
+
+
+def test_test_timeout(pytester: pytest.Pytester, run_bins) -> None:
+    pytester.makepyfile(
+        **{
+            "tests/test_a": """
+                import threading
+                import pytest
+
+                def test_1():
+                    pass
+
+                def test_deadlock():
+                    lock = threading.Lock()
+                    lock.acquire()
+                    lock.acquire()
+
+                @pytest.mark.xdist_timeout(60)
+                def test_3():
+                    pass
+
+                def test_4():
+                    pass
+            """
+        }
+    )
+    result = run_bins(
+        [["tests/test_a.py"]], "-n1", "--dist=loadscope", "-v", "--test-timeout=1"
+    )
+    result.assert_outcomes(passed=3, failed=1)
+    result.stdout.fnmatch_lines(
+        [
+            "*worker gw0 timed out after 1s running tests/test_a.py::test_deadlock",
+            "*replacing hung worker gw0",
+            "*timed out after 1s while running 'tests/test_a.py::test_deadlock'",
+            "*in test_deadlock*",
+        ]
+    )
+    result.stdout.fnmatch_lines_random(
+        [
+            "*[[]gw1[]]*PASSED tests/test_a.py::test_3*",
+            "*[[]gw1[]]*PASSED tests/test_a.py::test_4*",
+        ]
+    )
+    assert "crashed" not in result.stdout.str()
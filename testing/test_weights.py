@@ -0,0 +1,103 @@
+from types import SimpleNamespace
+
+import execnet
+import pytest
+
+from xdist.weights import NodeWeights
+from xdist.weights import spec_measured
+from xdist.weights import spec_weight
+
+
+class MockNode:
+    def __init__(self, spec="popen"):
+        self.gateway = SimpleNamespace(spec=execnet.XSpec(spec))
+
+
+def test_spec_weight() -> None:
+    assert spec_weight(execnet.XSpec("popen")) is None
+    assert spec_weight(execnet.XSpec("popen//weight=2.5")) == 2.5
+    assert spec_weight(None) is None
+    assert spec_weight(execnet.XSpec("popen//weight=auto")) is None
+    assert spec_measured(execnet.XSpec("popen//weight=auto"))
+    assert not spec_measured(execnet.XSpec("popen"))
+    for value in ("0", "-1", "inf", "fast"):
+        with pytest.raises(ValueError):
+            spec_weight(execnet.XSpec(f"popen//weight={value}"))
+
+
+def test_measured_weight() -> None:
+    weights = NodeWeights({f"t{i}": 1.0 for i in range(10)})
+    node = MockNode("popen//weight=auto")
+    for i in range(NodeWeights.MIN_SAMPLES - 1):
+        weights.record(node, f"t{i}", 2.0)
+    # not measured enough yet, nor tests without history
+    weights.record(node, "unknown", 2.0)
+    assert weights.weight(node) == 1.0
+    weights.record(node, "t9", 2.0)
+    assert weights.weight(node) == 0.5
+
+    declared = MockNode("popen//weight=3")
+    for i in range(NodeWeights.MIN_SAMPLES):
+        weights.record(declared, f"t{i}", 2.0)
+    assert weights.weight(declared) == 3.0
+
+    # only the nodes of weight=auto specs are measured
+    unmeasured = MockNode()
+    for i in range(NodeWeights.MIN_SAMPLES):
+        weights.record(unmeasured, f"t{i}", 2.0)
+    assert weights.weight(unmeasured) == 1.0
+    assert unmeasured not in weights.measured
+
+
+def test_loaded_when_measured() -> None:
+    loads = []
+
+    def load():
+        loads.append(None)
+        return {"t0": 1.0}
+
+    weights = NodeWeights(load=load)
+    declared = MockNode("popen//weight=3")
+    weights.record(declared, "t0", 2.0)
+    assert weights.weight(MockNode()) == 1.0
+    assert weights.share(declared, [declared, MockNode()], 8) == 6
+    weights.record(MockNode(), "t0", 2.0)
+    assert not loads
+    node = MockNode("popen//weight=auto")
+    weights.record(node, "t0", 2.0)
+    weights.record(node, "t0", 2.0)
+    assert len(loads) == 1
+    assert weights.measured[node] == [2.0, 4.0, 2]
+
+
+def test_share() -> None:
+    weights = NodeWeights()
+    heavy, light = MockNode("popen//weight=3"), MockNode()
+    assert weights.share(heavy, [heavy, light], 10) == 7
+    assert weights.share(light, [heavy, light], 10) == 2
+    assert weights.share(light, [light, MockNode()], 10) == 5
+
+
+def test_heaviest_spec_gets_longest_bin(pytester: pytest.Pytester, run_bins) -> None:
+    pytester.makepyfile(
+        **{
+            "tests/test_a": "def test_1(): pass",
+            "tests/test_b": "def test_1(): pass",
+            "tests/test_c": "def test_1(): pass",
+        }
+    )
+    bins = [["tests/test_a.py"], ["tests/test_b.py", "tests/test_c.py"]]
+    result = run_bins(
+        bins, "--dist=loadscope", "--tx=popen//weight=2", "--tx=popen", "-v"
+    )
+    result.assert_outcomes(passed=3)
+    result.stdout.fnmatch_lines_random(
+        [
+            "*[[]gw1[]]*PASSED tests/test_a.py::test_1*",
+            "*[[]gw0[]]*PASSED tests/test_b.py::test_1*",
+            "*[[]gw0[]]*PASSED tests/test_c.py::test_1*",
+        ]
+    )
+
+    result = run_bins(bins, "--dist=loadscope", "--tx=popen//weight=fast", "--tx=popen")
+    result.stderr.fnmatch_lines(["*--tx: weight must be a positive number*"])
@@ -4,11 +4,13 @@ import shutil
 import textwrap
 import warnings
 from pathlib import Path
+from types import SimpleNamespace
 from util import generate_warning
 from xdist import workermanage
 from xdist._path import visit_path
 from xdist.remote import serialize_warning_message
-from xdist.workermanage import HostRSync, NodeManager, unserialize_warning_message
+from xdist.workermanage import HostRSync, NodeManager, WorkerController
+from xdist.workermanage import unserialize_warning_message
 
 pytest_plugins = "pytester"
 
@@ -47,6 +49,9 @@ def workercontroller(monkeypatch: pytest.MonkeyPatch):
         def setup(self):
             pass
 
+        def record_startup_timings(self, timings):
+            pass
+
     monkeypatch.setattr(workermanage, "WorkerController", MockController)
     return MockController
 
@@ -328,6 +333,16 @@ class TestNodeManager:
         assert rep.passed
 
 
+def test_kill_socket_gateway(config) -> None:
+    exited = []
+    # socket gateways have no process to kill
+    gateway = SimpleNamespace(id="gw0", _io=object(), exit=lambda: exited.append(1))
+    nodemanager = SimpleNamespace(specs=[None], testrunuid="uid", priority=False)
+    node = WorkerController(nodemanager, gateway, config, None, None)
+    node.kill()
+    assert exited == [1]
+
+
 class MyWarning(UserWarning):
     pass
 